@@ -0,0 +1,132 @@
+import time
+import logging
+from threading import Thread
+from collections import deque
+from functools import partial
+
+from data.alerts import AlertCodes
+from errors import UnavailableMeasurmentError
+
+
+class AcquisitionTask(Thread):
+    """Read the flow and pressure sensors at a high rate.
+
+    The samples are buffered until the sampler drains them on its own
+    (much lower) rate. The sampler integrates volumes over all of the raw
+    samples, and feeds their decimation to the state machine and graphs.
+    """
+    DEFAULT_SAMPLE_RATE = 200  # HZ
+    # Enough for the sampler to stall for a couple of seconds without losing
+    # any sample.
+    MAX_BUFFERED_SECONDS = 2
+
+    def __init__(self, flow_sensor, pressure_sensor, timer, read_sensor,
+                 sample_rate=DEFAULT_SAMPLE_RATE, burst_size=1):
+        """
+        :param read_sensor: Callable that reads a single sensor, given the
+            sensor, its error alert code, the sample timestamp and optionally
+            the function to read it with. It should return None on failure.
+        :param burst_size: How many flow samples to read on each
+            acquisition, when the flow sensor supports burst reads.
+        """
+        super(AcquisitionTask, self).__init__()
+        self.daemon = True
+        self.flow_sensor = flow_sensor
+        self.pressure_sensor = pressure_sensor
+        self.timer = timer
+        self.read_sensor = read_sensor
+        self.sample_rate = sample_rate
+        self.burst_size = burst_size
+        self.interval = 1 / sample_rate
+        self.samples = deque(
+            maxlen=int(sample_rate * self.MAX_BUFFERED_SECONDS))
+        self.should_run = True
+        self.overruns = 0
+        self.log = logging.getLogger(self.__class__.__name__)
+
+    def acquire(self):
+        """Read a single sample of pressure, and a burst of flow samples."""
+        timestamp = self.timer.get_time()
+        flow_samples = self.read_flow(timestamp)
+        pressure_cmh2o = self.read_sensor(
+            self.pressure_sensor, AlertCodes.PRESSURE_SENSOR_ERROR, timestamp)
+        if pressure_cmh2o is None:
+            pressure_cmh2o = 0
+
+        for flow_timestamp, flow_slm in flow_samples:
+            # `deque.append` is atomic, so no locking is needed against
+            # `drain`.
+            self.samples.append((flow_timestamp, flow_slm, pressure_cmh2o))
+
+    def read_flow(self, timestamp):
+        """
+        Read the flow sensor.
+
+        Sensors that support burst reads get their samples spread evenly
+        over the acquisition's interval, from the given timestamp, which
+        makes the volume integration more accurate. Other sensors get the
+        given timestamp.
+        :return: List of (timestamp, flow) tuples, empty if the sensor
+            couldn't be read. An empty burst counts as a failed read.
+        """
+        read_burst = getattr(self.flow_sensor, "read_burst", None)
+        if read_burst is None:
+            flow_slm = self.read_sensor(
+                self.flow_sensor, AlertCodes.FLOW_SENSOR_ERROR, timestamp)
+            return [(timestamp, flow_slm)] if flow_slm is not None else []
+
+        samples = self.read_sensor(
+            self.flow_sensor, AlertCodes.FLOW_SENSOR_ERROR, timestamp,
+            read=partial(self.read_burst, read_burst, timestamp))
+        return samples or []
+
+    def read_burst(self, read_burst, timestamp):
+        # Timed by the injected timer rather than by the wall clock around
+        # the bus transactions, which a simulation's timer doesn't follow.
+        samples = read_burst(self.burst_size, lambda: timestamp)
+        if not samples:
+            raise UnavailableMeasurmentError("Flow sensor's burst was empty")
+
+        step = self.interval / self.burst_size
+        return [(timestamp + i * step, flow_slm)
+                for i, (_, flow_slm) in enumerate(samples)]
+
+    def drain(self):
+        """Return all of the samples acquired since the last call."""
+        samples = []
+        while self.samples:
+            samples.append(self.samples.popleft())
+        return samples
+
+    @staticmethod
+    def decimate(samples):
+        """Average a block of samples into a single (flow, pressure) value.
+
+        Averaging, rather than picking every n-th sample, also filters out the
+        noise the slope inference would otherwise see.
+        """
+        _, flows, pressures = zip(*samples)
+        return sum(flows) / len(flows), sum(pressures) / len(pressures)
+
+    def stop(self):
+        self.should_run = False
+
+    def run(self):
+        self.log.info("Acquisition task started at %sHz", self.sample_rate)
+        next_sample_time = time.monotonic()
+        while self.should_run:
+            # noinspection PyBroadException
+            try:
+                self.acquire()
+            except Exception:
+                self.log.exception("Unhandled exception while acquiring")
+
+            next_sample_time += self.interval
+            delay = next_sample_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # We are late. Don't try to catch up by reading in a burst,
+                # just restart the schedule from now.
+                self.overruns += 1
+                next_sample_time = time.monotonic()
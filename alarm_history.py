@@ -0,0 +1,301 @@
+"""Persistent history of the alarms.
+
+Alarms are journaled as they are raised, a fixed size record each, in the
+recordings' format - so `read_recording` reads the journal as well. Records
+are only appended; the occurrences count, the duration and the time of
+acknowledgement of an alarm are completed in its own record, in place.
+
+A page of the history is read with a few seeks, rather than by loading all
+of it. Records are in the order the alarms were raised, so a time range is
+found by bisecting the journal. Each alert code also has an index of the
+numbers of its records, `<journal>.<code>.idx`, which is paged the same way.
+
+The alarms are journaled by a `HistoryWriter` thread, so raising an alarm
+doesn't wait for the disk, or for the GUI paging through the history.
+"""
+import os
+import logging
+from queue import Queue
+from threading import Lock, Thread
+
+import numpy as np
+
+from data.alerts import Alert, AlertCodes
+from sample_storage import (read_header, write_header, columns,
+                            RecordingFormatError, TIME_COLUMN)
+
+HISTORY_FILE = "inhalator.alarms"
+
+ALARM_DTYPE = np.dtype([
+    (TIME_COLUMN, '<f8'),
+    ('code', '<u4'),
+    ('count', '<u4'),
+    ('value', '<f8'),
+    ('duration', '<f8'),  # Seconds from raising to the last occurrence
+    ('acknowledged', '<f8'),  # Unix time (milliseconds), NaN if not yet
+])
+RECORD_NUMBER_DTYPE = np.dtype('<u8')
+
+
+def record_alert(record):
+    """:return: The `Alert` of a journal record."""
+    code = int(record["code"])
+    if AlertCodes.is_valid(code):
+        code = AlertCodes(code)
+    timestamp = float(record[TIME_COLUMN]) / 1000
+    value = None if np.isnan(record["value"]) else float(record["value"])
+    alert = Alert(code, timestamp, value)
+    alert.count = int(record["count"])
+    alert.last_seen = timestamp + float(record["duration"])
+    return alert
+
+
+class _Records(object):
+    """Fixed size records of a file, after `offset`, read with a seek."""
+
+    def __init__(self, fd, offset, dtype):
+        self.fd = fd
+        self.offset = offset
+        self.dtype = dtype
+
+    def __len__(self):
+        return (os.fstat(self.fd).st_size - self.offset) // self.dtype.itemsize
+
+    def read(self, first, count):
+        data = os.pread(self.fd, count * self.dtype.itemsize,
+                        self.offset + first * self.dtype.itemsize)
+        return np.frombuffer(data, dtype=self.dtype)
+
+    def write(self, number, records):
+        os.pwrite(self.fd, records.tobytes(),
+                  self.offset + number * self.dtype.itemsize)
+
+    def append(self, records):
+        self.write(len(self), records)
+
+    def truncate(self, count):
+        os.ftruncate(self.fd, self.offset + count * self.dtype.itemsize)
+
+
+class AlarmHistory(object):
+    """Journal of the alarms, which can be paged through by time and code."""
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self.log = logging.getLogger(self.__class__.__name__)
+        self._lock = Lock()
+        self._journal = self._open_journal()
+        self._indices = {}  # Alert code -> `_Records` of its record numbers
+        for name in os.listdir(os.path.dirname(os.path.abspath(path))):
+            prefix = os.path.basename(path) + "."
+            if name.startswith(prefix) and name.endswith(".idx"):
+                code = name[len(prefix):-len(".idx")]
+                if code.isdigit():
+                    self._index(int(code))
+
+        self._recover()
+
+    def _open_journal(self):
+        offset = None
+        if os.path.exists(self.path) and os.stat(self.path).st_size:
+            try:
+                header, offset = read_header(self.path)
+                if header["columns"] != columns(ALARM_DTYPE):
+                    offset = None
+            except RecordingFormatError:
+                pass
+
+            if offset is None:
+                self.log.error("%s isn't an alarms journal, starting a new "
+                               "one", self.path)
+                os.replace(self.path, self.path + ".1")
+
+        if offset is None:
+            with open(self.path, "wb") as f:
+                write_header(f, ALARM_DTYPE)
+                offset = f.tell()
+
+        return _Records(os.open(self.path, os.O_RDWR), offset, ALARM_DTYPE)
+
+    def _index_path(self, code):
+        return f"{self.path}.{code}.idx"
+
+    def _index(self, code):
+        index = self._indices.get(code)
+        if index is None:
+            fd = os.open(self._index_path(code), os.O_RDWR | os.O_CREAT)
+            index = self._indices[code] = _Records(fd, 0,
+                                                   RECORD_NUMBER_DTYPE)
+        return index
+
+    def _recover(self):
+        """Make the journal and the indices consistent, after a crash."""
+        records = len(self._journal)
+        # Drop any partial record
+        self._journal.truncate(records)
+
+        indexed = -1
+        for index in self._indices.values():
+            entries = len(index)
+            # Drop the entries of records which were never written
+            while entries and index.read(entries - 1, 1)[0] >= records:
+                entries -= 1
+            index.truncate(entries)
+            if entries:
+                indexed = max(indexed, int(index.read(entries - 1, 1)[0]))
+
+        # Index the records which were written but not indexed
+        for number in range(indexed + 1, records):
+            code = int(self._journal.read(number, 1)["code"][0])
+            self._index(code).append(np.array([number],
+                                              dtype=RECORD_NUMBER_DTYPE))
+
+    @staticmethod
+    def _record(alert, acknowledged=None):
+        record = np.zeros(1, dtype=ALARM_DTYPE)
+        record[TIME_COLUMN] = alert.timestamp * 1000
+        record["code"] = alert.code
+        record["count"] = alert.count
+        record["value"] = np.nan if alert.value is None else alert.value
+        record["duration"] = alert.last_seen - alert.timestamp
+        record["acknowledged"] = (np.nan if acknowledged is None
+                                  else acknowledged * 1000)
+        return record
+
+    def raised(self, alert):
+        """Journal a raised alarm, and number `alert` by its record."""
+        with self._lock:
+            alert.record = len(self._journal)
+            self._journal.append(self._record(alert))
+            self._index(int(alert.code)).append(
+                np.array([alert.record], dtype=RECORD_NUMBER_DTYPE))
+
+    def update(self, alert, acknowledged=None):
+        """Complete the record of `alert`.
+
+        :param acknowledged: The unix time it was acknowledged, if it was.
+        """
+        with self._lock:
+            self._journal.write(alert.record,
+                                self._record(alert, acknowledged))
+
+    def _sequence(self, code):
+        """:return: The number of the records, and a function to read them."""
+        if code is None:
+            return len(self._journal), self._journal.read
+
+        index = self._indices.get(int(code))
+        if index is None:
+            return 0, None
+
+        def read(first, count):
+            numbers = index.read(first, count)
+            return np.concatenate(
+                [self._journal.read(int(number), 1) for number in numbers]
+            ) if len(numbers) else np.empty(0, dtype=ALARM_DTYPE)
+
+        return len(index), read
+
+    @staticmethod
+    def _bisect(read, count, time):
+        """:return: The position of the first record at or after `time`."""
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if read(middle, 1)[TIME_COLUMN][0] < time:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _range(self, code, start, end):
+        count, read = self._sequence(code)
+        first, last = 0, count
+        if count and start is not None:
+            first = self._bisect(read, count, start * 1000)
+        if count and end is not None:
+            last = self._bisect(read, count, end * 1000)
+        return first, max(first, last), read
+
+    def count(self, code=None, start=None, end=None):
+        """:return: The number of alarms of `code` (any, if None) that were
+            raised between `start` and `end` (unix seconds, None for open)."""
+        with self._lock:
+            first, last, _ = self._range(code, start, end)
+        return last - first
+
+    def read(self, offset, limit, code=None, start=None, end=None):
+        """Read alarms, newest first.
+
+        :param offset: The number of newer alarms to skip.
+        :param limit: The maximal number of alarms to read.
+        :param code: Read only the alarms of this code, or any if None.
+        :param start: Read only alarms raised from this unix time, if given.
+        :param end: Read only alarms raised before this unix time, if given.
+        :return: A structured array of `ALARM_DTYPE`.
+        """
+        with self._lock:
+            first, last, read = self._range(code, start, end)
+            stop = last - offset
+            begin = max(first, stop - limit)
+            if stop <= begin:
+                return np.empty(0, dtype=ALARM_DTYPE)
+
+            return read(begin, stop - begin)[::-1]
+
+    def page(self, number, size, code=None, start=None, end=None):
+        """Read a page of `size` alarms, newest first, like `read`.
+
+        :param number: The number of the page, starting at 0.
+        """
+        return self.read(number * size, size, code, start, end)
+
+    def alerts(self, offset, limit, code=None, start=None, end=None):
+        """Read alarms like `read`, as `Alert`s."""
+        return [record_alert(record)
+                for record in self.read(offset, limit, code, start, end)]
+
+    def close(self):
+        with self._lock:
+            for records in [self._journal] + list(self._indices.values()):
+                os.fsync(records.fd)
+                os.close(records.fd)
+
+
+class HistoryWriter(Thread):
+    """Journal the alerts to an `AlarmHistory`, in the order they're queued.
+
+    An alert is journaled as raised the first time it's queued, and its
+    record is completed every time after.
+    """
+
+    def __init__(self, history):
+        super(HistoryWriter, self).__init__()
+        self.daemon = True
+        self.history = history
+        self._queue = Queue()
+        self.log = logging.getLogger(self.__class__.__name__)
+
+    def journal(self, alert, acknowledged=None):
+        """Queue `alert` to be journaled.
+
+        :param acknowledged: The unix time it was acknowledged, if it was.
+        """
+        self._queue.put((alert, acknowledged))
+
+    def stop(self):
+        """Stop once the alerts queued so far are journaled."""
+        self._queue.put(None)
+
+    def _write(self, alert, acknowledged):
+        try:
+            if alert.record is None:
+                self.history.raised(alert)
+            else:
+                self.history.update(alert, acknowledged)
+        except OSError:
+            self.log.exception("Failed journaling %r", alert)
+
+    def run(self):
+        for item in iter(self._queue.get, None):
+            self._write(*item)
@@ -1,32 +1,81 @@
-from data.alerts import AlertCodes
+from collections import deque
+from threading import Lock
+
+import numpy as np
+
+from data.alerts import AlertCodes, MEDICAL_CONDITIONS_MASK
+from data.observable import SAFETY_PRIORITY
+
+
+class LatencyStats(object):
+    """The latest `size` latencies, and their percentiles."""
+
+    def __init__(self, size=1000):
+        self._latencies = deque(maxlen=size)
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._latencies)
+
+    def add(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def percentiles(self, percents=(50, 90, 99, 100)):
+        """:return: Percent -> latency, empty if there are no latencies."""
+        with self._lock:
+            latencies = np.array(self._latencies)
+        if len(latencies) == 0:
+            return {}
+
+        return dict(zip(percents, np.percentile(latencies, percents)))
 
 
 class AlertPeripheralHandler(object):
+    """Show the alerts on the LEDs and the buzzer.
+
+    The driver writes a pin only when its level changes. For every alert
+    which changed a pin, the latency from the sample that raised it is kept
+    in `latency`, in seconds, by the sampler's timer. Alerts raised while
+    their pin is already set add none. No pin is written in simulation, so
+    there's none there.
+    """
 
     def __init__(self, events, drivers):
         self.events = events
         self.alert_driver = drivers.alert
+        self.timer = drivers.timer
+        self.latency = LatencyStats()
 
     def subscribe(self):
-        self.events.alerts_queue.observer.subscribe(self, self.on_new_alert)
-        self.events.mute_alerts.observer.subscribe(self, self.on_mute)
+        self.events.alerts_queue.observer.subscribe(
+            self, self.on_new_alert, priority=SAFETY_PRIORITY)
+        self.events.mute_alerts.observer.subscribe(
+            self, self.on_mute, priority=SAFETY_PRIORITY)
 
     def on_new_alert(self, alert):
-        if alert.is_medical_condition():
-            self.alert_driver.set_medical_condition_alert(
-                not alert.is_medical_condition(),
-                self.events.mute_alerts._alerts_muted)
-        elif alert.is_system_alert():
-            self.alert_driver.set_system_fault_alert(
-                not alert.is_system_alert(),
-                self.events.mute_alerts._alerts_muted)
-        else:
-            self.alert_driver.set_medical_condition_alert(
-                not alert.is_medical_condition(),
-                self.events.mute_alerts._alerts_muted)
-            self.alert_driver.set_system_fault_alert(
-                not alert.is_system_alert(),
-                self.events.mute_alerts._alerts_muted)
+        # Alerts may be coalesced by the event bus, so act on all of the
+        # active ones rather than only on the one notified of
+        active_codes = self.events.alerts_queue.active_codes
+        medical = active_codes & MEDICAL_CONDITIONS_MASK != 0
+        system = active_codes & ~MEDICAL_CONDITIONS_MASK != 0
+
+        muted = self.events.mute_alerts._alerts_muted
+        written = False
+        if medical:
+            written |= self.alert_driver.set_medical_condition_alert(False,
+                                                                     muted)
+        if system:
+            written |= self.alert_driver.set_system_fault_alert(False, muted)
+        if not medical and not system:
+            written |= self.alert_driver.set_medical_condition_alert(True,
+                                                                     muted)
+            written |= self.alert_driver.set_system_fault_alert(True, muted)
+
+        if written and alert.code != AlertCodes.OK:
+            # Its timestamp is the raising sample's, unlike `last_seen` it
+            # isn't advanced by the repetitions queued meanwhile
+            self.latency.add(self.timer.get_current_time() - alert.timestamp)
 
     def on_mute(self, mute):
         self.alert_driver.set_buzzer(
@@ -1,4 +1,5 @@
 import sys
+import json
 import time
 import logging
 from enum import Enum
@@ -6,10 +7,16 @@ from collections import deque
 
 from data.alerts import AlertCodes
 from data.configurations import ConfigurationManager
+from data.thresholds import version as thresholds_version
 from sample_storage import SamplesStorage
+from sample_archive import ArchiveCompactor
+from acquisition import AcquisitionTask
 from errors import UnavailableMeasurmentError
-from logic.auto_calibration import AutoFlowCalibrator
+from logic.auto_calibration import (AutoFlowCalibrator, OffsetHandoff,
+                                    CalibrationWorker)
+from logic.circuit_breaker import CircuitBreaker
 from logic.computations import RunningAvg, Accumulator, RunningSlope
+from log_handlers import RATE_LIMIT_KEY
 
 TRACE = logging.DEBUG - 1
 logging.addLevelName(TRACE, 'TRACE')
@@ -91,6 +98,7 @@ class VentilationStateMachine(object):
         self.flow_slope = RunningSlope(num_samples=7)
         self.pressure_slope = RunningSlope(num_samples=7)
         self._config = ConfigurationManager.config()
+        self._thresholds = self._config.thresholds.snapshot()
         self.last_breath_timestamp = None
         self.last_telemetry_report = None
         self.last_state = None
@@ -161,18 +169,19 @@ class VentilationStateMachine(object):
 
         if self.breathes_rate_meter.is_stable():
             # Check bpm thresholds
-            if self._config.thresholds.respiratory_rate.over(self._measurements.bpm):
+            thresholds = self.thresholds()
+            if self._measurements.bpm > thresholds.respiratory_rate_max:
                 self.log.warning(
                     "BPM too high %s, top threshold %s",
-                    self._measurements.bpm, self._config.thresholds.respiratory_rate.max)
-                self._events.alerts_queue.enqueue_alert(AlertCodes.BPM_HIGH,
-                                                        timestamp)
-            elif self._config.thresholds.respiratory_rate.below(self._measurements.bpm):
+                    self._measurements.bpm, thresholds.respiratory_rate_max)
+                self._events.alerts_queue.enqueue_alert(
+                    AlertCodes.BPM_HIGH, timestamp, self._measurements.bpm)
+            elif self._measurements.bpm < thresholds.respiratory_rate_min:
                 self.log.warning(
                     "BPM too low %s, bottom threshold %s",
-                    self._measurements.bpm, self._config.thresholds.respiratory_rate.min)
-                self._events.alerts_queue.enqueue_alert(AlertCodes.BPM_LOW,
-                                                        timestamp)
+                    self._measurements.bpm, thresholds.respiratory_rate_min)
+                self._events.alerts_queue.enqueue_alert(
+                    AlertCodes.BPM_LOW, timestamp, self._measurements.bpm)
         return True
 
     def exit_inhale(self, timestamp):
@@ -202,17 +211,21 @@ class VentilationStateMachine(object):
         self.expiration_volume.reset()
         self.exp_volumes.append((timestamp, exp_volume_ml))
 
-        if self._config.thresholds.volume.below(self._measurements.avg_exp_volume):
-            self._events.alerts_queue.enqueue_alert(AlertCodes.VOLUME_LOW, timestamp)
+        thresholds = self.thresholds()
+        if self._measurements.avg_exp_volume < thresholds.volume_min:
+            self._events.alerts_queue.enqueue_alert(
+                AlertCodes.VOLUME_LOW, timestamp,
+                self._measurements.avg_exp_volume)
             self.log.warning(
                 "average volume too low %s, bottom threshold %s",
-                self._measurements.avg_exp_volume, self._config.thresholds.volume.min)
-        elif self._config.thresholds.volume.over(self._measurements.avg_exp_volume):
+                self._measurements.avg_exp_volume, thresholds.volume_min)
+        elif self._measurements.avg_exp_volume > thresholds.volume_max:
             self._events.alerts_queue.enqueue_alert(
-                AlertCodes.VOLUME_HIGH, timestamp)
+                AlertCodes.VOLUME_HIGH, timestamp,
+                self._measurements.avg_exp_volume)
             self.log.warning(
                 "average volume too high %s, top threshold %s",
-                self._measurements.avg_exp_volume, self._config.thresholds.volume.max)
+                self._measurements.avg_exp_volume, thresholds.volume_max)
 
         self.reset_min_values()
         return True
@@ -264,7 +277,29 @@ class VentilationStateMachine(object):
         self._measurements.peep_min_pressure = self.min_pressure
         self.min_pressure = sys.maxsize
 
-    def update(self, pressure_cmh2o, flow_slm, o2_percentage, timestamp):
+    def thresholds(self):
+        """The thresholds snapshot, compiled again if they were changed.
+
+        Checked every sample, rather than subscribed to, so a change applies
+        from the next sample, and not only once it's saved and notified.
+        """
+        if self._thresholds.version != thresholds_version():
+            self._thresholds = self._config.thresholds.snapshot()
+        return self._thresholds
+
+    def update(self, pressure_cmh2o, flow_slm, o2_percentage, timestamp,
+               samples=None):
+        """
+        Process a single sample.
+
+        :param samples: Optional sequence of (timestamp, flow, pressure)
+            raw samples taken at a higher rate, of which the given values are
+            the decimation. When given, volumes and peaks are computed from
+            the raw samples, while everything else uses the decimated values.
+        """
+        if samples is None:
+            samples = ((timestamp, flow_slm, pressure_cmh2o),)
+
         # First time initialization. Not done in __init__ to avoid reading
         # the time in this class, which improves its testability.
         if self.last_breath_timestamp is None:
@@ -281,52 +316,59 @@ class VentilationStateMachine(object):
             self.last_breath_timestamp = None
             self.reset()
 
-        # Flow is measured in Liter/minute, so we convert it to liter/seconds
-        # because this is our time unit
-        flow_lps = flow_slm / 60  # Liter/sec
-        # We track inhale and exhale volume separately. Positive flow means
-        # inhale, and negative flow means exhale. But in order to keep our time
-        # series monotonic we add 0 samples instead of negative/positive sample
-        # for inhale/exhale integrator respectively.
-        self.inspiration_volume.add_sample(timestamp, max(0, flow_lps))
-        self.expiration_volume.add_sample(timestamp, abs(min(0, flow_lps)))
+        for sample_ts, sample_flow_slm, sample_pressure_cmh2o in samples:
+            # Flow is measured in Liter/minute, so we convert it to
+            # liter/seconds because this is our time unit
+            flow_lps = sample_flow_slm / 60  # Liter/sec
+            # We track inhale and exhale volume separately. Positive flow means
+            # inhale, and negative flow means exhale. But in order to keep our
+            # time series monotonic we add 0 samples instead of
+            # negative/positive sample for inhale/exhale integrator
+            # respectively.
+            self.inspiration_volume.add_sample(sample_ts, max(0, flow_lps))
+            self.expiration_volume.add_sample(sample_ts,
+                                              abs(min(0, flow_lps)))
+
+            # Update peak pressure/flow values
+            self.peak_pressure = max(self.peak_pressure, sample_pressure_cmh2o)
+            self.min_pressure = min(self.min_pressure, sample_pressure_cmh2o)
+            self.peak_flow = max(self.peak_flow, sample_flow_slm)
+
         self._measurements.set_pressure_value(pressure_cmh2o)
         self._measurements.set_flow_value(flow_slm)
         self._measurements.set_saturation_percentage(o2_percentage)
 
-        # Update peak pressure/flow values
-        self.peak_pressure = max(self.peak_pressure, pressure_cmh2o)
-        self.min_pressure = min(self.min_pressure, pressure_cmh2o)
-        self.peak_flow = max(self.peak_flow, flow_slm)
-
         # Publish alerts for Pressure
-        if self._config.thresholds.pressure.over(pressure_cmh2o):
+        thresholds = self.thresholds()
+        if pressure_cmh2o > thresholds.pressure_max:
             self.log.warning(
                 "pressure too high %s, top threshold %s",
-                pressure_cmh2o, self._config.thresholds.pressure.max)
-            self._events.alerts_queue.enqueue_alert(AlertCodes.PRESSURE_HIGH, timestamp)
-        elif self._config.thresholds.pressure.below(pressure_cmh2o):
+                pressure_cmh2o, thresholds.pressure_max)
+            self._events.alerts_queue.enqueue_alert(
+                AlertCodes.PRESSURE_HIGH, timestamp, pressure_cmh2o)
+        elif pressure_cmh2o < thresholds.pressure_min:
             self.log.warning(
                 "pressure too low %s, bottom threshold %s",
-                pressure_cmh2o, self._config.thresholds.pressure.min)
-            self._events.alerts_queue.enqueue_alert(AlertCodes.PRESSURE_LOW, timestamp)
+                pressure_cmh2o, thresholds.pressure_min)
+            self._events.alerts_queue.enqueue_alert(
+                AlertCodes.PRESSURE_LOW, timestamp, pressure_cmh2o)
 
         # Publish alerts for Oxygen
         # Oxygen too high
-        if self._config.thresholds.o2.over(o2_percentage):
+        if o2_percentage > thresholds.o2_max:
             self.log.warning(
-                f"Oxygen percentage too high "
-                f"({o2_percentage}% > {self._config.thresholds.o2.max}%)")
+                "Oxygen percentage too high (%s%% > %s%%)",
+                o2_percentage, thresholds.o2_max)
             self._events.alerts_queue.enqueue_alert(
-                AlertCodes.OXYGEN_HIGH, timestamp)
+                AlertCodes.OXYGEN_HIGH, timestamp, o2_percentage)
 
             # Oxygen too low
-        elif self._config.thresholds.o2.below(o2_percentage):
+        elif o2_percentage < thresholds.o2_min:
             self.log.warning(
-                f"Oxygen percentage too low "
-                f"({o2_percentage}% < {self._config.thresholds.o2.min}%)")
+                "Oxygen percentage too low (%s%% < %s%%)",
+                o2_percentage, thresholds.o2_min)
             self._events.alerts_queue.enqueue_alert(
-                AlertCodes.OXYGEN_LOW, timestamp)
+                AlertCodes.OXYGEN_LOW, timestamp, o2_percentage)
 
         self.check_transition(
             flow_slm=flow_slm,
@@ -394,7 +436,7 @@ class VentilationStateMachine(object):
 class Sampler(object):
     def __init__(self, measurements, events, flow_sensor, pressure_sensor,
                  a2d, timer, telemetry_sender=None,
-                 save_sensor_values=False):
+                 save_sensor_values=False, acquisition_rate=None):
         self.log = logging.getLogger(self.__class__.__name__)
         self._measurements = measurements
         self._flow_sensor = flow_sensor
@@ -404,12 +446,59 @@ class Sampler(object):
         self._config = ConfigurationManager.config()
         self._events = events
         self.vsm = VentilationStateMachine(measurements, events, telemetry_sender)
-        self.storage_handler = SamplesStorage()
         self.save_sensor_values = save_sensor_values
+        self.storage_handler = None
+        self.archive_compactor = None
+        if save_sensor_values:
+            recording = self._config.recording
+            self.storage_handler = SamplesStorage(
+                metadata={"config": json.loads(self._config.json())},
+                states=VentilationState,
+                flush_interval=recording.flush_interval,
+                fsync_policy=recording.fsync_policy,
+                fsync_interval=recording.fsync_interval,
+                max_pending_blocks=recording.max_pending_blocks,
+                compress_segments=recording.compress_segments,
+                compression_level=recording.compression_level,
+                compression_cpu_budget=recording.compression_cpu_budget)
+            if recording.tiered_retention:
+                self.archive_compactor = ArchiveCompactor(
+                    self.storage_handler,
+                    full_rate_hours=recording.full_rate_hours,
+                    max_size=recording.archive_max_size,
+                    cpu_budget=recording.compression_cpu_budget)
+
+        # Each sensor gets its own breaker, so a failing sensor would not
+        # hold back the healthy ones.
+        self.sensor_breakers = {
+            AlertCodes.FLOW_SENSOR_ERROR: CircuitBreaker("Flow"),
+            AlertCodes.PRESSURE_SENSOR_ERROR: CircuitBreaker("Pressure"),
+        }
+
+        # In high-rate mode flow and pressure are read by a dedicated task,
+        # and each sampling iteration consumes everything it acquired since.
+        self.acquisition = None
+        if acquisition_rate is not None:
+            self.acquisition = AcquisitionTask(
+                flow_sensor=self._flow_sensor,
+                pressure_sensor=self._pressure_sensor,
+                timer=self._timer,
+                read_sensor=self.read_single_sensor,
+                sample_rate=acquisition_rate,
+                burst_size=self._config.acquisition.burst_size)
 
         auto_calibration = self._config.calibration.auto_calibration
+        # In the background the calibrator sets offsets through a handoff,
+        # which the sampling applies between samples.
+        self.calibration_worker = None
+        self.calibration_jobs = []  # Fed a sample every iteration
+        self.last_flow = None  # Of the last sample, None if it wasn't read
+        dp_driver = self._flow_sensor
+        if auto_calibration.background:
+            dp_driver = OffsetHandoff(self._flow_sensor)
+
         self.auto_calibrator = AutoFlowCalibrator(
-            dp_driver=self._flow_sensor,
+            dp_driver=dp_driver,
             interval_length=auto_calibration.interval,
             iterations=auto_calibration.iterations,
             iteration_length=auto_calibration.iteration_length,
@@ -418,17 +507,78 @@ class Sampler(object):
             min_tail_length=auto_calibration.min_tail,
             grace_length=auto_calibration.grace_length,
         )
+        if auto_calibration.background:
+            self.calibration_worker = CalibrationWorker(
+                self.auto_calibrator, dp_driver, self.save_dp_offset)
+
+    def add_calibration_job(self, job):
+        """Have `job` sample its sensor every sampling iteration, until it's
+        done."""
+        self.calibration_jobs.append(job)
+
+    def run_calibration_jobs(self):
+        for job in self.calibration_jobs:
+            job.sample()
+        self.calibration_jobs = [job for job in self.calibration_jobs
+                                 if not job.done]
+
+    def read_differential_pressure(self):
+        """The raw differential pressure of the last sample, for calibrating.
+
+        It's the one the flow sensor recorded as it was last read, rather
+        than read again, as the acquisition task may be reading the sensor
+        meanwhile. Unlike the sample's flow, it's neither smoothed nor
+        decimated.
+        """
+        differential_pressure = getattr(self._flow_sensor,
+                                        "last_differential_pressure", None)
+        if self.last_flow is None or differential_pressure is None:
+            raise UnavailableMeasurmentError("The flow sensor wasn't read")
+        return differential_pressure
+
+    def save_dp_offset(self, offset):
+        self.log.info("Writing DP offset of %f to config", offset)
+        self._config.calibration.dp_offset = offset
+        ConfigurationManager.instance().save()
+
+    def read_single_sensor(self, sensor, alert_code, timestamp, read=None):
+        """
+        Read a sensor, handling its errors.
+
+        :param read: Optional function to read the sensor with, instead of
+            its `read` method.
+        :return: The read value, or None on error.
+        """
+        if read is None:
+            read = sensor.read
+
+        breaker = self.sensor_breakers[alert_code]
+        if not breaker.allow(timestamp):
+            # The sensor is considered faulty until the breaker's backoff
+            # ends. Don't waste a bus timeout on it.
+            return None
 
-    def read_single_sensor(self, sensor, alert_code, timestamp):
         try:
-            return sensor.read()
+            value = read()
         except UnavailableMeasurmentError as e:
-            self.log.error(e)
+            self.log.error("%s: %s", alert_code, e,
+                           extra={RATE_LIMIT_KEY: alert_code})
         except Exception as e:
             self._events.alerts_queue.enqueue_alert(alert_code, timestamp)
-            self.log.error(e)
+            self.log.error("%s: %s", alert_code, e,
+                           extra={RATE_LIMIT_KEY: alert_code})
+        else:
+            breaker.on_success()
+            return value
+
+        breaker.on_failure(timestamp)
         return None
 
+    def breaker_states(self):
+        """Return the circuit breaker state of each sensor, by alert code."""
+        return {code: breaker.state
+                for code, breaker in self.sensor_breakers.items()}
+
     def read_sensors(self, timestamp):
         """
         Read the sensors and return the samples.
@@ -439,16 +589,28 @@ class Sampler(object):
         :return: Tuple of (flow, pressure, saturation) if there are no errors,
                 or None if an error occurred in any of the drivers.
         """
-        flow_slm = self.read_single_sensor(
+        flow_slm = self.last_flow = self.read_single_sensor(
             self._flow_sensor, AlertCodes.FLOW_SENSOR_ERROR, timestamp)
 
         pressure_cmh2o = self.read_single_sensor(
             self._pressure_sensor, AlertCodes.PRESSURE_SENSOR_ERROR, timestamp)
 
+        o2_saturation_percentage = self.read_a2d(timestamp)
+
+        data = (flow_slm, pressure_cmh2o, o2_saturation_percentage)
+        return [x if x is not None else 0 for x in data]
+
+    def read_a2d(self, timestamp):
+        """
+        Read the oxygen and battery values from the A2D.
+
+        :return: The oxygen saturation percentage, or 0 on error.
+        """
         try:
             o2_saturation_percentage = self._a2d.read_oxygen()
         except Exception as e:
-            self._events.alerts_queue.enqueue_alert(AlertCodes.OXYGEN_SENSOR_ERROR)
+            self._events.alerts_queue.enqueue_alert(
+                AlertCodes.OXYGEN_SENSOR_ERROR, timestamp)
             self.log.error(e)
             o2_saturation_percentage = 0
 
@@ -469,15 +631,26 @@ class Sampler(object):
             self._events.alerts_queue.enqueue_alert(AlertCodes.NO_BATTERY, timestamp)
             self.log.error(e)
 
-        data = (flow_slm, pressure_cmh2o, o2_saturation_percentage)
-        return [x if x is not None else 0 for x in data]
+        return o2_saturation_percentage
 
     def sampling_iteration(self):
-        ts = self._timer.get_time()
+        if self.acquisition is not None:
+            samples = self.acquisition.drain()
+            if not samples:
+                return  # Nothing was acquired since the last iteration
+
+            ts = samples[-1][0]
+            flow_slm, pressure_cmh2o = self.acquisition.decimate(samples)
+            self.last_flow = flow_slm
+            o2_saturation_percentage = self.read_a2d(ts)
+
+        else:
+            samples = None
+            ts = self._timer.get_time()
 
-        # Read from sensors
-        result = self.read_sensors(ts)
-        flow_slm, pressure_cmh2o, o2_saturation_percentage = result
+            # Read from sensors
+            result = self.read_sensors(ts)
+            flow_slm, pressure_cmh2o, o2_saturation_percentage = result
 
         if self.save_sensor_values:
             self.storage_handler.write(flow=flow_slm,
@@ -496,17 +669,25 @@ class Sampler(object):
                                        min(o2_saturation_percentage, 100))
 
         if self._config.calibration.auto_calibration.enable:
-            offset = self.auto_calibrator.get_offset(flow_slm=flow_slm,
-                                                     timestamp=ts)
-
-            if offset is not None:
-                self.log.info("Writing DP offset of %f to config", offset)
-                self._config.calibration.dp_offset = offset
-                ConfigurationManager.instance().save()
+            if self.calibration_worker is not None:
+                # With the offset the flow was read by, before a new one
+                self.calibration_worker.post(
+                    flow_slm, ts, self._flow_sensor.get_calibration_offset())
+                self.calibration_worker.handoff.apply()
+            else:
+                offset = self.auto_calibrator.get_offset(flow_slm=flow_slm,
+                                                         timestamp=ts)
+                if offset is not None:
+                    self.save_dp_offset(offset)
 
         self.vsm.update(
             pressure_cmh2o=pressure_cmh2o,
             flow_slm=flow_slm,
             o2_percentage=o2_saturation_percentage,
             timestamp=ts,
+            samples=samples,
         )
+
+        # Between samples, and on the sampling rate
+        if self.calibration_jobs:
+            self.run_calibration_jobs()
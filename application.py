@@ -56,20 +56,26 @@ class Application(object):
                                         measurements=measurements,
                                         events=events,
                                         drivers=drivers,
-                                        record_sensors=record_sensors)
+                                        record_sensors=record_sensors,
+                                        sampler=sampler)
         self.config = ConfigurationManager.config()
 
         if ConfigurationManager.loaded_from_defaults:
             DefaultConfigSnackbar(self.root).show()
 
-        # Load sensors calibrations
+        # Load sensors calibrations, and again whenever they're changed
+        self.load_calibration(self.config.calibration)
+        ConfigurationManager.instance().subscribe(
+            "calibration", self, self.load_calibration)
+
+    def load_calibration(self, calibration):
         differential_pressure_driver = self.drivers.differential_pressure
-        differential_pressure_driver.set_calibration_offset(self.config.calibration.dp_offset)
+        differential_pressure_driver.set_calibration_offset(calibration.dp_offset)
         oxygen_driver = self.drivers.a2d
         oxygen_driver.set_oxygen_calibration(
             *calc_calibration_line(
-                self.config.calibration.oxygen_point1,
-                self.config.calibration.oxygen_point2))
+                calibration.oxygen_point1,
+                calibration.oxygen_point2))
 
     def exit(self):
         self.root.quit()
@@ -80,6 +86,8 @@ class Application(object):
         self.events.alerts_queue.initial_uptime = uptime()
 
     def gui_update(self):
+        # Apply a changed configuration file here, on the GUI's thread
+        ConfigurationManager.instance().poll()
         self.root.update()
         self.root.update_idletasks()
         self.master_frame.update()
@@ -1,8 +1,9 @@
 import time
+import logging
 import datetime
-from collections import deque
 from enum import IntEnum
-from queue import Queue
+from functools import lru_cache
+from threading import RLock
 
 from uptime import uptime
 
@@ -33,6 +34,7 @@ class AlertCodes(IntEnum):
     PRESSURE_SENSOR_ERROR = 1 << 13
     OXYGEN_SENSOR_ERROR = 1 << 14
     NO_BATTERY = 1 << 15
+    CONFIGURATION_SAVE_ERROR = 1 << 16
 
     def __getitem__(self, item):
         return getattr(self, item)
@@ -42,7 +44,12 @@ class AlertCodes(IntEnum):
         return alert_code in map(int, cls)
 
 
+MEDICAL_CONDITIONS_MASK = (AlertCodes.OXYGEN_HIGH << 1) - 1
+
+
 class Alert(object):
+    __slots__ = ("code", "timestamp", "value", "count", "last_seen", "record")
+
     ALERT_CODE_TO_MESSAGE = {
         AlertCodes.PRESSURE_LOW: "Low Pressure",
         AlertCodes.PRESSURE_HIGH: "High Pressure",
@@ -60,16 +67,24 @@ class Alert(object):
         AlertCodes.PRESSURE_SENSOR_ERROR: "Pressure Sensor Error",
         AlertCodes.OXYGEN_SENSOR_ERROR: "Oxygen Sensor Error",
         AlertCodes.NO_BATTERY: "No Battery",
+        AlertCodes.CONFIGURATION_SAVE_ERROR: "Configuration Save Error",
     }
 
-    def __init__(self, alert_code, timestamp=None):
+    def __init__(self, alert_code, timestamp=None, value=None):
         self.code = alert_code
+        self.value = value  # The measured value which raised it, if any
+        # Of the occurrence which raised it, never changed afterwards
         if timestamp is None:
             self.timestamp = time.time()
 
         else:
             self.timestamp = timestamp
 
+        # Repeated occurrences are collapsed into the active alert
+        self.count = 1
+        self.last_seen = self.timestamp
+        self.record = None  # The number of its record in the alarm history
+
     def __eq__(self, other):
         return self.code == other
 
@@ -86,14 +101,20 @@ class Alert(object):
         return f"Alert(code={self.code}, message={str(self)})"
 
     def __str__(self):
-        if self.code in self.ALERT_CODE_TO_MESSAGE:
-            return self.ALERT_CODE_TO_MESSAGE[self.code]
+        return self.message(self.code)
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def message(alert_code):
+        """:return: The message of an alert code, cached."""
+        if alert_code in Alert.ALERT_CODE_TO_MESSAGE:
+            return Alert.ALERT_CODE_TO_MESSAGE[alert_code]
 
         # For each on bit it in the alert code, we want to concatenate the
         # relevant error message
         errors = []
-        for code, message in self.ALERT_CODE_TO_MESSAGE.items():
-            if self.contains(code):
+        for code, message in Alert.ALERT_CODE_TO_MESSAGE.items():
+            if alert_code & code != 0:
                 errors.append(message)
 
         return " | ".join(errors)
@@ -105,29 +126,123 @@ class Alert(object):
         return datetime.datetime.fromtimestamp(self.timestamp).strftime("%A %X")
 
 
-class AlertsQueue(object):
-    MAXIMUM_ALERTS_AMOUNT = 2
-    MAXIMUM_HISTORY_COUNT = 40
-    TIME_DIFFERENCE_BETWEEN_SAME_ALERTS = 60 * 5
+class AlarmEngine(object):
+    """Decide which occurrences of the alert conditions are announced.
+
+    Each alert code is debounced by its `AlarmPolicy`: a condition is
+    announced once it lasts `min_duration` seconds, and again every
+    `retrigger_interval` seconds while it lasts. It is considered cleared
+    only after `clear_time` seconds without it, so a condition that
+    flickers around its threshold isn't announced over and over.
+
+    The policy is looked up when a condition starts, rather than on each of
+    its occurrences.
+    """
+
+    class _State(object):
+        __slots__ = ("start", "last_seen", "announced", "policy")
+
+        def __init__(self, timestamp, policy):
+            self.start = timestamp
+            self.last_seen = timestamp
+            self.announced = None
+            self.policy = policy
 
     def __init__(self):
-        self.queue = Queue(maxsize=self.MAXIMUM_ALERTS_AMOUNT)
-        # We need `active_alerts` for the telemetry feature. Without it there is
-        # no way to get the active alerts in the system, since Queue is not
-        # iterable and cannot be converted to a list without emptying it.
-        # I intentionally DID NOT change the current workings of AlertsQueue,
-        # in order to avoid changing critical parts of the system in such a
-        # late stage.
-        # TODO: For v2.0 maybe, replace self.queue with a proper data structure
-        #  such as `deque` and call it `active_alerts`.
-        self.active_alerts = deque(maxlen=self.MAXIMUM_HISTORY_COUNT)
-        self.active_alert_set = set()  # Keeps track for duplicates.
+        self._states = {}
+
+    @staticmethod
+    def policy(code):
+        return ConfigurationManager.config().alarms.policy(code)
+
+    def occurrence(self, code, timestamp):
+        """Record an occurrence of a condition.
+
+        :return: Whether the condition should be announced.
+        """
+        state = self._states.get(code)
+        if (state is None or timestamp < state.last_seen or
+                timestamp - state.last_seen > state.policy.clear_time):
+            state = self._states[code] = self._State(timestamp,
+                                                     self.policy(code))
+        else:
+            state.last_seen = timestamp
+
+        if timestamp - state.start < state.policy.min_duration:
+            return False
+
+        if (state.announced is None or
+                timestamp - state.announced >= state.policy.retrigger_interval):
+            state.announced = timestamp
+            return True
+
+        return False
+
+    def reset(self):
+        self._states.clear()
+
+
+class AlertsQueue(object):
+    """The active alerts, and the last one announced.
+
+    The active alert codes are kept as a bitmask, with a table of their
+    `Alert`s in the order they were raised. It's shared by the sampling,
+    GUI and telemetry threads, so it's changed under a lock, and read
+    through snapshots. The observers are notified outside of the lock.
+    """
+
+    def __init__(self, bus=None):
+        self.active_codes = 0  # Bitmask of the active `AlertCodes`
+        self._active = {}  # Alert code -> its `Alert`, in order of raising
+        self._lock = RLock()
         self.last_alert = Alert(AlertCodes.OK)
-        self.observer = Observable()
-        self.initial_uptime = uptime()
+        # Announcements are few, and each is notified of, for its latency to
+        # be measured from the sample which raised it
+        self.observer = Observable(bus, coalesce=False)
+        self.engine = AlarmEngine()
+        # The `HistoryWriter` journaling the alerts, if any
+        self.journal = None
+        # Stamps the alerts raised without a timestamp, and their
+        # acknowledgement. Set to the sampler's timer, for the journal to be
+        # in a single clock's order.
+        self.clock = time.time
+        self.log = logging.getLogger(self.__class__.__name__)
+        self._initial_uptime = uptime()
+        self._grace_time_end = None  # Computed on the first medical alert
+        self._in_grace_time = True
+
+    @property
+    def initial_uptime(self):
+        return self._initial_uptime
+
+    @initial_uptime.setter
+    def initial_uptime(self, value):
+        with self._lock:
+            self._initial_uptime = value
+            self._grace_time_end = None
+            self._in_grace_time = True
+
+    @property
+    def history(self):
+        """The `AlarmHistory` the alerts are journaled to, if any."""
+        return None if self.journal is None else self.journal.history
+
+    @property
+    def active_alerts(self):
+        """:return: A snapshot of the active alerts, oldest first."""
+        with self._lock:
+            return list(self._active.values())
+
+    @property
+    def active_alert_set(self):
+        with self._lock:
+            return set(self._active.values())
+
+    def is_active(self, code):
+        return self.active_codes & code != 0
 
     def __len__(self):
-        return len(self.active_alerts)
+        return len(self._active)
 
     def __str__(self):
         return repr(self)
@@ -135,47 +250,90 @@ class AlertsQueue(object):
     def __repr__(self):
         return f"AlertQueue({str(self.active_alerts)})"
 
-    def enqueue_alert(self, alert, timestamp=None):
-        if not isinstance(alert, Alert):
-            alert = Alert(alert, timestamp)
+    def _in_grace(self):
+        """Whether it's the grace time of the medical alerts after boot.
 
-        grace_time = ConfigurationManager.config().boot_alert_grace_time
-        grace_time_end = self.initial_uptime + grace_time
-        if alert.is_medical_condition() and uptime() < grace_time_end:
-            return
+        Once it's over, `uptime()` isn't checked anymore.
+        """
+        if not self._in_grace_time:
+            return False
 
-        if self.queue.qsize() == self.MAXIMUM_ALERTS_AMOUNT:
-            self.dequeue_alert()
+        if self._grace_time_end is None:
+            grace_time = ConfigurationManager.config().boot_alert_grace_time
+            self._grace_time_end = self._initial_uptime + grace_time
 
-        self.last_alert = alert
+        self._in_grace_time = uptime() < self._grace_time_end
+        return self._in_grace_time
 
-        self.observer.publish(self.last_alert)
-        self.queue.put(alert)
-        if alert not in self.active_alert_set:
-            self.active_alerts.append(alert)
-            self.active_alert_set.add(alert)
+    def _journal(self, alert, acknowledged=None):
+        # Only queued, the writer thread does the I/O
+        if self.journal is not None:
+            self.journal.journal(alert, acknowledged)
 
-    def dequeue_alert(self):
-        alert = self.queue.get()
-        self.last_alert = self.queue.queue[0]
+    def enqueue_alert(self, alert, timestamp=None, value=None):
+        """
+        :param value: The measured value which raised the alert, if any.
+        """
+        if isinstance(alert, Alert):
+            code, timestamp = alert.code, alert.timestamp
+        else:
+            code, alert = alert, None
+            if timestamp is None:
+                timestamp = self.clock()
 
-        self.observer.publish(self.last_alert)
-        return alert
+        with self._lock:
+            if code & MEDICAL_CONDITIONS_MASK and self._in_grace():
+                return
 
-    def clear_alerts(self):
-        # Note that emptying a queue is not thread-safe
-        self.queue.queue.clear()
-        self.active_alerts.clear()
-        self.active_alert_set.clear()
+            announce = self.engine.occurrence(code, timestamp)
+            active = self._active.get(code)
+            if active is not None:
+                active.count += 1
+                active.last_seen = timestamp
+            if not announce:
+                return
 
-        self.last_alert = Alert(AlertCodes.OK)
-        self.observer.publish(self.last_alert)
+            if active is None:
+                active = alert if alert is not None else Alert(code, timestamp,
+                                                               value)
+                self._active[code] = active
+                self.active_codes |= code
+
+            self.last_alert = active
+            self._journal(active)
+
+        self.observer.publish(active)
+
+    def clear_alerts(self):
+        with self._lock:
+            acknowledged = self.clock()
+            for alert in self._active.values():
+                self._journal(alert, acknowledged)
+            self._active.clear()
+            self.active_codes = 0
+            # Conditions which still hold are announced again
+            self.engine.reset()
+            self.last_alert = ok = Alert(AlertCodes.OK)
+
+        self.observer.publish(ok)
+
+    def close(self):
+        """Complete the journal records of the active alerts."""
+        with self._lock:
+            for alert in self._active.values():
+                self._journal(alert)
+            journal, self.journal = self.journal, None
+
+        if journal is not None:
+            journal.stop()
+            journal.join()
+            journal.history.close()
 
 
 class MuteAlerts(object):
 
-    def __init__(self):
-        self.observer = Observable()
+    def __init__(self, bus=None):
+        self.observer = Observable(bus)
         self._alerts_muted = False
         self.mute_time = None
 
@@ -1,13 +1,25 @@
 from __future__ import annotations
 
-import logging
 import os
-from typing import Optional
+import json
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+from threading import Thread, Event, Lock
+from dataclasses import field, is_dataclass
+from enum import Enum
+from typing import Dict, Optional
 
-from pydantic import BaseModel, AnyHttpUrl
+from pydantic import BaseModel, AnyHttpUrl, confloat
 from pydantic.dataclasses import dataclass
 
-from data.thresholds import PressureRange, VolumeRange, O2Range, RespiratoryRateRange
+from data import thresholds
+from data.observable import Observable
+from data.thresholds import (PressureRange, VolumeRange, O2Range,
+                             RespiratoryRateRange, ThresholdsSnapshot)
 
 
 @dataclass
@@ -23,6 +35,24 @@ class ThresholdsConfig:
     pressure: PressureRange = PressureRange(min=10, max=50, step=1)
     respiratory_rate: RespiratoryRateRange = RespiratoryRateRange(min=5, max=45, step=1)
 
+    def __setattr__(self, key, value):
+        # Replacing a range, rather than initializing it, is a change
+        modified = key in self.__dict__ and key in self.__dataclass_fields__
+        self.__dict__[key] = value
+        if modified:
+            thresholds.changed()
+
+    def snapshot(self):
+        """Compile the thresholds into a `ThresholdsSnapshot`."""
+        # Taken before reading the ranges, so a change made meanwhile would
+        # leave the snapshot stale rather than missed.
+        version = thresholds.version()
+        return ThresholdsSnapshot(version,
+                                  *self.pressure.limits(),
+                                  *self.o2.limits(),
+                                  *self.volume.limits(),
+                                  *self.respiratory_rate.limits())
+
 
 @dataclass
 class GraphYAxisConfig:
@@ -49,6 +79,8 @@ class AutoCalibrationConfig:
     slope_threshold: float = 10
     min_tail: int = 12
     grace_length: int = 5
+    # Analyse the flow on a worker thread, rather than while sampling
+    background: bool = False
 
 
 @dataclass
@@ -67,6 +99,66 @@ class GraphsConfig:
     pressure: GraphYAxisConfig = GraphYAxisConfig(min=-10, max=50, autoscale=False)
 
 
+@dataclass
+class AcquisitionConfig:
+    # Read flow and pressure on a dedicated task, at `sample_rate` HZ
+    high_rate: bool = False
+    sample_rate: float = 200
+    # Flow samples to read on each acquisition, if the sensor supports it
+    burst_size: int = 1
+
+
+class FsyncPolicy(str, Enum):
+    Never = "never"  # Leave it to the OS
+    Always = "always"  # On every flush
+    Periodic = "periodic"  # Every `fsync_interval` seconds
+
+
+@dataclass
+class RecordingConfig:
+    # Recorded samples are written to disk in the background, this often
+    flush_interval: float = 2
+    fsync_policy: FsyncPolicy = FsyncPolicy.Periodic
+    fsync_interval: float = 60
+    # Blocks of samples waiting to be written (~8 seconds each). When the
+    # disk can't keep up and all of them are full, new samples are dropped.
+    max_pending_blocks: int = 32
+    # Rotated segments are compressed in the background, using at most this
+    # share of a CPU core, which is more than 0, and up to 1.
+    compress_segments: bool = True
+    compression_level: int = 6
+    compression_cpu_budget: confloat(gt=0, le=1) = 0.25
+    # Rotated segments are kept at full rate for `full_rate_hours`, and are
+    # then left only in the archive - a record per breath, and the waveforms'
+    # min/max per second - which takes up to `archive_max_size` bytes.
+    tiered_retention: bool = True
+    full_rate_hours: float = 24
+    archive_max_size: int = 256 * 2 ** 20
+
+
+@dataclass
+class AlarmPolicy:
+    # Seconds the condition should last before it's alarmed
+    min_duration: float = 0
+    # Seconds without the condition, after which it's considered cleared, and
+    # is alarmed again once it's back
+    clear_time: float = 10
+    # Seconds between the announcements of a lasting condition
+    retrigger_interval: float = 300
+
+
+@dataclass
+class AlarmsConfig:
+    default: AlarmPolicy = AlarmPolicy()
+    # Policies of specific alerts, by their code's name, e.g. "PRESSURE_HIGH"
+    per_alert: Dict[str, AlarmPolicy] = field(default_factory=dict)
+    # Journal the alarms to disk, for the alerts history
+    record_history: bool = True
+
+    def policy(self, code):
+        return self.per_alert.get(getattr(code, "name", None), self.default)
+
+
 @dataclass
 class TelemetryConfig:
     enable: bool = False
@@ -83,8 +175,30 @@ class Config(BaseModel):
     low_battery_percentage: float = 15
     mute_time_limit: float = 120
     boot_alert_grace_time: float = 7
+    alarms: AlarmsConfig = AlarmsConfig()
     record_sensors: bool = False
+    recording: RecordingConfig = RecordingConfig()
     telemetry: TelemetryConfig = TelemetryConfig()
+    acquisition: AcquisitionConfig = AcquisitionConfig()
+    hot_reload: bool = False
+
+
+def _copy_fields(target, source):
+    """Copy the fields of dataclass `source` into `target`, of the same type.
+
+    Nested dataclasses are copied into as well, so that objects held by the
+    configuration's consumers stay the configuration's.
+    """
+    for name in source.__dataclass_fields__:
+        _set_field(target, name, getattr(source, name))
+
+
+def _set_field(target, name, value):
+    current = getattr(target, name)
+    if is_dataclass(current) and type(current) is type(value):
+        _copy_fields(current, value)
+    else:
+        setattr(target, name, value)
 
 
 class ConfigurationManager(object):
@@ -92,6 +206,12 @@ class ConfigurationManager(object):
 
     This class has a shared global instance that can be used across the
     application. It is accessible through the `instance()` method
+
+    The configuration is changed in place, so consumers may keep the `Config`
+    object, or any of its sections. Those who act on a change subscribe to
+    the sections they use, e.g. "thresholds". The changes are found when
+    the configuration is written or loaded, and are notified by `poll`, on
+    the GUI's thread.
     """
     __instance: ConfigurationManager = None
     THIS_DIRECTORY = os.path.dirname(__file__)
@@ -110,7 +230,7 @@ class ConfigurationManager(object):
     @classmethod
     def initialize(cls, events, path=CONFIG_FILE):
         log = logging.getLogger(cls.__name__)
-        cls.__instance = ConfigurationManager(path)
+        cls.__instance = ConfigurationManager(path, events)
         try:
             cls.__instance.load()
         except FileNotFoundError:
@@ -127,22 +247,289 @@ class ConfigurationManager(object):
             cls.__instance.save()
         return cls.__instance
 
-    def __init__(self, path):
+    def __init__(self, path, events=None):
         self._path = path
+        self._events = events
         self._log = logging.getLogger(self.__class__.__name__)
         self.config = Config()
+        # Saves in the background once started, and inline until then
+        self.writer = ConfigWriter(self)
+        self._observers = {}  # Section name -> `Observable` of its changes
+        self._sections = self._dump()  # As of the last written or loaded
+        self._changed = set()  # Names of the sections yet to be notified
+        self._changes_lock = Lock()
+        self._written = None  # The content of the last write
+        self._reload = Event()
+
+    @property
+    def path(self):
+        return self._path
+
+    def subscribe(self, section, subscriber, callback):
+        """Call `callback` with the section named `section` when it changes."""
+        if section not in Config.__fields__:
+            raise KeyError(f"No configuration section {section}")
+        self._observers.setdefault(section, Observable()).subscribe(
+            subscriber, callback)
+
+    def unsubscribe(self, section, subscriber):
+        self._observers[section].unsubscribe(subscriber)
+
+    def _dump(self, content=None):
+        # Sections are dataclasses, which `dict()` keeps by reference
+        return json.loads(self.config.json() if content is None else content)
+
+    def _find_changes(self, content=None):
+        """Note the sections changed since they were last written or loaded.
+
+        :param content: The configuration's JSON, if it was already dumped.
+        """
+        sections = self._dump(content)
+        with self._changes_lock:
+            self._changed.update(name for name, value in sections.items()
+                                 if self._sections.get(name) != value)
+            self._sections = sections
+
+    def notify_changes(self):
+        """Notify the subscribers of the sections changed since the last
+        notification.
+
+        :return: The names of the changed sections.
+        """
+        with self._changes_lock:
+            changed = [name for name in Config.__fields__
+                       if name in self._changed]
+            self._changed.clear()
+        for name in changed:
+            observer = self._observers.get(name)
+            if observer is not None:
+                observer.publish(getattr(self.config, name))
+        return changed
+
+    def _apply(self, config):
+        for name in Config.__fields__:
+            _set_field(self.config, name, getattr(config, name))
+        thresholds.changed()
+        self._find_changes()
 
     def load(self):
-        self.config = Config.parse_file(self._path)
+        self._apply(Config.parse_file(self._path))
         self._log.info("Configuration loaded from %s", self._path)
 
+    def reload(self):
+        """Load the configuration file, if it was changed by others.
+
+        An invalid file is alerted on, and the configuration is kept as is.
+        :return: Whether the configuration was loaded.
+        """
+        try:
+            with open(self._path) as f:
+                content = f.read()
+            if content == self._written:
+                return False
+            config = Config.parse_raw(content)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            self._log.error("Error reloading config file: %s. Ignored", e)
+            if self._events is not None:
+                from data.alerts import AlertCodes
+                self._events.alerts_queue.enqueue_alert(
+                    AlertCodes.INVALID_CONFIGURATION_FILE)
+            return False
+
+        self._apply(config)
+        self._written = content
+        self._log.info("Configuration reloaded from %s", self._path)
+        return True
+
+    def request_reload(self):
+        """Have the next `poll` reload the configuration file."""
+        self._reload.set()
+
+    def poll(self):
+        """Reload the configuration file if requested, and notify the
+        changes, on the calling thread.
+
+        Called periodically by the GUI, so that the subscribers are notified
+        on its thread.
+        """
+        if self._reload.is_set():
+            self._reload.clear()
+            self.reload()
+        self.notify_changes()
+
     def save(self):
+        """Save the configuration, by the writer if it's running."""
+        if self.writer.is_alive():
+            self.writer.request()
+        else:
+            self.write()
+
+    def write(self):
+        """Write the configuration atomically - to a temporary file, which
+        then replaces the configuration file."""
+        temp_path = f"{self._path}.tmp"
         try:
-            with open(self._path, "w") as f:
-                f.write(self.config.json(indent=2))
+            content = self.config.json(indent=2)
+            self._find_changes(content)
+            with open(temp_path, "w") as f:
+                f.write(content)
                 f.flush()
                 os.fsync(f.fileno())
+            os.replace(temp_path, self._path)
+            self._written = content
+            directory = os.open(os.path.dirname(os.path.abspath(self._path)),
+                                os.O_RDONLY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
             self._log.info("Configuration saved to %s", self._path)
         except Exception as e:
-            # There's nothing more we can do about it.
+            # There's nothing more we can do about it, but to let them know.
             self._log.error("Error saving configuration: %s", e)
+            if self._events is not None:
+                from data.alerts import AlertCodes
+                self._events.alerts_queue.enqueue_alert(
+                    AlertCodes.CONFIGURATION_SAVE_ERROR)
+
+
+class ConfigWriter(Thread):
+    """Save the configuration in the background.
+
+    Saves requested less than `delay` seconds apart are written once, after
+    the last of them.
+    """
+
+    def __init__(self, manager, delay=0.5):
+        super(ConfigWriter, self).__init__()
+        self.daemon = True
+        self.manager = manager
+        self.delay = delay
+        self.should_run = True
+        self.wake = Event()
+        self._pending = Event()
+        self.log = logging.getLogger(self.__class__.__name__)
+
+    def request(self):
+        self._pending.set()
+        self.wake.set()
+
+    def stop(self):
+        self.should_run = False
+        self.wake.set()
+
+    def flush(self):
+        """Write the configuration, if a save is pending."""
+        if self._pending.is_set():
+            self._pending.clear()
+            self.manager.write()
+
+    def run(self):
+        while self.should_run:
+            self.wake.wait()
+            self.wake.clear()
+            # Let rapid successive changes settle
+            while self.should_run and self.wake.wait(self.delay):
+                self.wake.clear()
+            self.flush()
+
+        self.flush()
+
+
+class ConfigWatcher(Thread):
+    """Request reloading the configuration file when it's changed.
+
+    Watches the file's directory with inotify, as the file is replaced rather
+    than written to. Where inotify isn't available, the file's modification
+    time is checked every `interval` seconds instead.
+    """
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_TO = 0x80
+    EVENT = struct.Struct("iIII")  # wd, mask, cookie, length of the name
+
+    def __init__(self, manager, interval=1):
+        super(ConfigWatcher, self).__init__()
+        self.daemon = True
+        self.manager = manager
+        self.interval = interval
+        self.should_run = True
+        self.wake = Event()
+        self.log = logging.getLogger(self.__class__.__name__)
+        self._name = os.path.basename(manager.path).encode()
+
+    def stop(self):
+        self.should_run = False
+        self.wake.set()
+
+    def _inotify(self):
+        """:return: An inotify descriptor watching the configuration's
+            directory, or None if inotify isn't available."""
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+
+        directory = os.path.dirname(os.path.abspath(self.manager.path))
+        if libc.inotify_add_watch(fd, directory.encode(),
+                                  self.IN_CLOSE_WRITE | self.IN_MOVED_TO) < 0:
+            self.log.warning("Can't watch %s: %s", directory,
+                             os.strerror(ctypes.get_errno()))
+            os.close(fd)
+            return None
+
+        return fd
+
+    def _changed(self, fd):
+        """:return: Whether the events read from `fd` are of the file."""
+        try:
+            data = os.read(fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return False
+            raise
+
+        changed = False
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            changed = changed or name == self._name
+        return changed
+
+    def _modified(self):
+        try:
+            return os.stat(self.manager.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _watch_modification_time(self):
+        modified = self._modified()
+        while self.should_run:
+            self.wake.wait(self.interval)
+            current = self._modified()
+            if current != modified:
+                modified = current
+                self.manager.request_reload()
+
+    def run(self):
+        fd = self._inotify()
+        if fd is None:
+            self.log.info("inotify isn't available, checking %s every %ss",
+                          self.manager.path, self.interval)
+            self._watch_modification_time()
+            return
+
+        try:
+            while self.should_run:
+                readable, _, _ = select.select([fd], [], [], self.interval)
+                if readable and self._changed(fd):
+                    self.manager.request_reload()
+        finally:
+            os.close(fd)
@@ -6,6 +6,10 @@ log = logging.getLogger(__name__)
 
 
 class Events(object):
-    def __init__(self):
-        self.alerts_queue = AlertsQueue()
-        self.mute_alerts = MuteAlerts()
+    def __init__(self, bus=None):
+        """
+        :param bus: The `EventBus` to notify the subscribers on, or None to
+            notify them inline.
+        """
+        self.alerts_queue = AlertsQueue(bus)
+        self.mute_alerts = MuteAlerts(bus)
@@ -1,13 +1,154 @@
+import time
+import logging
+from heapq import heappush, heappop
+from itertools import count
+from threading import Thread, Condition
+
+# Priority of the subscribers which act on the patient's safety, such as the
+# alarm buzzer and LEDs. They're notified before any other.
+SAFETY_PRIORITY = 10
+
+
 class Observable(object):
-    def __init__(self):
+    """Notify subscribers of published values.
+
+    Without a bus the subscribers are called inline, by the publisher.
+    With an `EventBus` they are called by its dispatcher thread, and when
+    `coalesce` is set, a subscriber which falls behind is notified only of
+    the latest value.
+    """
+
+    def __init__(self, bus=None, coalesce=True):
         self._subscribers = {}
+        self.bus = bus
+        self.coalesce = coalesce
 
-    def subscribe(self, object, callback):
-        self._subscribers[object] = callback
+    def subscribe(self, object, callback, priority=0):
+        self._subscribers[object] = (callback, priority)
 
     def unsubscribe(self, object):
         del self._subscribers[object]
 
+    def subscriptions(self):
+        """:return: (subscriber, callback, priority) of each subscriber, the
+            highest priority first."""
+        subscriptions = [(key, callback, priority) for key, (callback, priority)
+                         in list(self._subscribers.items())]
+        subscriptions.sort(key=lambda subscription: -subscription[2])
+        return subscriptions
+
     def publish(self, value):
-        for callback in self._subscribers.values():
+        if self.bus is not None:
+            self.bus.post(self, value)
+            return
+
+        for _, callback, _ in self.subscriptions():
+            callback(value)
+
+
+class EventBus(Thread):
+    """Notify the subscribers of `Observable`s on a dispatcher thread.
+
+    Publishing only queues a notification per subscriber, so a slow
+    subscriber doesn't hold up the publisher. Notifications are delivered
+    by the subscribers' priority, and then in the order they were published.
+    """
+
+    def __init__(self):
+        super(EventBus, self).__init__()
+        self.daemon = True
+        self.should_run = True
+        self.log = logging.getLogger(self.__class__.__name__)
+        self._condition = Condition()
+        self._sequence = count()
+        # (-priority, sequence, coalesced slot, callback, value, posted)
+        self._pending = []
+        # (observable, subscriber) -> latest (value, posted), of coalescing
+        # observables with a pending notification
+        self._latest = {}
+
+        self.dispatched = 0
+        self.coalesced = 0
+        self.max_latency = 0
+        self._total_latency = 0
+
+    def post(self, observable, value):
+        posted = time.monotonic()
+        with self._condition:
+            for key, callback, priority in observable.subscriptions():
+                slot = None
+                if observable.coalesce:
+                    slot = (observable, key)
+                    pending = slot in self._latest
+                    self._latest[slot] = (value, posted)
+                    if pending:
+                        self.coalesced += 1
+                        continue
+
+                heappush(self._pending, (-priority, next(self._sequence),
+                                         slot, callback, value, posted))
+
+            self._condition.notify()
+
+    @property
+    def depth(self):
+        """The number of pending notifications."""
+        return len(self._pending)
+
+    def metrics(self):
+        """:return: The queue depth, and the dispatch latency in seconds -
+            from publishing a value to notifying a subscriber of it."""
+        with self._condition:
+            dispatched = self.dispatched
+            return {
+                "depth": len(self._pending),
+                "dispatched": dispatched,
+                "coalesced": self.coalesced,
+                "average_latency": (self._total_latency / dispatched
+                                    if dispatched else 0),
+                "max_latency": self.max_latency,
+            }
+
+    def dispatch(self, timeout=None):
+        """Deliver the next notification, waiting up to `timeout` for one.
+
+        Once the bus is stopped, only waits for notifications already pending.
+
+        :return: Whether a notification was delivered.
+        """
+        with self._condition:
+            # Checked under the lock, so a stop can't slip in before the wait
+            self._condition.wait_for(
+                lambda: self._pending or not self.should_run, timeout)
+            if not self._pending:
+                return False
+
+            _, _, slot, callback, value, posted = heappop(self._pending)
+            if slot is not None:
+                value, posted = self._latest.pop(slot)
+
+            latency = time.monotonic() - posted
+            self.dispatched += 1
+            self._total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+        # noinspection PyBroadException
+        try:
             callback(value)
+        except Exception:
+            self.log.exception("Subscriber %r failed", callback)
+
+        return True
+
+    def stop(self):
+        with self._condition:
+            self.should_run = False
+            self._condition.notify()
+
+    def run(self):
+        while self.should_run:
+            self.dispatch()
+
+        # Deliver what's left, e.g. the alarms state on exit
+        while self.dispatch(timeout=0):
+            pass
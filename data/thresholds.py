@@ -1,5 +1,43 @@
+from typing import NamedTuple
+from threading import Lock
+
 from pydantic.dataclasses import dataclass
 
+# Counts the changes to the thresholds, so their compiled snapshots can tell
+# when they are stale. Changed from the GUI and the configuration's threads.
+_version = 0
+_version_lock = Lock()
+
+
+def version():
+    """:return: The number of changes to the thresholds so far."""
+    return _version
+
+
+def changed():
+    """Mark the compiled snapshots of the thresholds as stale."""
+    global _version  # pylint: disable=global-statement
+    with _version_lock:
+        _version += 1
+
+
+class ThresholdsSnapshot(NamedTuple):
+    """The thresholds, as plain numbers for the checks of every sample.
+
+    Unset limits are infinite, so they are never crossed. A snapshot is never
+    modified - a change to the thresholds compiles a new one instead, which
+    replaces the stale snapshot in a single assignment.
+    """
+    version: int
+    pressure_min: float
+    pressure_max: float
+    o2_min: float
+    o2_max: float
+    volume_min: float
+    volume_max: float
+    respiratory_rate_min: float
+    respiratory_rate_max: float
+
 
 @dataclass
 class Range:
@@ -11,12 +49,24 @@ class Range:
     step: float = 0.5
 
     def __setattr__(self, key, value):
+        # Only a change of a constructed range's limits, not their
+        # initialization, makes the snapshots stale
+        modified = key in ("min", "max") and key in self.__dict__
+
         # We want to limit the precision of thresholds to 3 after the dot
         if key in ("min", "max") and value is not None:
             self.__dict__[key] = float("{:.3f}".format(value))
         else:
             self.__dict__[key] = value
 
+        if modified:
+            changed()
+
+    def limits(self):
+        """:return: The minimum and maximum, infinite if unset."""
+        return (float("-inf") if self.min is None else self.min,
+                float("inf") if self.max is None else self.max)
+
     def below(self, value):
         """
         Test is a value is below the range.
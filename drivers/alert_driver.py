@@ -11,45 +11,58 @@ class AlertDriver(object):
 
     def __init__(self):
         GPIO.setmode(GPIO.BCM)
+        self._levels = {}  # Pin -> the level last written to it
 
         # Set System fault GPIO
         GPIO.setup(self.SYSTEM_FAULT_GPIO, GPIO.OUT)
-        GPIO.output(self.SYSTEM_FAULT_GPIO, self.LED_GREEN)
+        self._output(self.SYSTEM_FAULT_GPIO, self.LED_GREEN)
 
         # Set medical contition GPIO
         GPIO.setup(self.MEDICAL_CONTITION_GPIO, GPIO.OUT)
-        GPIO.output(self.MEDICAL_CONTITION_GPIO, self.LED_GREEN)
+        self._output(self.MEDICAL_CONTITION_GPIO, self.LED_GREEN)
 
         # Set buzzer GPIO
         GPIO.setup(self.FAULT_BUZZER_GPIO, GPIO.OUT)
-        GPIO.output(self.FAULT_BUZZER_GPIO, GPIO.HIGH)
+        self._output(self.FAULT_BUZZER_GPIO, GPIO.HIGH)
 
         # Set wd GPIO
         GPIO.setup(self.WD_GPIO, GPIO.OUT)
-        GPIO.output(self.WD_GPIO, self.LED_GREEN)
+        self._output(self.WD_GPIO, self.LED_GREEN)
+
+    def _output(self, pin, level):
+        """Write `level` to `pin`, unless it's already at that level.
+
+        :return: Whether the pin was written.
+        """
+        if self._levels.get(pin) == level:
+            return False
+
+        GPIO.output(pin, level)
+        self._levels[pin] = level
+        return True
 
     def set_system_fault_alert(self, value: bool, mute: bool):
         led = self.LED_GREEN
         if not value:
             led = self.LED_RED
 
-        GPIO.output(self.SYSTEM_FAULT_GPIO, led)
-        self.set_buzzer(value or mute)
+        written = self._output(self.SYSTEM_FAULT_GPIO, led)
+        return self.set_buzzer(value or mute) or written
 
     def set_medical_condition_alert(self, value: bool, mute: bool):
         led = self.LED_GREEN
         if not value:
             led = self.LED_RED
 
-        GPIO.output(self.MEDICAL_CONTITION_GPIO, led)
-        self.set_buzzer(value or mute)
+        written = self._output(self.MEDICAL_CONTITION_GPIO, led)
+        return self.set_buzzer(value or mute) or written
 
     def set_buzzer(self, value: bool):
         gpio_state = GPIO.HIGH
         if not value:
             gpio_state = GPIO.LOW
 
-        GPIO.output(self.FAULT_BUZZER_GPIO, gpio_state)
+        return self._output(self.FAULT_BUZZER_GPIO, gpio_state)
 
     def close(self):
         pass
@@ -0,0 +1,99 @@
+"""Benchmark the sensor drivers against the emulated bus.
+
+Measures how many reads per second each driver sustains, given the bus
+latency and fault probability, without any hardware.
+"""
+import time
+import argparse
+import logging
+from statistics import mean, median
+
+from drivers.emulation.bus import Fault
+from drivers.emulation.board import EmulatedBoard
+
+FAULTS = (Fault.NACK, Fault.READ_FAILED, Fault.SHORT_READ, Fault.NOT_READY,
+          Fault.CRC, Fault.STALE, Fault.DIAGNOSTIC)
+
+
+def benchmark(name, read, count):
+    durations = []
+    errors = 0
+    for _ in range(count):
+        start = time.perf_counter()
+        try:
+            read()
+        except Exception:
+            # The sampler treats any exception as a failed read
+            errors += 1
+        durations.append(time.perf_counter() - start)
+
+    total = sum(durations)
+    print(f"{name:<8} {count / total:10.0f} reads/sec   "
+          f"mean {mean(durations) * 1e6:8.1f}us   "
+          f"median {median(durations) * 1e6:8.1f}us   "
+          f"max {max(durations) * 1e6:8.1f}us   "
+          f"errors {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reads", "-n", type=int, default=1000)
+    parser.add_argument("--transaction-latency", "-t", type=float, default=0,
+                        help="Latency of each bus transaction, in seconds")
+    parser.add_argument("--byte-latency", "-b", type=float, default=0,
+                        help="Latency of each transferred byte, in seconds")
+    parser.add_argument("--error", "-e", type=float, default=0,
+                        help="The probability of each fault, "
+                             "in each transaction")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--verbose", "-v", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.CRITICAL)
+
+    board = EmulatedBoard(transaction_latency=args.transaction_latency,
+                          byte_latency=args.byte_latency, seed=args.seed)
+    board.install()
+
+    # The drivers must be imported only after the emulation is installed
+    from drivers.abp_pressure_sensor import AbpPressureSensor
+    from drivers.hsc_pressure_sensor import HscPressureSensor
+    from drivers.sfm3200_flow_sensor import Sfm3200
+    from drivers.sdp8_pressure_sensor import SdpPressureSensor
+    from drivers.ads7844_a2d import Ads7844A2D
+    from drivers.hce_pressure_sensor import HcePressureSensor
+    from drivers.rv8523_rtc import Rv8523Rtc
+
+    drivers = {
+        "ABP": AbpPressureSensor(),
+        "HSC": HscPressureSensor(),
+        "SFM3200": Sfm3200(),
+        "SDP8": SdpPressureSensor(),
+        "HCE": HcePressureSensor(),
+        "RTC": Rv8523Rtc(),
+    }
+    a2d = Ads7844A2D()
+
+    board.abp.signal = 20
+    board.hsc.signal = 0.5
+    board.sfm.signal = 30
+    board.sdp.signal = 0.5
+    board.hce.signal = 1000
+    board.a2d.channels = {Ads7844A2D.OXYGEN_CHANNEL: 0.5}
+
+    for device in (board.abp, board.hsc, board.sfm, board.sdp, board.rtc,
+                   board.hce, board.a2d):
+        for fault in FAULTS:
+            device.set_fault(fault, args.error)
+
+    board.reset_statistics()
+    for name, driver in drivers.items():
+        benchmark(name, driver.read, args.reads)
+    benchmark("A2D", a2d.read_oxygen_raw, args.reads)
+
+    print(f"\n{board.transactions} transactions, "
+          f"{board.transferred_bytes} bytes, {board.failures} bus failures")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,10 @@
-import csv
 import logging
 import functools
 from cached_property import cached_property
 
 from drivers.mocks.sinus import sinus, truncate, add_noise, zero
-
-
-def generate_data_from_file(sensor, file_path):
-    with open(file_path, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            yield float(row[sensor])
+from drivers.mocks.patient import SyntheticPatient
+from drivers.mocks.recording import Recording
 
 
 def production(func):
@@ -38,6 +32,9 @@ class DriverFactory(object):
     MOCK_O2_SATURATION_AMPLITUDE = BASE_O2_SATURATION + OFFSET_O2_SATURATION
     MOCK_O2_SATURATION_LOWER_LIMIT = BASE_O2_SATURATION - OFFSET_O2_SATURATION
     VALID_SLOPE_INTERVALS = 0.05
+    GENERATED_SOURCES = ["sinus", "dead", "noiseless_sinus", "noise", "patient"]
+    # Endless sources, which shouldn't be replayed
+    STREAMED_SOURCES = ["patient"]
 
     __instance = None
 
@@ -50,12 +47,19 @@ class DriverFactory(object):
     def instance(cls):
         return cls.__instance
 
-    def __init__(self, simulation_mode, simulation_data=None, error_probability=0):
+    def __init__(self, simulation_mode, simulation_data=None, error_probability=0,
+                 simulation_start=None, simulation_end=None):
         self.mock = simulation_mode
         if simulation_data is None:
             simulation_data = 'sinus'
         self.simulation_data = simulation_data  # can be either `sinus` or file path
+        # Unix times to replay the simulation file between
+        self.simulation_start = simulation_start
+        self.simulation_end = simulation_end
         self.error_probability = error_probability
+        self.patient = SyntheticPatient(bpm=self.MOCK_BPM,
+                                        noise_sigma=self.MOCK_NOISE_SIGMA)
+        self._recording = None
         self.drivers_cache = {}
         self.log = logging.getLogger(self.__class__.__name__)
 
@@ -123,6 +127,9 @@ class DriverFactory(object):
             self.MOCK_BPM / 60)
         return samples
 
+    def generate_mock_patient_data(self, signal):
+        return self.patient.stream(signal, self.MOCK_SAMPLE_RATE_HZ)
+
     def generate_mock_a2d_data(self):
         samples = sinus(
             self.MOCK_SAMPLE_RATE_HZ,
@@ -185,11 +192,20 @@ class DriverFactory(object):
         from drivers.mux_i2c import MuxI2C
         return cached_property(self.mux, MuxI2C)
 
+    @property
+    def recording(self):
+        """The simulation file, loaded once for all of the mock drivers."""
+        if self._recording is None:
+            self._recording = Recording.load(self.simulation_data,
+                                             self.simulation_start,
+                                             self.simulation_end)
+        return self._recording
+
     def _get_data(self, data_source, data_type):
         source = data_source.get(self.simulation_data)
         if source is not None:
             return source()
-        return generate_data_from_file(data_type, self.simulation_data)
+        return self.recording.column(data_type)
 
     @property
     def mock_pressure(self):
@@ -198,11 +214,14 @@ class DriverFactory(object):
         data_sources = {'dead': self.generate_mock_dead_man,
                         'sinus': self.generate_mock_pressure_data,
                         'noiseless_sinus': self.generate_mock_pressure_data_noiseless,
-                        'noise': self.generate_mock_noise}
+                        'noise': self.generate_mock_noise,
+                        'patient': functools.partial(
+                            self.generate_mock_patient_data, 'pressure')}
 
         data = self._get_data(data_sources, 'pressure')
 
-        return MockSensor(data, error_probability=self.error_probability)
+        return MockSensor(data, error_probability=self.error_probability,
+                          repeat=self.simulation_data not in self.STREAMED_SOURCES)
 
     @property
     def mock_flow(self):
@@ -211,27 +230,32 @@ class DriverFactory(object):
         data_sources = {'dead': self.generate_mock_dead_man,
                         'sinus': self.generate_mock_air_flow_data,
                         'noiseless_sinus': self.generate_mock_air_flow_data_noiseless,
-                        'noise': self.generate_mock_noise}
+                        'noise': self.generate_mock_noise,
+                        'patient': functools.partial(
+                            self.generate_mock_patient_data, 'flow')}
 
         data = self._get_data(data_sources, 'flow')
 
-        return DifferentialPressureMockSensor(data,
-                                              error_probability=self.error_probability)
+        return DifferentialPressureMockSensor(
+            data, error_probability=self.error_probability,
+            repeat=self.simulation_data not in self.STREAMED_SOURCES)
 
     @property
     def mock_timer(self):
         from drivers.mocks.timer import MockTimer
 
-        if self.simulation_data in ["sinus", "dead", "noiseless_sinus", "noise"]:
+        if self.simulation_data in self.GENERATED_SOURCES:
             time_series = [0, 1 / self.MOCK_SAMPLE_RATE_HZ]
         else:
-            time_series = generate_data_from_file("time elapsed (seconds)", self.simulation_data)
+            time_series = self.recording.column("time elapsed (seconds)")
 
         return MockTimer(time_series=time_series)
 
     @property
     def mock_a2d(self):
         from drivers.mocks.a2d_mock import MockA2D
+        if self.simulation_data == 'patient':
+            return MockA2D(oxygen_samples=self.generate_mock_patient_data('oxygen'))
         return MockA2D()
 
     @property
@@ -0,0 +1,52 @@
+"""The Inhalator board, wired up on an emulated bus.
+
+Usage - install the emulation before any driver is imported, since some of
+the drivers open their devices on import:
+
+    from drivers.emulation.bus import Fault
+    from drivers.emulation.board import EmulatedBoard
+    board = EmulatedBoard(transaction_latency=0.0002)
+    board.install()
+    from drivers.abp_pressure_sensor import AbpPressureSensor
+    board.abp.signal = lambda t: 20 * math.sin(t)
+    board.abp.set_fault(Fault.STALE, 0.1)
+"""
+import sys
+
+from .bus import EmulatedBus, I2CMux
+from .devices import (HoneywellDevice, Sfm3200Device, SdpDevice,
+                      Rv8523Device, Ads7844Device, HceDevice)
+from . import emulated_pigpio, emulated_spidev
+
+
+class EmulatedBoard(EmulatedBus):
+    ABP_MUX_PORT = 0
+    HSC_MUX_PORT = 1
+    HCE_SPI = (0, 0)
+    A2D_SPI = (0, 1)
+
+    def __init__(self, transaction_latency=0, byte_latency=0, seed=None):
+        super(EmulatedBoard, self).__init__(
+            transaction_latency=transaction_latency,
+            byte_latency=byte_latency, seed=seed)
+        self.mux = self.attach_i2c(I2CMux())
+        self.abp = self.attach_i2c(HoneywellDevice.abp(), mux=self.mux,
+                                   mux_port=self.ABP_MUX_PORT)
+        self.hsc = self.attach_i2c(HoneywellDevice.hsc(), mux=self.mux,
+                                   mux_port=self.HSC_MUX_PORT)
+        self.sfm = self.attach_i2c(Sfm3200Device())
+        self.sdp = self.attach_i2c(SdpDevice())
+        self.rtc = self.attach_i2c(Rv8523Device())
+        self.hce = self.attach_spi(HceDevice(), *self.HCE_SPI)
+        self.a2d = self.attach_spi(Ads7844Device(), *self.A2D_SPI)
+
+    def install(self):
+        install(self)
+
+
+def install(bus):
+    """Make `import pigpio` and `import spidev` use the emulated bus."""
+    emulated_pigpio.bus = bus
+    emulated_spidev.bus = bus
+    sys.modules["pigpio"] = emulated_pigpio
+    sys.modules["spidev"] = emulated_spidev
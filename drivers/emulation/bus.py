@@ -0,0 +1,223 @@
+"""Emulated I2C and SPI buses.
+
+The buses route transactions to emulated devices, which model the register
+protocol of the real hardware. Every transaction can be delayed to mimic the
+bus speed, and can fail according to the faults injected to its device.
+"""
+import time
+import random
+from collections import defaultdict
+
+
+class TransactionError(Exception):
+    """The device did not acknowledge the transaction."""
+
+
+class ReadFailedError(TransactionError):
+    """The read transaction failed midway."""
+
+
+class Fault(object):
+    # Generic faults, handled by the bus for every device
+    NACK = "nack"  # Device does not respond at all
+    READ_FAILED = "read_failed"  # Read fails after being acknowledged
+    SHORT_READ = "short_read"  # Device returns less bytes than requested
+
+    # Device specific faults
+    NOT_READY = "not_ready"  # Measurement is not ready yet
+    CRC = "crc"  # Data is corrupted, CRC mismatch
+    STALE = "stale"  # Honeywell status bits - stale data
+    DIAGNOSTIC = "diagnostic"  # Honeywell status bits - diagnostic fault
+
+
+class EmulatedDevice(object):
+    """Base class for the emulated devices."""
+
+    def __init__(self):
+        self.faults = {}
+        self.random = random.Random()
+        self.clock = time.monotonic
+        self.start_time = self.clock()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}()"
+
+    @property
+    def elapsed(self):
+        """Seconds since the device was created, for evaluating signals."""
+        return self.clock() - self.start_time
+
+    def set_fault(self, fault, probability):
+        """Make each transaction fail with `fault` at the given probability."""
+        self.faults[fault] = probability
+
+    def clear_faults(self):
+        self.faults.clear()
+
+    def fails(self, fault):
+        probability = self.faults.get(fault, 0)
+        return probability > 0 and self.random.random() < probability
+
+
+class I2CDevice(EmulatedDevice):
+    ADDRESS = NotImplemented
+
+    def __init__(self, address=None):
+        super(I2CDevice, self).__init__()
+        self.address = self.ADDRESS if address is None else address
+
+    def read(self, count):
+        raise NotImplementedError()
+
+    def write(self, data):
+        raise NotImplementedError()
+
+
+class SPIDevice(EmulatedDevice):
+
+    def transfer(self, data):
+        raise NotImplementedError()
+
+
+class I2CMux(I2CDevice):
+    """TCA9548A-like I2C switch.
+
+    The control register is a bitmask of the enabled downstream ports, and
+    is set to the last byte written.
+    """
+    ADDRESS = 0x70
+    PORTS = 8
+
+    def __init__(self, address=None):
+        super(I2CMux, self).__init__(address)
+        self.control = 0
+        self.ports = defaultdict(dict)
+
+    def attach(self, device, port):
+        if port not in range(self.PORTS):
+            raise ValueError(f"Mux has no port {port}")
+        self.ports[port][device.address] = device
+
+    def devices_at(self, address):
+        return [devices[address]
+                for port, devices in self.ports.items()
+                if self.control & (1 << port) and address in devices]
+
+    def read(self, count):
+        return bytes([self.control] * count)
+
+    def write(self, data):
+        if data:
+            self.control = data[-1]
+
+
+class EmulatedBus(object):
+    """A board's worth of I2C and SPI buses.
+
+    :param transaction_latency: Seconds each transaction takes regardless of
+        its size - addressing, ACKs and driver overhead.
+    :param byte_latency: Seconds each transferred byte adds. At 100kHz I2C
+        it is about 90 micro-seconds.
+    """
+
+    def __init__(self, transaction_latency=0, byte_latency=0, seed=None):
+        self.transaction_latency = transaction_latency
+        self.byte_latency = byte_latency
+        self.random = random.Random(seed)
+        self.i2c_devices = defaultdict(dict)  # bus -> address -> device
+        self.muxes = defaultdict(list)  # bus -> muxes on that bus
+        self.spi_devices = {}  # (bus, chip select) -> device
+
+        # Statistics, for benchmarking
+        self.transactions = 0
+        self.failures = 0
+        self.transferred_bytes = 0
+
+    def reset_statistics(self):
+        self.transactions = 0
+        self.failures = 0
+        self.transferred_bytes = 0
+
+    def _attach(self, device):
+        device.random = random.Random(self.random.random())
+        return device
+
+    def attach_i2c(self, device, bus=1, mux=None, mux_port=None):
+        """Connect an I2C device, either directly or behind a mux port."""
+        self._attach(device)
+        if mux is not None:
+            mux.attach(device, mux_port)
+        elif isinstance(device, I2CMux):
+            self.muxes[bus].append(device)
+        else:
+            self.i2c_devices[bus][device.address] = device
+        return device
+
+    def attach_spi(self, device, bus=0, chip_select=0):
+        self.spi_devices[(bus, chip_select)] = self._attach(device)
+        return device
+
+    def spi_device(self, bus, chip_select):
+        return self.spi_devices.get((bus, chip_select))
+
+    def _find_i2c(self, bus, address):
+        if address in self.i2c_devices[bus]:
+            return self.i2c_devices[bus][address]
+
+        devices = [mux for mux in self.muxes[bus] if mux.address == address]
+        for mux in self.muxes[bus]:
+            devices += mux.devices_at(address)
+
+        if not devices:
+            raise TransactionError(
+                f"No device at address {hex(address)} on bus {bus}")
+
+        if len(devices) > 1:
+            # Two devices answering together garble the bus
+            raise TransactionError(
+                f"Address {hex(address)} collision on bus {bus}: {devices}")
+
+        return devices[0]
+
+    def _transact(self, device, nbytes):
+        self.transactions += 1
+        self.transferred_bytes += nbytes
+        delay = self.transaction_latency + self.byte_latency * nbytes
+        if delay > 0:
+            time.sleep(delay)
+
+        if device.fails(Fault.NACK):
+            self.failures += 1
+            raise TransactionError(f"{device} did not acknowledge")
+
+    def i2c_read(self, bus, address, count):
+        device = self._find_i2c(bus, address)
+        self._transact(device, count)
+        if device.fails(Fault.READ_FAILED):
+            self.failures += 1
+            raise ReadFailedError(f"Reading from {device} failed")
+
+        data = device.read(count)
+        if data and device.fails(Fault.SHORT_READ):
+            self.failures += 1
+            data = data[:-1]
+
+        return data
+
+    def i2c_write(self, bus, address, data):
+        device = self._find_i2c(bus, address)
+        self._transact(device, len(data))
+        device.write(bytes(data))
+
+    def spi_transfer(self, bus, chip_select, data):
+        device = self.spi_device(bus, chip_select)
+        if device is None:
+            raise TransactionError(f"No SPI device at {bus}.{chip_select}")
+
+        self._transact(device, len(data))
+        response = device.transfer(list(data))
+        if device.fails(Fault.SHORT_READ):
+            self.failures += 1
+            response = response[:-1]
+
+        return response
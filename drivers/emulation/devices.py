@@ -0,0 +1,294 @@
+"""Register level models of the sensors on the board.
+
+The models follow the datasheets rather than the drivers, so running the real
+drivers against them checks the drivers' parsing too. Measured values are
+given as signals - either a constant, or a function of the seconds elapsed
+since the device was created.
+"""
+from datetime import datetime
+
+from .bus import I2CDevice, SPIDevice, TransactionError, Fault
+
+
+def crc8(data, polynomial, init=0):
+    crc = init
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            if crc & 0x80:
+                crc = ((crc << 1) ^ polynomial) & 0xFF
+            else:
+                crc = (crc << 1) & 0xFF
+    return crc
+
+
+def clamp(value, low, high):
+    return max(low, min(high, int(round(value))))
+
+
+class SignalSource(object):
+    """Mixin for devices that measure a signal."""
+
+    def __init__(self, signal=0):
+        self.signal = signal
+
+    def measure(self):
+        if callable(self.signal):
+            return self.signal(self.elapsed)
+        return self.signal
+
+
+class HoneywellDevice(SignalSource, I2CDevice):
+    """Honeywell ABP/HSC pressure sensor.
+
+    Each read returns 2 status bits, followed by a 14 bit pressure count.
+    """
+    ADDRESS = 0x28
+    STATUS_NORMAL = 0
+    STATUS_STALE_DATA = 2
+    STATUS_DIAGNOSTIC_COND = 3
+
+    def __init__(self, min_range, max_range, min_out, max_out, cmh2o_ratio,
+                 signal=0, address=None):
+        """
+        :param min_range: Pressure at `min_out`, in the sensor's unit.
+        :param max_range: Pressure at `max_out`, in the sensor's unit.
+        :param cmh2o_ratio: cmH2O per unit of the sensor.
+        :param signal: Pressure in cmH2O.
+        """
+        I2CDevice.__init__(self, address)
+        SignalSource.__init__(self, signal)
+        self.min_range = min_range
+        self.max_range = max_range
+        self.min_out = min_out
+        self.max_out = max_out
+        self.cmh2o_ratio = cmh2o_ratio
+
+    @classmethod
+    def abp(cls, signal=0):
+        """ABPMAND001PG2A3 - 0 to 1 psi gauge pressure."""
+        return cls(min_range=0, max_range=1, min_out=0x666, max_out=0x399A,
+                   cmh2o_ratio=70.307, signal=signal)
+
+    @classmethod
+    def hsc(cls, signal=0):
+        """HSC - +-6 mbar differential pressure."""
+        return cls(min_range=-6, max_range=6, min_out=0x666, max_out=0x399A,
+                   cmh2o_ratio=1.0197162129779, signal=signal)
+
+    def counts(self, pressure_cmh2o):
+        pressure = pressure_cmh2o / self.cmh2o_ratio
+        counts = (self.min_out + (pressure - self.min_range) *
+                  (self.max_out - self.min_out) /
+                  (self.max_range - self.min_range))
+        return clamp(counts, 0, 0x3FFF)
+
+    def read(self, count):
+        status = self.STATUS_NORMAL
+        if self.fails(Fault.DIAGNOSTIC):
+            status = self.STATUS_DIAGNOSTIC_COND
+        elif self.fails(Fault.STALE):
+            status = self.STATUS_STALE_DATA
+
+        counts = self.counts(self.measure())
+        data = bytes([(status << 6) | (counts >> 8), counts & 0xFF])
+        return data[:count]
+
+    def write(self, data):
+        pass
+
+
+class Sfm3200Device(SignalSource, I2CDevice):
+    """Sensirion SFM3200 flow sensor.
+
+    Measurements are available only after the start measurement command.
+    Each read returns the flow as 2 bytes, followed by their CRC.
+    """
+    ADDRESS = 0x40
+    CRC_POLYNOMIAL = 0x131
+    SCALE_FACTOR_FLOW = 120
+    OFFSET_FLOW = 0x8000
+    START_MEASURE_CMD = b"\x10\x00"
+    SOFT_RST_CMD = b"\x20\x00"
+
+    def __init__(self, signal=0, address=None):
+        """:param signal: Flow in slm."""
+        I2CDevice.__init__(self, address)
+        SignalSource.__init__(self, signal)
+        self.measuring = False
+
+    def write(self, data):
+        if data == self.START_MEASURE_CMD:
+            self.measuring = True
+        elif data == self.SOFT_RST_CMD:
+            self.measuring = False
+
+    def read(self, count):
+        if not self.measuring or self.fails(Fault.NOT_READY):
+            return b""
+
+        raw = clamp(self.measure() * self.SCALE_FACTOR_FLOW + self.OFFSET_FLOW,
+                    0, 0xFFFF)
+        data = [raw >> 8, raw & 0xFF]
+        crc = crc8(data, self.CRC_POLYNOMIAL)
+        if self.fails(Fault.CRC):
+            crc ^= 0xFF
+        return bytes(data + [crc])[:count]
+
+
+class SdpDevice(SignalSource, I2CDevice):
+    """Sensirion SDP8xx differential pressure sensor.
+
+    In continuous mode each read returns the differential pressure,
+    temperature and scale factor - each as 2 bytes followed by their CRC.
+    Reading before a measurement started is not acknowledged.
+    """
+    ADDRESS = 0x25
+    CRC_POLYNOMIAL = 0x31
+    CRC_INIT_VALUE = 0xFF
+    SCALE_FACTOR_PASCAL = 60
+    TEMPERATURE_SCALE_FACTOR = 200
+    CMH2O_PASCAL_RATIO = 98.0665
+    CMD_STOP = b"\x3F\xF9"
+    START_MEASURE_CMDS = (b"\x36\x08", b"\x36\x03", b"\x36\x1E", b"\x36\x15")
+
+    def __init__(self, signal=0, temperature=25, address=None):
+        """:param signal: Differential pressure in cmH2O."""
+        I2CDevice.__init__(self, address)
+        SignalSource.__init__(self, signal)
+        self.temperature = temperature
+        self.measuring = False
+
+    def write(self, data):
+        if data in self.START_MEASURE_CMDS:
+            self.measuring = True
+        elif data == self.CMD_STOP:
+            self.measuring = False
+
+    def _word(self, value):
+        data = list((value & 0xFFFF).to_bytes(2, byteorder="big"))
+        crc = crc8(data, self.CRC_POLYNOMIAL, self.CRC_INIT_VALUE)
+        if self.fails(Fault.CRC):
+            crc ^= 0xFF
+        return data + [crc]
+
+    def read(self, count):
+        if not self.measuring or self.fails(Fault.NOT_READY):
+            raise TransactionError("SDP measurement not ready")
+
+        pascal = self.measure() * self.CMH2O_PASCAL_RATIO
+        pressure = clamp(pascal * self.SCALE_FACTOR_PASCAL, -0x8000, 0x7FFF)
+        temperature = int(self.temperature * self.TEMPERATURE_SCALE_FACTOR)
+        data = (self._word(pressure) + self._word(temperature) +
+                self._word(self.SCALE_FACTOR_PASCAL))
+        return bytes(data[:count])
+
+
+class Rv8523Device(I2CDevice):
+    """Micro Crystal RV-8523 real time clock.
+
+    Writing the first byte sets the register pointer, and the following
+    bytes are written starting from it. Reads start at the register pointer.
+    The pointer auto-increments on both.
+    """
+    ADDRESS = 0x68
+    REGISTER_COUNT = 0x14
+    REG_CONTROL_1 = 0x0
+    REG_SECONDS = 0x3
+    STOP_BIT = 0x20
+
+    def __init__(self, date=None, address=None):
+        super(Rv8523Device, self).__init__(address)
+        self.registers = [0] * self.REGISTER_COUNT
+        self.registers[self.REG_CONTROL_1] = self.STOP_BIT
+        self.pointer = 0
+        self.set_time(date or datetime.now())
+
+    @staticmethod
+    def to_bcd(number):
+        return (number // 10) << 4 | number % 10
+
+    def set_time(self, date):
+        self.registers[self.REG_SECONDS:self.REG_SECONDS + 7] = [
+            self.to_bcd(date.second), self.to_bcd(date.minute),
+            self.to_bcd(date.hour), self.to_bcd(date.day),
+            self.to_bcd(date.weekday()), self.to_bcd(date.month),
+            self.to_bcd(date.year % 100)]
+
+    def write(self, data):
+        if not data:
+            return
+
+        self.pointer = data[0] % self.REGISTER_COUNT
+        for value in data[1:]:
+            self.registers[self.pointer] = value
+            self.pointer = (self.pointer + 1) % self.REGISTER_COUNT
+
+    def read(self, count):
+        data = []
+        for _ in range(count):
+            data.append(self.registers[self.pointer])
+            self.pointer = (self.pointer + 1) % self.REGISTER_COUNT
+        return bytes(data)
+
+
+class Ads7844Device(SPIDevice):
+    """TI ADS7844 8 channel, 12 bit A2D.
+
+    The control byte selects the channel, and the conversion is clocked out
+    over the next two bytes, MSB first, following a single busy bit.
+    """
+    VOLTAGE_REF = 2.5
+    VOLTAGE_STEP_COUNT = 2 ** 12
+    START_BIT = 0x80
+    CHANNEL_SELECT_SHIFT = 4
+    # Multiplexer address (A2 A1 A0) of each input channel
+    CHANNEL_ADDRESSES = [0, 4, 1, 5, 2, 6, 3, 7]
+
+    def __init__(self, channels=None):
+        """:param channels: Mapping of input channel to voltage signal."""
+        super(Ads7844Device, self).__init__()
+        self.channels = dict(channels or {})
+
+    def measure(self, channel):
+        signal = self.channels.get(channel, 0)
+        if callable(signal):
+            return signal(self.elapsed)
+        return signal
+
+    def transfer(self, data):
+        control = data[0]
+        if not control & self.START_BIT:
+            return [0] * len(data)
+
+        address = (control >> self.CHANNEL_SELECT_SHIFT) & 0x7
+        channel = self.CHANNEL_ADDRESSES.index(address)
+        code = clamp(self.measure(channel) / self.VOLTAGE_REF *
+                     self.VOLTAGE_STEP_COUNT, 0, self.VOLTAGE_STEP_COUNT - 1)
+        return ([0, (code >> 5) & 0x7F, (code << 3) & 0xFF] +
+                [0] * (len(data) - 3))
+
+
+class HceDevice(SignalSource, SPIDevice):
+    """First Sensor HCE pressure sensor.
+
+    Each transfer clocks out a status byte, followed by a 16 bit pressure
+    count.
+    """
+    MIN_PRESSURE = 0
+    MAX_PRESSURE = 2000  # mbar
+    MIN_OUT_PRESSURE = 0x0AAA
+    MAX_OUT_PRESSURE = 0x5FFF
+
+    def __init__(self, signal=0):
+        """:param signal: Absolute pressure in mbar."""
+        SPIDevice.__init__(self)
+        SignalSource.__init__(self, signal)
+
+    def transfer(self, data):
+        counts = clamp(
+            self.MIN_OUT_PRESSURE +
+            (self.measure() - self.MIN_PRESSURE) *
+            (self.MAX_OUT_PRESSURE - self.MIN_OUT_PRESSURE) /
+            (self.MAX_PRESSURE - self.MIN_PRESSURE), 0, 0xFFFF)
+        return [0, counts >> 8, counts & 0xFF] + [0] * (len(data) - 3)
@@ -0,0 +1,71 @@
+"""Drop-in replacement of the pigpio module's I2C API.
+
+Transactions are routed to the emulated bus set by `emulation.install`.
+"""
+import itertools
+
+from .bus import TransactionError, ReadFailedError
+
+PI_I2C_READ_FAILED = -83
+
+bus = None
+
+
+class error(Exception):  # pylint: disable=invalid-name
+    """Same as `pigpio.error`."""
+
+
+def _to_bytes(data):
+    if isinstance(data, str):
+        # pigpio sends strings as latin-1 encoded bytes
+        return data.encode("latin-1")
+    return bytes(data)
+
+
+class pi(object):  # pylint: disable=invalid-name
+    """Connection to the emulated pigpio daemon."""
+    _handles = itertools.count()
+
+    def __init__(self, host=None, port=None, show_errors=True):
+        if bus is None:
+            raise RuntimeError("Emulated bus was not installed")
+
+        self.bus = bus
+        self.connected = True
+        self._devices = {}
+
+    def _device(self, handle):
+        if handle not in self._devices:
+            raise error(f"Bad handle {handle}")
+        return self._devices[handle]
+
+    def i2c_open(self, i2c_bus, i2c_address, i2c_flags=0):
+        handle = next(self._handles)
+        self._devices[handle] = (i2c_bus, i2c_address)
+        return handle
+
+    def i2c_close(self, handle):
+        self._devices.pop(handle, None)
+
+    def i2c_read_device(self, handle, count):
+        i2c_bus, address = self._device(handle)
+        try:
+            data = self.bus.i2c_read(i2c_bus, address, count)
+        except ReadFailedError:
+            return PI_I2C_READ_FAILED, ""
+        except TransactionError as e:
+            raise error(str(e)) from e
+
+        return len(data), bytearray(data)
+
+    def i2c_write_device(self, handle, data):
+        i2c_bus, address = self._device(handle)
+        try:
+            self.bus.i2c_write(i2c_bus, address, _to_bytes(data))
+        except TransactionError as e:
+            raise error(str(e)) from e
+
+        return 0
+
+    def stop(self):
+        self.connected = False
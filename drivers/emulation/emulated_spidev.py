@@ -0,0 +1,35 @@
+"""Drop-in replacement of the spidev module.
+
+Transfers are routed to the emulated bus set by `emulation.install`.
+"""
+from .bus import TransactionError
+
+bus = None
+
+
+class SpiDev(object):
+
+    def __init__(self):
+        self.bus = bus
+        self.address = None
+        self.max_speed_hz = 0
+        self.mode = 0
+
+    def open(self, spi_bus, chip_select):
+        if self.bus is None or self.bus.spi_device(spi_bus, chip_select) is None:
+            raise IOError(f"No such SPI device {spi_bus}.{chip_select}")
+        self.address = (spi_bus, chip_select)
+
+    def xfer(self, data, speed_hz=0, delay_usecs=0):
+        if self.address is None:
+            raise IOError("SPI device is not open")
+
+        try:
+            return self.bus.spi_transfer(*self.address, data)
+        except TransactionError as e:
+            raise IOError(str(e)) from e
+
+    xfer2 = xfer
+
+    def close(self):
+        self.address = None
@@ -28,6 +28,8 @@ class HscPressureSensor(HoneywellPressureSensor):
     def __init__(self):
         super().__init__()
         self._calibration_offset = 0
+        # Of the last read, neither calibrated nor smoothed, for calibrating
+        self.last_differential_pressure = None
         log.info("HSC pressure sensor initialized")
 
         self._avg_flow = RunningAvg(max_samples=NOISY_DP_SENSOR_SAMPLES)
@@ -49,5 +51,6 @@ class HscPressureSensor(HoneywellPressureSensor):
         return super(HscPressureSensor, self).read()
 
     def read(self):
-        dp_cmh2o = self.read_differential_pressure() - self._calibration_offset
+        self.last_differential_pressure = self.read_differential_pressure()
+        dp_cmh2o = self.last_differential_pressure - self._calibration_offset
         return self._avg_flow.process(self.pressure_to_flow(dp_cmh2o))
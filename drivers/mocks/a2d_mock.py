@@ -4,12 +4,20 @@ log = logging.getLogger(__name__)
 
 
 class MockA2D(object):
-    def __init__(self, oxygen=21, battery_percentage=94, battery_existence=True):
+    def __init__(self, oxygen=21, battery_percentage=94, battery_existence=True,
+                 oxygen_samples=None):
+        """
+        :param oxygen_samples: Optional iterator over the oxygen samples to
+            read, instead of the constant `oxygen`.
+        """
         self.oxygen = oxygen
+        self.oxygen_samples = oxygen_samples
         self.battery_percentage = battery_percentage
         self.battery_existence = battery_existence
 
     def read_oxygen(self):
+        if self.oxygen_samples is not None:
+            return next(self.oxygen_samples)
         return self.oxygen
 
     def set_oxygen_calibration(self, offset, scale):
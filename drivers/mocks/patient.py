@@ -0,0 +1,173 @@
+"""Synthetic patient, for simulating long ventilation sessions."""
+from itertools import chain
+from collections import namedtuple
+
+import numpy as np
+
+Signals = namedtuple("Signals", ["timestamps", "flow", "pressure", "oxygen"])
+
+
+class SyntheticPatient(object):
+    """
+    Single compartment lung, ventilated in pressure control mode.
+
+    During inhale the ventilator holds the airway pressure at PIP, and the
+    flow decays exponentially with the lung's time constant (R * C) as the
+    lung fills up. During exhale the lung empties back to PEEP through the
+    same resistance, minus the volume lost to leaks. Every breath draws its
+    own rate and compliance around the configured ones, so long sessions
+    don't just replay a single cycle.
+
+    The signals are generated in chunks of whole numpy arrays, so hours of
+    samples are cheap to generate and to stream from.
+    """
+    MIN_BPM = 4
+    MIN_COMPLIANCE = 5  # ml/cmH2O
+    PRESSURE_RISE_TIME = 0.05  # seconds
+    O2_NOISE_SIGMA = 0.2
+    ARTIFACT_LENGTH = 0.06  # seconds
+    BREATHS_PER_DRAW = 64
+
+    def __init__(self, bpm=15, ie_ratio=0.5, pip=20, peep=5, resistance=10,
+                 compliance=40, leak=0, noise_sigma=0.5, artifact_rate=0,
+                 artifact_amplitude=30, bpm_variability=1,
+                 compliance_variability=4, fio2=21, seed=None):
+        """
+        :param ie_ratio: Inhale time divided by exhale time, e.g 0.5 for 1:2.
+        :param pip: Peak inspiratory pressure, in cmH2O.
+        :param peep: Positive end expiratory pressure, in cmH2O.
+        :param resistance: Airway resistance, in cmH2O/(L/s).
+        :param compliance: Lung compliance, in ml/cmH2O.
+        :param leak: Fraction of the inhaled volume which is not exhaled back
+            through the flow sensor.
+        :param noise_sigma: Standard deviation of the sensors' noise.
+        :param artifact_rate: Average number of artifacts (coughs, sensor
+            glitches) per minute.
+        :param artifact_amplitude: Standard deviation of the artifacts'
+            amplitude, in slm. Pressure artifacts are half of it in cmH2O.
+        :param bpm_variability: Standard deviation of each breath's rate.
+        :param compliance_variability: Standard deviation of each breath's
+            compliance.
+        :param fio2: Oxygen percentage.
+        :param seed: Two patients with the same seed generate the same
+            signals. Random by default.
+        """
+        self.bpm = bpm
+        self.ie_ratio = ie_ratio
+        self.pip = pip
+        self.peep = peep
+        self.resistance = resistance
+        self.compliance = compliance
+        self.leak = leak
+        self.noise_sigma = noise_sigma
+        self.artifact_rate = artifact_rate
+        self.artifact_amplitude = artifact_amplitude
+        self.bpm_variability = bpm_variability
+        self.compliance_variability = compliance_variability
+        self.fio2 = fio2
+        if seed is None:
+            seed = np.random.randint(2 ** 31)
+        self.seed = seed
+
+    def generate(self, duration, sample_rate):
+        """Generate `duration` seconds of all signals at once."""
+        return next(self.chunks(sample_rate, chunk_seconds=duration))
+
+    def stream(self, signal, sample_rate, chunk_seconds=60):
+        """Endless iterator over the samples of a single signal.
+
+        Streams of the same patient are aligned, since each of them replays
+        the same seed.
+        :param signal: One of the fields of `Signals`.
+        """
+        return chain.from_iterable(getattr(chunk, signal).tolist()
+                                   for chunk in self.chunks(sample_rate,
+                                                            chunk_seconds))
+
+    def _draw_breaths(self, rng, first_start):
+        bpm = np.maximum(
+            rng.normal(self.bpm, self.bpm_variability, self.BREATHS_PER_DRAW),
+            self.MIN_BPM)
+        durations = 60 / bpm
+        starts = first_start + np.cumsum(durations) - durations
+        compliances = np.maximum(
+            rng.normal(self.compliance, self.compliance_variability,
+                       self.BREATHS_PER_DRAW),
+            self.MIN_COMPLIANCE)
+        return starts, durations, compliances
+
+    def chunks(self, sample_rate, chunk_seconds=60):
+        """Endless iterator over consecutive `Signals` chunks."""
+        rng = np.random.default_rng(self.seed)
+        chunk_size = int(round(chunk_seconds * sample_rate))
+        starts = durations = compliances = np.empty(0)
+        next_breath = 0
+        first_sample = 0
+
+        while True:
+            timestamps = (first_sample + np.arange(chunk_size)) / sample_rate
+            first_sample += chunk_size
+
+            # Forget the breaths which already ended, and draw new ones until
+            # the chunk is covered.
+            ongoing = starts + durations > timestamps[0]
+            starts = starts[ongoing]
+            durations = durations[ongoing]
+            compliances = compliances[ongoing]
+            while next_breath <= timestamps[-1]:
+                new_starts, new_durations, new_compliances = \
+                    self._draw_breaths(rng, next_breath)
+                starts = np.concatenate((starts, new_starts))
+                durations = np.concatenate((durations, new_durations))
+                compliances = np.concatenate((compliances, new_compliances))
+                next_breath = new_starts[-1] + new_durations[-1]
+
+            yield self._breathe(rng, timestamps, starts, durations,
+                                compliances, sample_rate)
+
+    def _breathe(self, rng, timestamps, starts, durations, compliances,
+                 sample_rate):
+        breath = np.searchsorted(starts, timestamps, side="right") - 1
+        t = timestamps - starts[breath]
+        inhale_time = durations[breath] * self.ie_ratio / (1 + self.ie_ratio)
+        tau = self.resistance * compliances[breath] / 1000  # seconds
+        inhale = t < inhale_time
+        exhale_t = np.maximum(t - inhale_time, 0)
+        delta_pressure = self.pip - self.peep
+
+        inhale_flow = delta_pressure / self.resistance * np.exp(-t / tau)
+        inhaled_volume = (delta_pressure * compliances[breath] / 1000 *
+                          (1 - np.exp(-inhale_time / tau)))
+        exhale_flow = (-(1 - self.leak) * inhaled_volume / tau *
+                       np.exp(-exhale_t / tau))
+        flow = np.where(inhale, inhale_flow, exhale_flow) * 60  # L/s to slm
+
+        pressure = self.peep + delta_pressure * np.where(
+            inhale,
+            1 - np.exp(-t / self.PRESSURE_RISE_TIME),
+            np.exp(-exhale_t / self.PRESSURE_RISE_TIME))
+
+        oxygen = np.full_like(timestamps, self.fio2)
+
+        # Random draws are skipped when disabled, so that noiseless signals
+        # don't depend on the chunk size.
+        if self.noise_sigma > 0:
+            flow += rng.normal(0, self.noise_sigma, len(timestamps))
+            pressure += rng.normal(0, self.noise_sigma, len(timestamps))
+            oxygen += rng.normal(0, self.O2_NOISE_SIGMA, len(timestamps))
+
+        if self.artifact_rate > 0:
+            artifacts = self._artifacts(rng, len(timestamps), sample_rate)
+            flow += artifacts
+            pressure += artifacts / 2
+
+        return Signals(timestamps, flow, pressure, oxygen)
+
+    def _artifacts(self, rng, size, sample_rate):
+        expected = self.artifact_rate * size / sample_rate / 60
+        positions = rng.integers(0, size, rng.poisson(expected))
+        impulses = np.zeros(size)
+        np.add.at(impulses, positions,
+                  rng.normal(0, self.artifact_amplitude, len(positions)))
+        length = max(1, int(self.ARTIFACT_LENGTH * sample_rate))
+        return np.convolve(impulses, np.ones(length), mode="same")
@@ -0,0 +1,162 @@
+"""Recorded sensor samples, for replaying in simulation mode.
+
+A recording is loaded once into columns, and every mock driver replays its
+own column - a view of the same memory. Recordings can be CSV files, which
+are parsed in a single pass, or numpy (.npy) files and the app's own sensor
+recordings, which are memory mapped so even huge recordings are read from
+disk only on demand. Compressed sensor recordings are decompressed into
+memory.
+
+A recording can be loaded from a window of time, given in unix time. The app's
+recordings are then read only from the window, using their time index.
+
+Convert a CSV recording to numpy:
+    python -m drivers.mocks.recording recording.csv recording.npy
+"""
+import csv
+import argparse
+from itertools import islice
+
+import numpy as np
+
+from sample_storage import (read_recording, read_between, is_recording,
+                            RecordingFormatError, TIME_COLUMN)
+
+NUMPY_SUFFIX = ".npy"
+# CSV cells of missing values, e.g. of values not yet measured
+MISSING_VALUES = ("", "None")
+
+
+class Recording(object):
+    PARSE_BLOCK_ROWS = 64 * 1024
+
+    def __init__(self, columns):
+        """:param columns: Mapping of column name to a 1D numpy array."""
+        self.columns = columns
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), ()))
+
+    def column(self, name):
+        return self.columns[name]
+
+    def between(self, start=None, end=None):
+        """:return: The part of the recording between two unix times."""
+        times = self.columns[TIME_COLUMN] / 1000
+        first = 0 if start is None else np.searchsorted(times, start)
+        last = len(times) if end is None else \
+            np.searchsorted(times, end, side="right")
+        return Recording({name: column[first:last]
+                          for name, column in self.columns.items()})
+
+    @classmethod
+    def load(cls, path, start=None, end=None):
+        """:param start, end: Unix times to load the recording between.
+        :raise RecordingFormatError: If there are less than 2 samples to
+            replay, as their intervals are replayed as well.
+        """
+        path = str(path)
+        if is_recording(path):
+            recording = cls.load_samples(path, start, end)
+        else:
+            if path.endswith(NUMPY_SUFFIX):
+                recording = cls.load_numpy(path)
+            else:
+                recording = cls.load_csv(path)
+            if start is not None or end is not None:
+                recording = recording.between(start, end)
+
+        if len(recording) < 2:
+            raise RecordingFormatError(
+                f"{path} has {len(recording)} samples between {start} and "
+                f"{end}, at least 2 are needed to replay it")
+        return recording
+
+    @classmethod
+    def load_numpy(cls, path):
+        samples = np.load(path, mmap_mode="r")
+        return cls({name: samples[name] for name in samples.dtype.names})
+
+    @classmethod
+    def load_samples(cls, path, start=None, end=None):
+        """Load a segment recorded by `SamplesStorage`."""
+        if start is None and end is None:
+            _, samples = read_recording(path)
+        else:
+            _, samples = read_between(path, start, end)
+        return cls({name: samples[name] for name in samples.dtype.names})
+
+    @classmethod
+    def load_csv(cls, path):
+        """Parse the numeric columns of a CSV file.
+
+        The rows are read in blocks, and each block's column is converted to
+        floats at once by numpy. Missing values, such as the "None" of a
+        value not measured yet, are NaN. Columns which are not numbers, such
+        as formatted timestamps, are dropped.
+        :raise RecordingFormatError: If a row isn't as wide as the header.
+        """
+        with open(path, "r", newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            blocks = {name: [] for name in header}
+            while True:
+                block = list(islice(reader, cls.PARSE_BLOCK_ROWS))
+                if not block:
+                    break
+
+                rows = [row for row in block if row]  # Skip blank lines
+                for row in rows:
+                    if len(row) != len(header):
+                        raise RecordingFormatError(
+                            f"{path}: {row} has {len(row)} fields, rather "
+                            f"than {len(header)}")
+
+                for name, values in zip(header, zip(*rows)):
+                    if name not in blocks:
+                        continue
+                    column = _parse_column(values)
+                    if column is None:
+                        del blocks[name]
+                    else:
+                        blocks[name].append(column)
+
+        return cls({name: np.concatenate(column_blocks)
+                    for name, column_blocks in blocks.items()
+                    if column_blocks})
+
+    def save(self, path):
+        """Save as a numpy file, which can later be memory mapped."""
+        dtype = [(name, float) for name in self.columns]
+        samples = np.empty(len(self), dtype=dtype)
+        for name, column in self.columns.items():
+            samples[name] = column
+        np.save(path, samples)
+
+
+def _parse_column(values):
+    """:return: The values as floats, with the missing ones as NaN, or None
+        if any of them isn't a number."""
+    try:
+        return np.array(values, dtype=float)
+    except ValueError:
+        pass
+
+    try:
+        return np.array([np.nan if value in MISSING_VALUES else value
+                         for value in values], dtype=float)
+    except ValueError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert a CSV recording to a memory mappable numpy file")
+    parser.add_argument("source")
+    parser.add_argument("destination")
+    args = parser.parse_args()
+    Recording.load_csv(args.source).save(args.destination)
+
+
+if __name__ == "__main__":
+    main()
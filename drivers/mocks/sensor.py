@@ -1,5 +1,5 @@
 from math import copysign
-from itertools import cycle
+from itertools import cycle, chain, repeat as repeat_forever
 from numpy import random
 from itertools import tee
 
@@ -7,14 +7,26 @@ from itertools import tee
 class MockSensor(object):
     """
     Mock sensor class. On each read returns a sample from a pre-configured
-    sequence. The sequence is replayed indefinitely.
+    sequence. The sequence is replayed indefinitely, unless `repeat` is False
+    - which suits endless streams, since replaying an iterator requires
+    keeping every sample in memory. Sequences (lists, numpy arrays) are
+    replayed in place, without being copied.
     """
 
-    def __init__(self, seq, error_probability=0):
-        # Duplicate the received sequence
-        self.data, self.seq = tee(seq)
+    def __init__(self, seq, error_probability=0, repeat=True):
+        if repeat and hasattr(seq, "__len__"):
+            if len(seq) == 0:
+                raise ValueError("An empty sequence can't be replayed")
+            self.seq = seq
+            self.data = chain.from_iterable(repeat_forever(seq))
+        elif repeat:
+            # Duplicate the received sequence
+            self.data, self.seq = tee(seq)
+            self.data = cycle(self.data)
+        else:
+            self.data = iter(seq)
+            self.seq = None
 
-        self.data = cycle(self.data)
         self._calibration_offset = 0
         self.error_probability = error_probability
         self.offset_drift = 0
@@ -33,11 +45,16 @@ class MockSensor(object):
 
         return sample
 
+    def read_burst(self, count, clock):
+        # Unlike the real drivers, each sample is timestamped only once
+        return [(clock(), self.read()) for _ in range(count)]
+
 
 class DifferentialPressureMockSensor(MockSensor):
-    def __init__(self, seq, error_probability=0):
-        super().__init__(seq, error_probability)
+    def __init__(self, seq, error_probability=0, repeat=True):
+        super().__init__(seq, error_probability, repeat)
         self._calibration_offset = 0
+        self.last_differential_pressure = None
 
     def set_calibration_offset(self, offset):
         self._calibration_offset = offset
@@ -56,6 +73,7 @@ class DifferentialPressureMockSensor(MockSensor):
             raise self.random_error()
 
         sample_dp = self.flow_to_pressure(sample) + self.offset_drift
+        self.last_differential_pressure = sample_dp
         sample_dp -= self._calibration_offset
         sample_flow = self.pressure_to_flow(sample_dp)
         return sample_flow
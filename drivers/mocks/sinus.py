@@ -1,14 +1,12 @@
-from math import sin
-
 import numpy as np
 
 
 def sinus(sample_rate, amplitude, freq):
     full_cycle = 1 / freq
     num_samples = int(sample_rate * full_cycle)
-    signal = [amplitude * sin(2 * np.pi * i * freq / sample_rate)
-              for i in range(num_samples)]
-    return signal
+    signal = amplitude * np.sin(
+        2 * np.pi * np.arange(num_samples) * freq / sample_rate)
+    return signal.tolist()
 
 
 def zero(sample_rate, amplitude, freq):
@@ -18,8 +16,9 @@ def zero(sample_rate, amplitude, freq):
 
 
 def truncate(signal, lower_limit, upper_limit):
-    return [min(upper_limit, max(lower_limit, s)) for s in signal]
+    return np.clip(signal, lower_limit, upper_limit).tolist()
 
 
 def add_noise(signal, sigma):
-    return [s + np.random.normal(scale=sigma) for s in signal]
+    noise = np.random.normal(scale=sigma, size=len(signal))
+    return (np.asarray(signal) + noise).tolist()
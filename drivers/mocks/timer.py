@@ -1,4 +1,6 @@
-from itertools import cycle
+from itertools import chain, repeat
+
+import numpy as np
 
 
 class MockTimer(object):
@@ -9,8 +11,11 @@ class MockTimer(object):
         # We can't just cycle over the timestamp, because it doesn't make sense
         # for time to wrap around. But it does make sense to cycle over the
         # _intervals_ between the timestamps.
-        intervals = [j - i for i, j in zip(time_series[:-1], time_series[1:])]
-        self.intervals = cycle(intervals)
+        intervals = np.diff(time_series)
+        if len(intervals) == 0:
+            raise ValueError("At least 2 timestamps are needed, to replay "
+                             "their intervals")
+        self.intervals = chain.from_iterable(repeat(intervals))
         self.current_time = time_series[0]
 
     def get_time(self):
@@ -22,6 +27,5 @@ class MockTimer(object):
         return self.current_time
 
     def sleep(self, amount):
-        # This function is currently only being used in the Calibration screen
-        # and doing nothing is the desired effect.
+        # Doing nothing is the desired effect in simulation.
         pass
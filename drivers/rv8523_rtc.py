@@ -87,7 +87,7 @@ class Rv8523Rtc(I2cDriver):
         seconds = self._get_clock_unit(0x7F, self.REG_SECONDS)
         minutes = self._get_clock_unit(0x7F)
         hours = self._get_clock_unit(0x3F)
-        days = self._get_clock_unit(0x1F)
+        days = self._get_clock_unit(0x3F)
         months = self._get_clock_unit(0x1F, self.REG_MONTHS)
         years = self._get_clock_unit(0x7F) + self.REG_YEARS_OFFSET
         try:
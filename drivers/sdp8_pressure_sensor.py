@@ -1,5 +1,6 @@
 import logging
 import sys
+import time
 from time import sleep
 
 import pigpio
@@ -97,3 +98,34 @@ class SdpPressureSensor(I2cDriver):
             self.log.exception("Could not read from pressure sensor. "
                                "Is the pressure sensor connected?")
             raise I2CReadError("i2c write failed")
+
+    def read_burst(self, count, clock=time.time):
+        """
+        Read `count` consecutive measurements.
+
+        In continuous averaged mode the sensor keeps averaging between reads,
+        so each read returns the average since the previous one. Every sample
+        is timestamped at the middle of its own bus transaction, rather than
+        sharing a single timestamp taken before the burst.
+        :param clock: Function returning the current time.
+        :return: List of (timestamp, flow) tuples. Measurements which were
+            not ready are skipped. If a read fails, the samples read before
+            it are returned, or the error is raised if there are none.
+        """
+        samples = []
+        for _ in range(count):
+            start = clock()
+            try:
+                flow = self.read()
+            except I2CReadError:
+                if not samples:
+                    raise
+                self.log.error("Burst read failed after %d samples",
+                               len(samples))
+                break
+
+            end = clock()
+            if flow is not None:
+                samples.append(((start + end) / 2, flow))
+
+        return samples
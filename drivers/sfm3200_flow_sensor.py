@@ -12,7 +12,8 @@ from .i2c_driver import I2cDriver
 from errors import (I2CReadError,
                     I2CWriteError,
                     FlowSensorCRCError,
-                    I2CDeviceNotFoundError)
+                    I2CDeviceNotFoundError,
+                    UnavailableMeasurmentError)
 
 log = logging.getLogger(__name__)
 
@@ -25,9 +26,13 @@ class Sfm3200(I2cDriver):
     OFFSET_FLOW = 0x8000
     START_MEASURE_CMD = b"\x10\x00"
     SOFT_RST_CMD = b"\x20\x00"
+    # The measurement is restarted every this many consecutive "not ready"
+    # reads, until a read succeeds
+    NOT_READY_RESTART_COUNT = 2
 
     def __init__(self):
         super().__init__()
+        self._not_ready_count = 0
         self._start_measure()
         sleep(0.1)
         # Dummy read - first read values are invalid
@@ -58,7 +63,7 @@ class Sfm3200(I2cDriver):
             log.error("Could not write soft reset cmd to flow sensor.")
             raise I2CWriteError("i2c write failed") from e
 
-    def read(self, retries=2):
+    def read(self):
         read_size, data = self._pig.i2c_read_device(self._dev, 3)
         if read_size >= 2:
             raw_value = data[0] << 8 | data[1]
@@ -76,30 +81,28 @@ class Sfm3200(I2cDriver):
                 raise I2CReadError("Too much data read, invalid state")
 
         elif read_size == 0:
-            # Measurement not ready
-            if not retries:
-                log.error("Flow sensor's measure data consistently not ready")
-
-            elif retries == 1:
+            # Measurement not ready. We don't wait for it here, since that
+            # would block the whole sampling loop - the sampler will simply
+            # try again on its next iteration.
+            self._not_ready_count += 1
+            if self._not_ready_count % self.NOT_READY_RESTART_COUNT == 0:
                 log.warning("Flow sensor read returns NA."
                             "This could be a result of voltage swings."
                             "Sending start_measure command to sensor")
                 self._start_measure()
 
-            else:
-                log.warning("Flow sensor's measure data was not ready. "
-                            "Retrying read after a short delay")
-
-            sleep(0.1)
-            flow = self.read_flow_slm(retries=retries - 1)
-            log.info("Flow Sensor successfully read data, after failed attempt")
-            return flow
+            raise UnavailableMeasurmentError(
+                "Flow sensor's measure data was not ready")
 
-        elif read_size == pigpio.PI_raw_valueI2C_READ_FAILED:
+        elif read_size == pigpio.PI_I2C_READ_FAILED:
             log.error("Could not read data from flow sensor."
                       "Is it connected?")
             raise I2CReadError("i2c read failed")
 
+        if self._not_ready_count:
+            log.info("Flow Sensor successfully read data, after failed attempt")
+            self._not_ready_count = 0
+
         # Normalize flow to slm units
         flow = float(raw_value - self.OFFSET_FLOW) / self.SCALE_FACTOR_FLOW
         return flow
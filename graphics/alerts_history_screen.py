@@ -1,7 +1,9 @@
 import os
+import time
 
 from tkinter import *
 
+from data.alerts import Alert
 from graphics.imagebutton import ImageButton
 from graphics.themes import Theme
 
@@ -11,20 +13,32 @@ RESOURCES_DIRECTORY = os.path.join(os.path.dirname(THIS_DIRECTORY), "resources")
 
 
 class AlertTitles(object):
-    def __init__(self, root):
+    """The columns' titles, which filter the alerts when clicked."""
+
+    def __init__(self, parent, root):
+        self.parent = parent
         self.root = root
         self.frame = Frame(master=self.root)
-        self.time_label = Label(master=self.frame,
-                                text="Date",
-                                font=("Roboto", 20),
-                                bg=Theme.active().BACKGROUND,
-                                fg=Theme.active().TXT_ON_BG)
-
-        self.description_label = Label(master=self.frame,
-                                       text="Description",
-                                       font=("Roboto", 20),
-                                       bg=Theme.active().BACKGROUND,
-                                       fg=Theme.active().TXT_ON_BG)
+        self.time_label = Button(master=self.frame,
+                                 text="Date",
+                                 font=("Roboto", 20),
+                                 command=self.parent.on_time_range_click,
+                                 relief="flat",
+                                 bg=Theme.active().BACKGROUND,
+                                 fg=Theme.active().TXT_ON_BG)
+
+        self.description_label = Button(master=self.frame,
+                                        text="Description",
+                                        font=("Roboto", 20),
+                                        command=self.parent.on_code_click,
+                                        relief="flat",
+                                        bg=Theme.active().BACKGROUND,
+                                        fg=Theme.active().TXT_ON_BG)
+
+    def set_filter(self, time_range, code):
+        self.time_label.configure(text=f"Date ({time_range})")
+        description = "All" if code is None else str(Alert(code))
+        self.description_label.configure(text=f"Description ({description})")
 
     def render(self):
         self.frame.place(relx=0, rely=0, relwidth=0.85, relheight=0.15)
@@ -59,17 +73,19 @@ class BottomBar(object):
 
 
 class EntriesContainer(object):
+    """A fixed pool of rows, which are reused for the alerts shown."""
+
     def __init__(self, root, total_alerts_in_screen):
         self.root = root
         self.total_alerts_in_screen = total_alerts_in_screen
 
         self.frame = Frame(master=self.root, bg=Theme.active().BACKGROUND)
-        self.entries = []
+        self.entries = [AlertEntry(self.frame, index, total_alerts_in_screen)
+                        for index in range(total_alerts_in_screen)]
 
     def set_entries(self, alerts):
-        self.entries = [AlertEntry(self.frame, alert, index, self.total_alerts_in_screen)
-                        for index, alert in enumerate(alerts)]
-        self.render()
+        for index, entry in enumerate(self.entries):
+            entry.set_alert(alerts[index] if index < len(alerts) else None)
 
     def render(self):
         self.frame.place(relx=0, rely=0.15, relwidth=0.85, relheight=0.7)
@@ -109,9 +125,9 @@ class ScrollUpDownContainer(object):
 
 
 class AlertEntry(object):
-    def __init__(self, root, alert, index, total_alerts_in_screen):
+    def __init__(self, root, index, total_alerts_in_screen):
         self.root = root
-        self.alert = alert
+        self.alert = None
         self.index = index
         self.total_alerts_in_screen = total_alerts_in_screen
 
@@ -121,15 +137,30 @@ class AlertEntry(object):
                            highlightthickness=1)
 
         self.time_label = Label(master=self.frame,
-                                text=self.alert.date(),
                                 bg=Theme.active().SURFACE,
                                 fg=Theme.active().TXT_ON_SURFACE)
         self.description_label = Label(master=self.frame,
-                                       text=str(self.alert),
                                        bg=Theme.active().SURFACE,
                                        fg=Theme.active().TXT_ON_SURFACE)
 
+    def set_alert(self, alert):
+        """Show `alert` in this row, or hide the row if None."""
+        self.alert = alert
+        if alert is None:
+            self.frame.place_forget()
+            return
+
+        self.time_label.configure(text=alert.date())
+        description = str(alert)
+        if alert.count > 1:
+            description += f" (x{alert.count})"
+        self.description_label.configure(text=description)
+        self.render()
+
     def render(self):
+        if self.alert is None:
+            return
+
         relheight = 1 / self.total_alerts_in_screen
         rely = relheight * self.index
         self.frame.place(relwidth=1, relheight=relheight, relx=0, rely=rely)
@@ -138,32 +169,88 @@ class AlertEntry(object):
         self.description_label.place(relx=0.3, rely=0, relheight=1, relwidth=0.7)
 
 
+class ActiveAlerts(object):
+    """The active alerts, for when the alarms aren't journaled.
+
+    Reads alerts like `AlarmHistory`, newest first.
+    """
+
+    def __init__(self, alerts_queue):
+        self.alerts_queue = alerts_queue
+
+    def _select(self, code, start, end):
+        return [alert for alert in reversed(self.alerts_queue.active_alerts)
+                if (code is None or alert.code == code) and
+                (start is None or alert.timestamp >= start) and
+                (end is None or alert.timestamp < end)]
+
+    def count(self, code=None, start=None, end=None):
+        return len(self._select(code, start, end))
+
+    def alerts(self, offset, limit, code=None, start=None, end=None):
+        return self._select(code, start, end)[offset:offset + limit]
+
+
 class AlertsHistoryScreen(object):
 
     ALERTS_ON_SCREEN = 6
-
-    def __init__(self, root, events):
+    # Name, and seconds back from now (None for all)
+    TIME_RANGES = [("All", None),
+                   ("Hour", 60 * 60),
+                   ("Day", 24 * 60 * 60),
+                   ("Week", 7 * 24 * 60 * 60)]
+    CODES = [None] + list(Alert.ALERT_CODE_TO_MESSAGE)
+
+    def __init__(self, root, events, source=None):
+        """
+        :param source: Where to read the alerts from - the `AlarmHistory` of
+            the alerts queue by default, or its active alerts if there's none.
+        """
         self.root = root
         self.events = events
+        if source is None:
+            source = self.events.alerts_queue.history
+        if source is None:
+            source = ActiveAlerts(self.events.alerts_queue)
+        self.source = source
 
         # State
         self.index = 0
+        self.total = 0
+        self.time_range = 0  # Index in `TIME_RANGES`
+        self.code = None
+        self.start = None
+        self.end = None
 
         self.alerts_history_screen = Frame(master=self.root, bg=Theme.active().BACKGROUND)
-        self.titles = AlertTitles(self.alerts_history_screen)
+        self.titles = AlertTitles(self, self.alerts_history_screen)
         self.bottom_bar = BottomBar(self, self.alerts_history_screen)
         self.entries_container = EntriesContainer(self.alerts_history_screen,
                                                   total_alerts_in_screen=self.ALERTS_ON_SCREEN)
         self.scroll_up_down_container = ScrollUpDownContainer(self, self.alerts_history_screen)
+        self.titles.set_filter(self.TIME_RANGES[self.time_range][0], self.code)
+
+    def set_filter(self, code=None, start=None, end=None):
+        """Show only the alerts of `code`, raised between `start` and `end`
+        (unix time). None doesn't filter."""
+        self.code = code
+        self.start = start
+        self.end = end
+        self.index = 0
+        self.update_entries()
 
-        self.events.alerts_queue.subscribe(self, self.on_new_alert)
-
-    @property
-    def alerts(self):
-        return self.events.alerts_queue.history()
+    def on_code_click(self):
+        position = self.CODES.index(self.code) if self.code in self.CODES else 0
+        code = self.CODES[(position + 1) % len(self.CODES)]
+        self.titles.set_filter(self.TIME_RANGES[self.time_range][0], code)
+        self.set_filter(code, self.start, self.end)
 
-    def on_new_alert(self, alert):
-        self.update_entries()
+    def on_time_range_click(self):
+        self.time_range = (self.time_range + 1) % len(self.TIME_RANGES)
+        name, seconds = self.TIME_RANGES[self.time_range]
+        self.titles.set_filter(name, self.code)
+        self.set_filter(self.code,
+                        None if seconds is None else time.time() - seconds)
 
     def on_scroll_up(self):
         if self.index == 0:
@@ -173,7 +260,7 @@ class AlertsHistoryScreen(object):
         self.update_entries()
 
     def on_scroll_down(self):
-        if len(self.alerts) - self.index <= self.ALERTS_ON_SCREEN:
+        if self.total - self.index <= self.ALERTS_ON_SCREEN:
             return
 
         self.index += 1
@@ -183,15 +270,16 @@ class AlertsHistoryScreen(object):
         self.hide()
 
     def update_entries(self):
-        """This function assumes that there ARE alerts to be shown.
+        """Show the alerts of the current position and filter.
 
-        Whether we reached the end of our alerts queue is decided by the functions:
-            * on_scroll_down()
-            * on_scroll_up()
+        Only the alerts shown are read from the source, into the rows.
         """
-        self.entries_container.set_entries(
-            alerts=self.alerts[self.index:self.index + self.ALERTS_ON_SCREEN]
-        )
+        self.total = self.source.count(self.code, self.start, self.end)
+        self.index = max(0, min(self.index,
+                                self.total - self.ALERTS_ON_SCREEN))
+        self.entries_container.set_entries(self.source.alerts(
+            self.index, self.ALERTS_ON_SCREEN, self.code, self.start,
+            self.end))
 
     def show(self):
         self.alerts_history_screen.place(relx=0.2, rely=0, relwidth=0.8, relheight=1)
@@ -1,27 +1,41 @@
 import math
-import statistics
 from tkinter import *
 
 from data.configurations import ConfigurationManager, Point
 from graphics.themes import Theme
 from errors import InvalidCalibrationError
+from logic.calibration import CalibrationJob
 
 
 class Calibration(object):
+    """Calibrating a sensor by averaging its raw value.
+
+    The values are sampled by a `CalibrationJob`, fed by the sampler between
+    its samples (or on the GUI's schedule, without a sampler), while the
+    screen reports its progress from scheduled updates. So the main loop,
+    and with it the watchdog, keeps running throughout.
+    """
     CALIBRATED_DRIVER = NotImplemented
     PRE_CALIBRATE_ALERT_MSG = NotImplemented
     NUMBER_OF_SAMPLES_TO_TAKE = 100
+    MIN_SAMPLES_TO_TAKE = 20
+    # Done early once the variance of the average is below this
+    MAX_VARIANCE = 0
     SAMPLING_TIME = 3  # seconds
     SLEEP_IN_BETWEEN = SAMPLING_TIME / 100
+    UPDATE_INTERVAL = 100  # milliseconds
 
-    def __init__(self, parent, root, drivers, observer):
+    def __init__(self, parent, root, drivers, observer, sampler=None):
         self.parent = parent
         self.root = root
         self.config = ConfigurationManager.config()
         self.observer = observer
+        self.sampler = sampler
 
         # State
         self.average_value_found = None
+        self.job = None
+        self._scheduled = None
 
         self.drivers = drivers
         self.sensor_driver = getattr(drivers, self.CALIBRATED_DRIVER)
@@ -69,35 +83,58 @@ class Calibration(object):
             return True
 
     def calibrate(self):
-        # TODO: Handle watchdog
-
-        values = []
-
-        # Read values from sensor
-        for index in range(self.NUMBER_OF_SAMPLES_TO_TAKE):
-            # Inform User
-            waiting_time_left = ((self.NUMBER_OF_SAMPLES_TO_TAKE - index) *
-                                 self.SLEEP_IN_BETWEEN)
-
-            self.label.configure(
-                text=f"Please wait {math.ceil(waiting_time_left)} seconds...")
-
-            for btn in self.calibration_buttons:
-                btn.configure(state="disabled")
+        for btn in self.calibration_buttons:
+            btn.configure(state="disabled")
+
+        self.job = CalibrationJob(self.read_raw_value,
+                                  max_samples=self.NUMBER_OF_SAMPLES_TO_TAKE,
+                                  min_samples=self.MIN_SAMPLES_TO_TAKE,
+                                  max_variance=self.MAX_VARIANCE)
+        if self.sampler is not None:
+            self.sampler.add_calibration_job(self.job)
+        self.update_progress()
+
+    def update_progress(self):
+        self._scheduled = None
+        if self.sampler is None:
+            self.job.sample()
+
+        if self.job.done:
+            self.finish()
+            return
+
+        # Inform User
+        waiting_time_left = self.job.remaining_time
+        if waiting_time_left is None:
+            waiting_time_left = self.SAMPLING_TIME
+        self.label.configure(
+            text=f"Please wait {math.ceil(waiting_time_left)} seconds...")
 
-            self.label.update()  # This is needed so the GUI doesn't freeze
+        interval = (self.UPDATE_INTERVAL if self.sampler is not None
+                    else int(self.SLEEP_IN_BETWEEN * 1000))
+        self._scheduled = self.root.after(interval, self.update_progress)
 
-            values.append(self.read_raw_value())
+    def finish(self):
+        job, self.job = self.job, None
+        for btn in self.calibration_buttons:
+            btn.configure(state="normal")
 
-            self.timer.sleep(self.SLEEP_IN_BETWEEN)
+        if job.error is not None:
+            self.label.configure(text=f"Calibration failed:\n{job.error}")
+            return
 
-        self.average_value_found = statistics.mean(values)
+        self.average_value_found = job.mean
         self.label.configure(
             text=f"Offset change found: {self.get_difference():.2f}")
-
         self.parent.enable_ok_button()
-        for btn in self.calibration_buttons:
-            btn.configure(state="normal")
+
+    def cancel(self):
+        if self._scheduled is not None:
+            self.root.after_cancel(self._scheduled)
+            self._scheduled = None
+        if self.job is not None:
+            self.job.cancel()
+            self.job = None
 
     def render(self):
         self.frame.place(relx=0, rely=0.25, relwidth=1, relheight=0.5)
@@ -152,12 +189,14 @@ class Title(object):
 
 
 class CalibrationScreen(object):
-    def __init__(self, root, calibration_class, drivers, observer):
+    def __init__(self, root, calibration_class, drivers, observer,
+                 sampler=None):
         self.root = root
         self.calibration_class = calibration_class
 
         self.screen = Frame(master=self.root, bg="red")
-        self.calibration = self.calibration_class(self, self.screen, drivers, observer)
+        self.calibration = self.calibration_class(self, self.screen, drivers,
+                                                  observer, sampler)
         self.title = Title(self, self.screen, self.calibration.NAME)
         self.ok_cancel_section = OKCancelSection(self, self.screen)
 
@@ -178,6 +217,7 @@ class CalibrationScreen(object):
             self.hide()
 
     def on_cancel(self):
+        self.calibration.cancel()
         self.hide()
 
 
@@ -187,8 +227,12 @@ class DifferentialPressureCalibration(Calibration):
     PRE_CALIBRATE_ALERT_MSG = (
         "Please make sure\n"
         "tubes are detached from sensor!")
+    MAX_VARIANCE = 1e-6  # cmH2O^2
 
     def read_raw_value(self):
+        if self.sampler is not None:
+            # From the sampler's own samples, the sensor isn't read twice
+            return self.sampler.read_differential_pressure()
         return self.sensor_driver.read_differential_pressure()
 
     def get_difference(self):
@@ -206,6 +250,7 @@ class OxygenCalibration(Calibration):
     NAME = "O2 Calibration"
     CALIBRATED_DRIVER = "a2d"
     SAMPLING_TIME = 5  # seconds
+    MAX_VARIANCE = 1e-8  # V^2
     PRE_CALIBRATE_ALERT_MSG = (
         "Please make sure\n"
         "For 21% - detach oxygen tube\n"
@@ -237,12 +282,18 @@ class OxygenCalibration(Calibration):
     def calibrate_point1(self):
         self.calibrated_point = self.config.calibration.oxygen_point1
         self.calibrate()
-        self.calibrate_point2_button.configure(state="disabled")
 
     def calibrate_level2_point(self):
         self.calibrated_point = Point(x=self.STEP_2_CALIBRATION_PERCENTAGE, y=0)
         self.calibrate()
-        self.calibrate_point1_button.configure(state="disabled")
+
+    def finish(self):
+        super().finish()
+        # Only the calibrated point can be set
+        if self.calibrated_point is self.config.calibration.oxygen_point1:
+            self.calibrate_point2_button.configure(state="disabled")
+        else:
+            self.calibrate_point1_button.configure(state="disabled")
 
     def read_raw_value(self):
         return self.sensor_driver.read_oxygen_raw()
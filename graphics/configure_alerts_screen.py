@@ -125,10 +125,11 @@ class Section(object):
 class SectionWithCalibrate(Section):
     CALIBRATION_CLASS = NotImplemented
 
-    def __init__(self, parent, root, drivers, observer):
+    def __init__(self, parent, root, drivers, observer, sampler=None):
         super().__init__(parent, root)
         self.drivers = drivers
         self.observer = observer
+        self.sampler = sampler
         self.calibrate_button = Button(master=self.minmax_divider)
         self.calibrate_button.configure(bg="#3c3149", fg="#d7b1f9",
                                         text="Calibrate",
@@ -146,7 +147,8 @@ class SectionWithCalibrate(Section):
         screen = CalibrationScreen(self.parent.root,
                                    self.CALIBRATION_CLASS,
                                    drivers=self.drivers,
-                                   observer=self.observer)
+                                   observer=self.observer,
+                                   sampler=self.sampler)
         screen.show()
 
 
@@ -261,7 +263,7 @@ class ConfirmCancelSection(object):
 
 
 class ConfigureAlarmsScreen(object):
-    def __init__(self, root, drivers, observer):
+    def __init__(self, root, drivers, observer, sampler=None):
         self.root = root
 
         # Screen state
@@ -272,10 +274,12 @@ class ConfigureAlarmsScreen(object):
 
         # Sections
         self.oxygen_section = O2Section(self, self.configure_alerts_screen,
-                                        drivers=drivers, observer=observer)
+                                        drivers=drivers, observer=observer,
+                                        sampler=sampler)
         self.volume_section = VolumeSection(self,
                                             self.configure_alerts_screen,
-                                            drivers=drivers, observer=observer)
+                                            drivers=drivers, observer=observer,
+                                            sampler=sampler)
         self.pressure_section = PressureSection(self, self.configure_alerts_screen)
         self.resp_rate_section = RespRateSection(self, self.configure_alerts_screen)
 
@@ -1,5 +1,3 @@
-from copy import copy
-
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 from matplotlib import rcParams
@@ -199,8 +197,14 @@ class AirPressureGraph(Graph):
         super().__init__(*args, **kwargs)
         self.min_threshold = None
         self.max_threshold = None
-        self.range = copy(self.config.thresholds.pressure)
+        self.thresholds_changed = False
         self.update_thresholds()
+        ConfigurationManager.instance().subscribe(
+            "thresholds", self, self.on_thresholds_change)
+
+    def on_thresholds_change(self, thresholds):
+        # Redrawn with the next frame
+        self.thresholds_changed = True
 
     def update_thresholds(self):
         min_value = self.config.thresholds.pressure.min
@@ -218,9 +222,9 @@ class AirPressureGraph(Graph):
 
     def update(self):
         super(AirPressureGraph, self).update()
-        if self.range != self.config.thresholds.pressure:
+        if self.thresholds_changed:
+            self.thresholds_changed = False
             self.update_thresholds()
-            self.range = copy(self.config.thresholds.pressure)
 
     @property
     def configured_scale(self):
@@ -15,20 +15,23 @@ from data.observable import Observable
 
 
 class MasterFrame(object):
-    def __init__(self, root, drivers, events, measurements, record_sensors=False):
+    def __init__(self, root, drivers, events, measurements, record_sensors=False,
+                 sampler=None):
         self.root = root
         observer = Observable()
 
         self.master_frame = Frame(master=self.root, bg="black")
         self.left_pane = LeftPane(parent=self, measurements=measurements)
         self.right_pane = RightPane(
-            self, events=events, drivers=drivers, observer=observer)
+            self, events=events, drivers=drivers, observer=observer,
+            sampler=sampler)
         self.center_pane = CenterPane(self, measurements=measurements)
         self.top_pane = TopPane(self, events=events, drivers=drivers,
                                 measurements=measurements, record_sensors=record_sensors)
         self.recalibration_bar = RecalibrationSnackbar(self.root,
                                                        drivers,
-                                                       observer)
+                                                       observer,
+                                                       sampler)
 
     @property
     def panes(self):
@@ -154,7 +157,7 @@ class CenterPane(object):
 
 
 class RightPane(object):
-    def __init__(self, parent, events, drivers, observer):
+    def __init__(self, parent, events, drivers, observer, sampler=None):
         self.parent = parent
         self.events = events
         self.drivers = drivers
@@ -173,7 +176,7 @@ class RightPane(object):
         self.clear_alerts_btn = ClearAlertsButton(parent=self, events=self.events)
         self.lock_thresholds_btn = LockThresholdsButton(parent=self)
         self.configure_alerts_btn = OpenConfigureAlertsScreenButton(
-            self, drivers=self.drivers, observer=observer)
+            self, drivers=self.drivers, observer=observer, sampler=sampler)
         self.are_buttons_locked = False
         self.lockable_buttons = [self.mute_alerts_btn, self.configure_alerts_btn,
                                  self.clear_alerts_btn]
@@ -153,11 +153,12 @@ class OpenConfigureAlertsScreenButton(BaseButton):
     IMAGE_PATH = os.path.join(RESOURCES_DIRECTORY,
                               "baseline_settings_white_48dp.png")
 
-    def __init__(self, parent, drivers, observer):
+    def __init__(self, parent, drivers, observer, sampler=None):
         self.parent = parent
         self.root = parent.element
         self.drivers = drivers
         self.observer = observer
+        self.sampler = sampler
 
         self.button = ImageButton(
             master=self.root,
@@ -178,7 +179,8 @@ class OpenConfigureAlertsScreenButton(BaseButton):
         master_frame = self.parent.parent.element
         screen = ConfigureAlarmsScreen(master_frame,
                                        drivers=self.drivers,
-                                       observer=self.observer)
+                                       observer=self.observer,
+                                       sampler=self.sampler)
         screen.show()
 
     def render(self):
@@ -9,7 +9,7 @@ from graphics.snackbar.base_snackbar import BaseSnackbar
 
 
 class RecalibrationSnackbar(BaseSnackbar):
-    def __init__(self, root, drivers, observer):
+    def __init__(self, root, drivers, observer, sampler=None):
         super().__init__(root)
 
         self.calibrate_button = Button(
@@ -39,6 +39,7 @@ class RecalibrationSnackbar(BaseSnackbar):
         self.drivers = drivers
         self.timer = drivers.timer
         self.observer = observer
+        self.sampler = sampler
         self.last_dp_calibration_ts = None
         observer.subscribe(self, self.on_calibration_done)
 
@@ -89,7 +90,8 @@ class RecalibrationSnackbar(BaseSnackbar):
         screen = CalibrationScreen(self.root,
                                    DifferentialPressureCalibration,
                                    self.drivers,
-                                   self.observer)
+                                   self.observer,
+                                   self.sampler)
         screen.show()
 
     def update_label(self):
@@ -0,0 +1,194 @@
+"""Logging which doesn't stall the sampling.
+
+Records are passed through a queue to a listener thread, which formats and
+writes them, so the sampling thread never waits for the disk. Only their
+message is formatted before being queued, while its arguments are as they
+were when logged. Before being queued, repeating records are rate limited:
+up to `burst` records of the same message are let through every `period`
+seconds, and the count of the suppressed ones is added to the next one
+which is let through - or logged by itself, once the period is over.
+
+A message is identified by its logger, level and unformatted message, so
+log lazily (`log.warning("too high %s", value)`) for the values not to make
+every record unique. Records can also be grouped explicitly:
+    log.error("Read failed: %s", e, extra={RATE_LIMIT_KEY: "flow"})
+"""
+import time
+import queue
+import logging
+from threading import Lock
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener
+
+RATE_LIMIT_KEY = "rate_limit_key"
+
+
+class RateLimitFilter(logging.Filter):
+    """Let through up to `burst` records of each message per `period`.
+
+    Up to `max_keys` messages are tracked, those of the oldest windows are
+    forgotten first. When a window with suppressed records ends, a record
+    with their count is passed to `emit`, if given.
+    """
+    SUMMARY = "%s (%d similar messages suppressed)"
+
+    def __init__(self, period=10, burst=5, max_keys=1024, emit=None):
+        super(RateLimitFilter, self).__init__()
+        self.period = period
+        self.burst = burst
+        self.max_keys = max_keys
+        self.emit = emit
+        # Message key -> [window start, records in window, suppressed,
+        # the first suppressed record], by the window's start
+        self._windows = OrderedDict()
+        self._swept = time.monotonic()
+        self._lock = Lock()
+
+    @staticmethod
+    def key(record):
+        msg = record.msg if isinstance(record.msg, str) else str(record.msg)
+        return (record.name, record.levelno,
+                getattr(record, RATE_LIMIT_KEY, msg))
+
+    def _summary(self, window):
+        """:return: A record of the suppressed records of a window."""
+        record = window[3]
+        return logging.LogRecord(
+            record.name, record.levelno, record.pathname, record.lineno,
+            self.SUMMARY, (record.msg, window[2]), None, record.funcName)
+
+    def _evict(self, now):
+        """Forget ended windows, and the oldest ones above `max_keys`.
+
+        :return: Records of the suppressed records of the forgotten windows.
+        """
+        summaries = []
+        sweep = now - self._swept >= self.period
+        if sweep:
+            self._swept = now
+        while self._windows:
+            key, window = next(iter(self._windows.items()))
+            if not ((sweep and now - window[0] >= self.period) or
+                    len(self._windows) > self.max_keys):
+                break
+            del self._windows[key]
+            if window[2]:
+                summaries.append(self._summary(window))
+        return summaries
+
+    def flush(self):
+        """Emit the counts of the records suppressed so far."""
+        with self._lock:
+            windows = list(self._windows.values())
+            self._windows.clear()
+        self._emit([self._summary(window) for window in windows if window[2]])
+
+    def _emit(self, summaries):
+        if self.emit is not None:
+            for summary in summaries:
+                self.emit(summary)
+
+    def filter(self, record):
+        now = time.monotonic()
+        key = self.key(record)
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.period:
+                suppressed = 0 if window is None else window[2]
+                self._windows[key] = [now, 1, 0, None]
+                self._windows.move_to_end(key)
+                summaries = self._evict(now)
+            elif window[1] < self.burst:
+                window[1] += 1
+                suppressed = 0
+                summaries = self._evict(now)
+            else:
+                window[2] += 1
+                if window[3] is None:
+                    # Formatted once a window, its arguments may change
+                    window[3] = logging.makeLogRecord(record.__dict__)
+                    window[3].msg = record.getMessage()
+                return False
+
+        self._emit(summaries)
+        if suppressed:
+            # Keep the formatting lazy, it's done only if the record is
+            # written
+            record.args = (_LazyMessage(record.msg, record.args), suppressed)
+            record.msg = self.SUMMARY
+        return True
+
+
+class _LazyMessage(object):
+    """Format a record's message only when the record is written."""
+
+    def __init__(self, msg, args):
+        self.msg = msg
+        self.args = args
+
+    def __str__(self):
+        msg = str(self.msg)
+        return msg % self.args if self.args else msg
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Queue records without blocking, for a `QueueListener`.
+
+    Only the message is formatted here, as its arguments may change by the
+    time it's written. The rest is formatted by the listener's handlers.
+    Records below `level` aren't queued, nor formatted, so set it to the
+    lowest level of the listener's handlers. When the queue is full, records
+    are dropped and counted.
+    """
+
+    def __init__(self, log_queue, level=logging.NOTSET):
+        super(NonBlockingQueueHandler, self).__init__(log_queue)
+        self.setLevel(level)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def queue_logging(handlers, queue_size=10000, period=10, burst=5):
+    """Route the root logger's records to `handlers` on a listener thread.
+
+    :return: The started `QueueListener`. Stop it at exit, to write the
+        records left in the queue.
+    """
+    log_queue = queue.Queue(queue_size)
+    # Records none of the handlers would write are dropped before formatting
+    queue_handler = NonBlockingQueueHandler(
+        log_queue, min(handler.level for handler in handlers))
+    rate_limit = RateLimitFilter(
+        period, burst,
+        emit=lambda record: queue_handler.enqueue(
+            queue_handler.prepare(record)))
+    queue_handler.addFilter(rate_limit)
+    logging.getLogger().addHandler(queue_handler)
+
+    listener = RateLimitedQueueListener(log_queue, rate_limit, *handlers,
+                                        respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+class RateLimitedQueueListener(QueueListener):
+    """Write the counts of the suppressed records when stopped."""
+
+    def __init__(self, log_queue, rate_limit, *handlers, **kwargs):
+        super(RateLimitedQueueListener, self).__init__(log_queue, *handlers,
+                                                       **kwargs)
+        self.rate_limit = rate_limit
+
+    def stop(self):
+        self.rate_limit.flush()
+        super(RateLimitedQueueListener, self).stop()
@@ -1,9 +1,10 @@
 """Calibrating the flow graphs automatically by identifying "tails"."""
 # pylint: disable=too-many-arguments
 # pylint: disable=too-few-public-methods,too-many-instance-attributes
+import os
 import logging
-
-import numpy as np
+from collections import deque
+from threading import Thread, Event, Lock
 
 
 class TimeRange:
@@ -44,7 +45,11 @@ class AutoFlowCalibrator:
     def iteration(self):
         return TimeRange(self.iteration_start_time, self.iteration_length)
 
-    def get_offset(self, flow_slm, timestamp):
+    def get_offset(self, flow_slm, timestamp, dp_offset=None):
+        """
+        :param dp_offset: The calibration offset `flow_slm` was converted
+            with, or None if it's the driver's current one.
+        """
         if self.iteration_start_time is None:
             self.log.debug("Starting a new auto calibration iteration")
             self.iteration_start_time = timestamp
@@ -56,7 +61,7 @@ class AutoFlowCalibrator:
             self.iterations_count = 0
 
         if timestamp in self.iteration:
-            self.tail_detector.add_sample(flow_slm, timestamp)
+            self.tail_detector.add_sample(flow_slm, timestamp, dp_offset)
             return None
 
         if self.iterations_count < self.iterations:
@@ -83,7 +88,16 @@ class AutoFlowCalibrator:
 
 
 class TailDetector:
-    """Detecting tail on a sequence of samples."""
+    """Detecting tails on a stream of samples.
+
+    A tail is a run of samples below `sample_threshold`, with a slope below
+    `slope_threshold` but for up to `grace_length` samples in a row. The last
+    quarter of every tail of at least `min_tail_length` samples is summed as
+    the tail closes, so processing doesn't depend on the number of samples.
+    Each sample is summed as the raw differential pressure, by the offset it
+    was converted with, so a change of offset meanwhile doesn't skew it. A
+    tail still open when processing is averaged as if it closed there.
+    """
 
     def __init__(self, dp_driver, sample_threshold, slope_threshold,
                  min_tail_length, grace_length):
@@ -93,81 +107,212 @@ class TailDetector:
         self.min_tail_length = min_tail_length
         self.grace_length = grace_length
 
-        self.samples = []
-        self.timestamps = []
-        self.tail_indices = []
-        self.candidate_indices = []
+        self.last_sample = None
+        self.last_timestamp = None
+        self.last_offset = None
+        self.candidates = []  # (sample, timestamp, offset) of the open tail
         self.grace_count = 0
+        self.tail_length = 0  # Number of tail samples averaged
+        self.tail_sum = 0  # Sum of their raw differential pressure
 
         # for debug and plotting purpose
         self.start_tails_ts = []
         self.end_tails_ts = []
 
     def reset(self):
-        self.samples = []
-        self.timestamps = []
-        self.tail_indices = []
-        self.candidate_indices = []
+        self.last_sample = None
+        self.last_timestamp = None
+        self.last_offset = None
+        self.candidates = []
         self.grace_count = 0
+        self.tail_length = 0
+        self.tail_sum = 0
+
+    def add_sample(self, sample, timestamp, offset=None):
+        """
+        :param offset: The calibration offset `sample` was converted with,
+            or None if it's the driver's offset until the tail is closed.
+        """
+        previous = (self.last_sample, self.last_timestamp, self.last_offset)
+        self.last_sample, self.last_timestamp = sample, timestamp
+        self.last_offset = offset
+        if previous[0] is None:
+            return
+
+        # The slope leading to a sample decides on the sample before it
+        slope = (sample - previous[0]) / (timestamp - previous[1])
+
+        # Passed the tail value threshold - close tail
+        if abs(sample) >= self.sample_threshold:
+            self.check_close_up()
+
+        # Both value and slope are in threshold, add point to tail
+        elif abs(slope) < self.slope_threshold:
+            self.candidates.append(previous)
+            self.grace_count = 0
+
+        # Passed the tail slope threshold, close tail or increase grace
+        else:
+            self.candidates.append(previous)
+            self.check_close_up(
+                in_grace=self.grace_count < self.grace_length)
 
-    def add_sample(self, sample, timestamp):
-        self.samples.append(sample)
-        self.timestamps.append(timestamp)
+    def sum_tail(self, length):
+        """Sum the last quarter of the first `length` candidates.
 
-    def traverse_samples(self):
-        for i in range(1, len(self.samples)):
-            slope = ((self.samples[i] - self.samples[i - 1]) /
-                     (self.timestamps[i] - self.timestamps[i - 1]))
-            yield self.samples[i], slope
+        :return: The sum of their raw differential pressure, and the index of
+            the first of them.
+        """
+        start_index = int(length * 3 / 4)
+        tail_sum = 0
+        for sample, _, offset in self.candidates[start_index:length]:
+            if offset is None:
+                offset = self.dp_driver.get_calibration_offset()
+            tail_sum += self.dp_driver.flow_to_pressure(sample) + offset
 
-    def check_close_up(self, is_last_element, in_grace=False):
+        return tail_sum, start_index
+
+    def check_close_up(self, in_grace=False):
         # Remove grace samples from tail
-        tail = self.candidate_indices[:len(self.candidate_indices) - self.grace_count]
+        length = len(self.candidates) - self.grace_count
 
-        if len(tail) > 0 and (not in_grace or is_last_element):
-            if len(tail) >= self.min_tail_length:
-                start_index = int(len(tail) * 3 / 4)
-                self.tail_indices += tail[start_index:]
+        if length > 0 and not in_grace:
+            if length >= self.min_tail_length:
+                tail_sum, start_index = self.sum_tail(length)
+                self.tail_sum += tail_sum
+                self.tail_length += length - start_index
 
-                self.start_tails_ts.append(self.timestamps[tail[start_index]])
-                self.end_tails_ts.append(self.timestamps[tail[-1]])
+                self.start_tails_ts.append(self.candidates[start_index][1])
+                self.end_tails_ts.append(self.candidates[length - 1][1])
 
             self.grace_count = 0
-            self.candidate_indices = []
+            self.candidates = []
 
         elif in_grace:
             self.grace_count += 1
 
     def process(self):
-        for i, (sample, slope) in enumerate(self.traverse_samples()):
-            # Passed the tail value threshold - close tail
-            if abs(sample) >= self.sample_threshold:
-                is_last_element = i == len(self.samples) - 1
-                self.check_close_up(is_last_element=is_last_element)
-
-            # Both value and slope are in threshold, add point to tail
-            elif abs(slope) < self.slope_threshold:
-                self.candidate_indices.append(i)
-                self.grace_count = 0
-
-            # Passed the tail slope threshold, close tail or increase grace
-            else:
-                self.candidate_indices.append(i)
-                is_last_element = i == len(self.samples) - 1
-                self.check_close_up(is_last_element=is_last_element,
-                                    in_grace=self.grace_count < self.grace_length)
-
-        indices = np.array(self.tail_indices)
-        if len(indices) == 0:
+        """:return: The average differential pressure of the tails found so
+            far, or None if there are too few of them."""
+        tail_sum, tail_length = self.tail_sum, self.tail_length
+        # Close the open tail, without its grace samples, as the end of the
+        # samples would. It's kept open, as more samples may extend it.
+        length = len(self.candidates) - self.grace_count
+        if length >= self.min_tail_length:
+            open_sum, start_index = self.sum_tail(length)
+            tail_sum += open_sum
+            tail_length += length - start_index
+
+        if tail_length == 0 or tail_length < self.min_tail_length:
             return None
 
-        if len(self.tail_indices) < self.min_tail_length:
-            return None
+        return tail_sum / tail_length
 
-        dp_values = np.array([self.dp_driver.flow_to_pressure(f) +
-                              self.dp_driver.get_calibration_offset()
-                              for f in self.samples])
 
-        # Extract differential pressure at tail timestamps
-        tails_dp = dp_values[indices]
-        return np.average(tails_dp)
+class OffsetHandoff:
+    """The flow driver, as seen by a calibrator on another thread.
+
+    Offsets set by the calibrator are pending until `apply` sets them on
+    the driver, on the thread which reads it, between samples.
+    """
+    def __init__(self, dp_driver):
+        self.dp_driver = dp_driver
+        self._pending = None
+        self._lock = Lock()
+
+    def flow_to_pressure(self, flow):
+        return self.dp_driver.flow_to_pressure(flow)
+
+    def pressure_to_flow(self, pressure):
+        return self.dp_driver.pressure_to_flow(pressure)
+
+    def get_calibration_offset(self):
+        with self._lock:
+            if self._pending is not None:
+                return self._pending
+            return self.dp_driver.get_calibration_offset()
+
+    def set_calibration_offset(self, offset):
+        with self._lock:
+            self._pending = offset
+
+    def apply(self):
+        """Set the pending offset on the driver.
+
+        :return: The offset, or None if none was pending.
+        """
+        with self._lock:
+            offset, self._pending = self._pending, None
+            if offset is not None:
+                self.dp_driver.set_calibration_offset(offset)
+        return offset
+
+
+class CalibrationWorker(Thread):
+    """Auto calibrating on a copy of the flow stream, on a low priority.
+
+    The sampler posts its flow samples, with the offsets they were converted
+    with, and applies the tail offsets found by `handoff.apply()`. The offset
+    of every interval is passed to `on_offset`, on this thread.
+    """
+    MAX_PENDING_SAMPLES = 10000
+
+    def __init__(self, calibrator, handoff, on_offset, interval=0.5,
+                 niceness=10):
+        super().__init__()
+        self.daemon = True
+        self.calibrator = calibrator
+        self.handoff = handoff
+        self.on_offset = on_offset
+        self.interval = interval
+        self.niceness = niceness
+        self.samples = deque(maxlen=self.MAX_PENDING_SAMPLES)
+        self.dropped = 0
+        self.should_run = True
+        self.wake = Event()
+        self.log = logging.getLogger(self.__class__.__name__)
+
+    def post(self, flow_slm, timestamp, dp_offset):
+        """
+        :param dp_offset: The calibration offset `flow_slm` was converted
+            with.
+        """
+        if len(self.samples) == self.samples.maxlen:
+            self.dropped += 1
+        # `deque.append` is atomic, so no locking is needed against `process`
+        self.samples.append((flow_slm, timestamp, dp_offset))
+
+    def stop(self):
+        self.should_run = False
+        self.wake.set()
+
+    def process(self):
+        """Feed the posted samples to the calibrator."""
+        while self.samples:
+            flow_slm, timestamp, dp_offset = self.samples.popleft()
+            offset = self.calibrator.get_offset(flow_slm=flow_slm,
+                                                timestamp=timestamp,
+                                                dp_offset=dp_offset)
+            if offset is not None:
+                self.on_offset(offset)
+
+    def run(self):
+        try:
+            # The nice value is per thread on Linux
+            os.nice(self.niceness)
+        except OSError as error:
+            self.log.warning("Can't lower the calibration priority: %s",
+                             error)
+
+        while self.should_run:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            # noinspection PyBroadException
+            try:
+                self.process()
+            except Exception:  # pylint: disable=broad-except
+                self.log.exception("Auto calibration failed")
+
+        if self.dropped:
+            self.log.warning("%d samples were dropped from the calibration",
+                             self.dropped)
@@ -0,0 +1,77 @@
+"""Estimating a sensor's raw value, for calibrating it."""
+# pylint: disable=too-many-instance-attributes
+import math
+import time
+import logging
+
+
+class CalibrationJob:
+    """Averaging a sensor's raw value, a sample at a time.
+
+    The job is fed by the sampler, a sample every sampling iteration, so
+    calibrating doesn't hold up the sampling or the GUI. It's done after
+    `max_samples` samples, or once the variance of their mean is below
+    `max_variance`, after at least `min_samples`.
+    """
+    def __init__(self, read, max_samples=100, min_samples=20,
+                 max_variance=0.0):
+        self.read = read
+        self.max_samples = max_samples
+        self.min_samples = min_samples
+        self.max_variance = max_variance
+        self.log = logging.getLogger(self.__class__.__name__)
+
+        self.count = 0
+        self.mean = None
+        self._squares = 0  # Sum of squared differences from the mean
+        self.error = None
+        self.done = False
+        self.start_time = None
+
+    @property
+    def variance(self):
+        """The variance of the mean, as an estimate of the raw value."""
+        if self.count < 2:
+            return math.inf
+        return self._squares / (self.count - 1) / self.count
+
+    @property
+    def remaining_time(self):
+        """Estimated seconds left, or None before the first sample."""
+        if self.count == 0:
+            return None
+        rate = self.count / max(time.monotonic() - self.start_time, 1e-3)
+        return (self.max_samples - self.count) / rate
+
+    def add(self, value):
+        if self.start_time is None:
+            self.start_time = time.monotonic()
+
+        # Welford's running mean and variance
+        self.count += 1
+        delta = value - (self.mean or 0)
+        self.mean = (self.mean or 0) + delta / self.count
+        self._squares += delta * (value - self.mean)
+
+        if self.count >= self.max_samples or (
+                self.count >= self.min_samples and
+                self.variance <= self.max_variance):
+            self.done = True
+
+    def sample(self):
+        """Read and add a sample, unless the job is done."""
+        if self.done:
+            return
+
+        try:
+            value = self.read()
+        except Exception as error:  # pylint: disable=broad-except
+            self.log.error("Calibration reading failed: %s", error)
+            self.error = error
+            self.done = True
+            return
+
+        self.add(value)
+
+    def cancel(self):
+        self.done = True
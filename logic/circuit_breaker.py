@@ -0,0 +1,96 @@
+"""Protecting the sampling loop from failing sensors."""
+# pylint: disable=too-many-instance-attributes
+import logging
+from enum import Enum
+from threading import RLock
+
+
+class BreakerState(Enum):
+    """Possible states of a circuit breaker."""
+    Closed = 0  # Sensor is healthy, every read goes through
+    Open = 1  # Sensor is failing, reads are skipped until the backoff ends
+    HalfOpen = 2  # Backoff ended, a single probing read is allowed
+
+
+class CircuitBreaker:
+    """Skip reading a sensor for a while after consecutive failures.
+
+    A dead or unplugged sensor usually fails only after an I2C timeout, so
+    retrying it on every sample would ruin the timing of the healthy sensors.
+    After `failure_threshold` consecutive failures the breaker opens, and
+    reads are skipped until the backoff time passes. The next read is a
+    probe - success closes the breaker, failure opens it again with twice
+    the backoff (up to `max_backoff`).
+
+    All times are the sampler's timestamps, so the breaker behaves the same
+    in simulation and in real time. The breaker may be used by the sampling
+    and the acquisition threads at once.
+    """
+    FAILURE_THRESHOLD = 3
+    INITIAL_BACKOFF = 0.1  # seconds
+    MAX_BACKOFF = 5  # seconds
+
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD,
+                 initial_backoff=INITIAL_BACKOFF, max_backoff=MAX_BACKOFF):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.log = logging.getLogger(self.__class__.__name__)
+        self._lock = RLock()
+
+        self.state = BreakerState.Closed
+        self.consecutive_failures = 0
+        self.trips = 0
+        self.backoff = 0
+        self.retry_time = None
+
+    def __repr__(self):
+        return (f"CircuitBreaker(name={self.name}, state={self.state.name}, "
+                f"failures={self.consecutive_failures}, "
+                f"backoff={self.backoff})")
+
+    def reset(self):
+        with self._lock:
+            self.state = BreakerState.Closed
+            self.consecutive_failures = 0
+            self.trips = 0
+            self.backoff = 0
+            self.retry_time = None
+
+    def allow(self, timestamp):
+        """Check whether the sensor should be read at the given time."""
+        with self._lock:
+            if self.state != BreakerState.Open:
+                return True
+
+            if timestamp < self.retry_time:
+                return False
+
+            self.state = BreakerState.HalfOpen
+            return True
+
+    def on_success(self):
+        with self._lock:
+            if self.state != BreakerState.Closed:
+                self.log.info("%s sensor recovered after %d failures",
+                              self.name, self.consecutive_failures)
+            self.reset()
+
+    def on_failure(self, timestamp):
+        with self._lock:
+            self.consecutive_failures += 1
+            if (self.state == BreakerState.HalfOpen or
+                    self.consecutive_failures >= self.failure_threshold):
+                self.trip(timestamp)
+
+    def trip(self, timestamp):
+        with self._lock:
+            self.trips += 1
+            self.backoff = min(self.initial_backoff * 2 ** (self.trips - 1),
+                               self.max_backoff)
+            self.retry_time = timestamp + self.backoff
+            self.state = BreakerState.Open
+        self.log.warning("%s sensor failed %d times in a row. "
+                         "Not reading it for the next %s seconds",
+                         self.name, self.consecutive_failures, self.backoff)
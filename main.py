@@ -1,3 +1,4 @@
+import os
 import multiprocessing
 import argparse
 import logging
@@ -10,20 +11,30 @@ from threading import Event
 import psutil
 
 from drivers.driver_factory import DriverFactory
-from data.configurations import ConfigurationManager
+from data.configurations import ConfigurationManager, ConfigWatcher
 from data.measurements import Measurements
 from data.events import Events
+from data.observable import EventBus
+from alarm_history import AlarmHistory, HistoryWriter, HISTORY_FILE
 from application import Application
 from algo import Sampler
+from sample_storage import parse_time
 from telemetry.sender import TelemetrySender
 from wd_task import WdTask
 from alert_peripheral_handler import AlertPeripheralHandler
+from log_handlers import queue_logging
 import errors
 from drivers.null_driver import NullDriver
 
 BYTES_IN_MB = 2 ** 20
 BYTES_IN_GB = 2 ** 30
 
+# The log and the alarms journal are kept in the application's directory,
+# where `scripts/save_logs.py` fetches them from
+LOG_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+LOG_FILE = os.path.join(LOG_DIRECTORY, "inhalator.log")
+ALARMS_FILE = os.path.join(LOG_DIRECTORY, HISTORY_FILE)
+
 
 def monitor(target, args, output_path):
     worker_process = multiprocessing.Process(target=target, args=(args,))
@@ -45,10 +56,14 @@ def monitor(target, args, output_path):
 
 
 def configure_logging(level):
+    """Log to a file, written by a listener thread.
+
+    :return: The root logger, and the listener, to stop at exit.
+    """
     logger = logging.getLogger()
     logger.setLevel(level)
     # create file handler which logs even debug messages
-    file_handler = RotatingFileHandler('inhalator.log',
+    file_handler = RotatingFileHandler(LOG_FILE,
                                        maxBytes=BYTES_IN_GB,
                                        backupCount=1)
     file_handler.setLevel(level)
@@ -57,9 +72,10 @@ def configure_logging(level):
     formatter = logging.Formatter(
         '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     file_handler.setFormatter(formatter)
-    # add the handlers to the logger
-    logger.addHandler(file_handler)
-    return logger
+    # the file is written off the sampling thread, and repeating messages
+    # are rate limited
+    listener = queue_logging([file_handler])
+    return logger, listener
 
 
 def parse_args():
@@ -69,7 +85,8 @@ def parse_args():
         "simulation", "Options for data simulation")
     sim_options.add_argument("--simulate", "-s", nargs='?', type=str, const='sinus',
                              help="data simulation source. "
-                                  "Can be either `sinus` (default), `dead`, or path to a CSV file.")
+                                  "Can be either `sinus` (default), `dead`, `patient` "
+                                  "(synthetic patient), or path to a CSV file.")
     sim_options.add_argument(
         "--error", "-e", type=float,
         help="The probability of error in each driver", default=0)
@@ -79,6 +96,12 @@ def parse_args():
              "be played at. Useful for slowing down the simulation to see what "
              "is going on, or speeding up to run simulation faster",
         type=float, default=22)
+    sim_options.add_argument(
+        "--start", type=parse_time,
+        help="Replay the recording from this time, e.g. 2020-05-01T10:30")
+    sim_options.add_argument(
+        "--end", type=parse_time,
+        help="Replay the recording up to this time")
     parser.add_argument(
         "--fps", "-f",
         help="Frames-per-second for the application to render",
@@ -88,7 +111,8 @@ def parse_args():
                              "give path to output csv file")
     parser.add_argument(
         "--record-sensors", "-d",
-        help="Whether to save the sensor values to a CSV file (inhalator.csv)",
+        help="Whether to save the sensor values to a recording file "
+             "(inhalator.rec)",
         type=int, choices=[0, 1])
     args = parser.parse_args()
     args.verbose = max(0, logging.WARNING - (10 * args.verbose))
@@ -103,9 +127,19 @@ def handle_sigterm(signum, frame):
 
 
 def start_app(args):
-    log = configure_logging(args.verbose)
-    events = Events()
+    log, log_listener = configure_logging(args.verbose)
+    # Notify the alerts' subscribers (GPIO, buzzer) off the sampling path
+    event_bus = EventBus()
+    event_bus.start()
+    events = Events(event_bus)
     cm = ConfigurationManager.initialize(events)
+    # Save the configuration off the sampling and GUI threads
+    cm.writer.start()
+    watcher = None
+    if cm.config.hot_reload:
+        # Apply edits of the configuration file without a restart
+        watcher = ConfigWatcher(cm)
+        watcher.start()
     signal.signal(signal.SIGTERM, handle_sigterm)
     measurements = Measurements(args.sample_rate if args.simulate else Application.HARDWARE_SAMPLE_RATE)
     arm_wd_event = Event()
@@ -123,11 +157,15 @@ def start_app(args):
         log.info("Error probability: %s", args.error)
 
     drivers = None
+    sampler = None
     app = None
+    alert_handler = None
     try:
         drivers = DriverFactory(simulation_mode=simulation,
                                 simulation_data=args.simulate,
-                                error_probability=args.error)
+                                error_probability=args.error,
+                                simulation_start=args.start,
+                                simulation_end=args.end)
 
         # Must initialize mux before pressure and flow drivers! do not reorder
         try:
@@ -153,6 +191,13 @@ def start_app(args):
             a2d = drivers.null
 
         timer = drivers.timer
+        # Stamp every alert by the samples' clock
+        events.alerts_queue.clock = timer.get_current_time
+        if cm.config.alarms.record_history:
+            # Journal the alarms off the sampling path
+            journal = HistoryWriter(AlarmHistory(ALARMS_FILE))
+            journal.start()
+            events.alerts_queue.journal = journal
 
         try:
             rtc = drivers.rtc
@@ -172,11 +217,16 @@ def start_app(args):
                for driver in (pressure_sensor, flow_sensor, watchdog, a2d, rtc)):
             alert_driver.set_system_fault_alert(value=False, mute=False)
 
-        AlertPeripheralHandler(events, drivers).subscribe()
+        alert_handler = AlertPeripheralHandler(events, drivers)
+        alert_handler.subscribe()
         telemetry_sender = TelemetrySender(
             enable=cm.config.telemetry.enable,
             url=cm.config.telemetry.url,
             api_key=cm.config.telemetry.api_key)
+        acquisition_rate = None
+        if cm.config.acquisition.high_rate:
+            acquisition_rate = cm.config.acquisition.sample_rate
+
         sampler = Sampler(
             measurements=measurements,
             events=events,
@@ -185,7 +235,8 @@ def start_app(args):
             a2d=a2d,
             timer=timer,
             save_sensor_values=record_sensors,
-            telemetry_sender=telemetry_sender)
+            telemetry_sender=telemetry_sender,
+            acquisition_rate=acquisition_rate)
 
         app = Application(
             measurements=measurements,
@@ -201,15 +252,64 @@ def start_app(args):
         watchdog_task = WdTask(watchdog, arm_wd_event)
         watchdog_task.start()
         telemetry_sender.start()
+        if sampler.acquisition is not None:
+            sampler.acquisition.start()
+        if sampler.storage_handler is not None:
+            sampler.storage_handler.writer.start()
+            if sampler.storage_handler.compressor is not None:
+                sampler.storage_handler.compressor.start()
+        if sampler.archive_compactor is not None:
+            sampler.archive_compactor.start()
+        if sampler.calibration_worker is not None:
+            sampler.calibration_worker.start()
 
         app.run()
     finally:
+        if (sampler is not None and sampler.acquisition is not None and
+                sampler.acquisition.is_alive()):
+            # Stop reading the sensors before closing their drivers
+            sampler.acquisition.stop()
+            sampler.acquisition.join()
+
+        if sampler is not None and sampler.calibration_worker is not None:
+            if sampler.calibration_worker.is_alive():
+                sampler.calibration_worker.stop()
+                sampler.calibration_worker.join()
+
+        if sampler is not None and sampler.archive_compactor is not None:
+            if sampler.archive_compactor.is_alive():
+                sampler.archive_compactor.stop()
+                sampler.archive_compactor.join()
+            sampler.archive_compactor.close()
+
+        if sampler is not None and sampler.storage_handler is not None:
+            sampler.storage_handler.close()
+
+        if watcher is not None:
+            watcher.stop()
+            watcher.join()
+
+        # Write a pending configuration save
+        cm.writer.stop()
+        cm.writer.join()
+
+        events.alerts_queue.close()
+
+        # Deliver the pending notifications before closing the drivers
+        event_bus.stop()
+        event_bus.join()
+        if alert_handler is not None and len(alert_handler.latency):
+            log.info("Alarm latency percentiles (seconds): %s",
+                     alert_handler.latency.percentiles())
+
         if drivers is not None:
             drivers.close_all_drivers()
 
         if app is not None:
             app.root.destroy()
 
+        log_listener.stop()
+
 
 def main():
     args = parse_args()
@@ -10,6 +10,8 @@ from data.events import Events
 from data.measurements import Measurements
 from drivers.mocks.sensor import DifferentialPressureMockSensor
 from logic.auto_calibration import TailDetector
+from sample_storage import (is_recording, read_recording, read_between,
+                            parse_time)
 
 TIMESTAMP_COLUMN = "time elapsed (seconds)"
 FLOW_COLUMN = "flow"
@@ -23,8 +25,23 @@ CONVERTERS = {
 }
 
 
-def plot_file(file_path, start=0, end=-1):
-    df = pd.read_csv(file_path, converters=CONVERTERS)[start:end]
+def read_samples(file_path, start_time=None, end_time=None):
+    """Read a CSV file, or a sensor recording - compressed or not.
+
+    Of a recording, only the samples between the given unix times are read.
+    """
+    if not is_recording(file_path):
+        return pd.read_csv(file_path, converters=CONVERTERS)
+
+    if start_time is None and end_time is None:
+        _, records = read_recording(file_path)
+    else:
+        _, records = read_between(file_path, start_time, end_time)
+    return pd.DataFrame({name: records[name] for name in CONVERTERS})
+
+
+def plot_file(file_path, start=0, end=-1, start_time=None, end_time=None):
+    df = read_samples(file_path, start_time, end_time)[start:end]
     measurements = Measurements(seconds_in_graph=12)
     events = Events()
     ConfigurationManager.initialize(events)
@@ -141,16 +158,24 @@ def save_volumes_to_csv(vsm):
 
 def parse_arguments():
     parser = argparse.ArgumentParser()
-    parser.add_argument("csv_path", help="The path to the CSV file")
+    parser.add_argument(
+        "csv_path", help="The path to the CSV file or sensor recording")
     parser.add_argument(
         "start_line", default=0, type=int, nargs="?",
         help="Start from this line (not including CSV header)")
     parser.add_argument(
         "end_line", default=-1, type=int, nargs="?",
         help="Read up to this line (not including CSV header)")
+    parser.add_argument(
+        "--from", dest="start_time", type=parse_time,
+        help="Read a recording from this time, e.g. 2020-05-01T10:30")
+    parser.add_argument(
+        "--to", dest="end_time", type=parse_time,
+        help="Read a recording up to this time")
     return parser.parse_args()
 
 
 if __name__ == '__main__':
     args = parse_arguments()
-    plot_file(file_path=args.csv_path, start=args.start_line, end=args.end_line)
+    plot_file(file_path=args.csv_path, start=args.start_line, end=args.end_line,
+              start_time=args.start_time, end_time=args.end_time)
@@ -0,0 +1,300 @@
+"""Long term, downsampled archive of the sensor recordings.
+
+Full rate samples are kept only for the recent `full_rate_hours`. Rotated
+segments are compacted in the background into two archives, and once they
+expire, only the archives are left of them:
+
+    <name>.breaths - a record per breath, of the values the state machine
+                     computed for it (PIP, PEEP, volumes and BPM), taken as
+                     the next breath's inhale starts.
+    <name>.trend   - a record per second, of the minimum and maximum of
+                     each waveform.
+
+Both are in the recordings' format, so `read_recording` and `read_between`
+read them. Each archive is rotated once it reaches a quarter of the disk
+budget, keeping a single older file, so together they stay within it.
+"""
+import os
+import time
+import logging
+from threading import Thread, Event
+
+import numpy as np
+
+from sample_storage import (iter_between, read_header, read_index,
+                            write_header, columns, throttle,
+                            RecordingFormatError, COMPRESSED_SUFFIX,
+                            TIME_COLUMN, NO_STATE)
+
+BYTES_IN_MB = 2 ** 20
+
+BREATH_COLUMNS = ['pip', 'peep', 'tv_insp', 'tv_exp', 'bpm']
+# The state column's value of `VentilationState.Inhale`, which starts a breath
+INHALE_STATE = 1
+WAVEFORM_COLUMNS = ['flow', 'pressure', 'oxygen']
+
+BREATH_DTYPE = np.dtype([(TIME_COLUMN, '<f8')] +
+                        [(name, '<f8') for name in BREATH_COLUMNS])
+TREND_DTYPE = np.dtype([(TIME_COLUMN, '<f8')] +
+                       [(f"{name}_{stat}", '<f8')
+                        for name in WAVEFORM_COLUMNS
+                        for stat in ("min", "max")])
+
+
+def breath_records(records, previous=None):
+    """Summarize samples into a record per breath.
+
+    A breath is recorded where the state enters inhale. The state machine's
+    values are updated at different states of a breath (PIP as the inhale
+    ends, PEEP as the exhale ends), so they're all of the breath before
+    only once the next one starts.
+
+    :param previous: The state of the sample before `records`, or None.
+    :return: The breath records, and the state of the last sample.
+    """
+    states = records["state"]
+    before = np.r_[NO_STATE if previous is None else previous, states[:-1]]
+    starts = (states == INHALE_STATE) & (before != INHALE_STATE)
+
+    breaths = np.empty(np.count_nonzero(starts), dtype=BREATH_DTYPE)
+    breaths[TIME_COLUMN] = records[TIME_COLUMN][starts]
+    for name in BREATH_COLUMNS:
+        breaths[name] = records[name][starts]
+
+    return breaths, states[-1]
+
+
+def trend_records(records):
+    """Summarize samples into the minimum and maximum of each second."""
+    seconds = np.floor(records[TIME_COLUMN] / 1000)
+    starts = np.flatnonzero(np.r_[True, seconds[1:] != seconds[:-1]])
+
+    trend = np.empty(len(starts), dtype=TREND_DTYPE)
+    trend[TIME_COLUMN] = seconds[starts] * 1000
+    for name in WAVEFORM_COLUMNS:
+        trend[f"{name}_min"] = np.minimum.reduceat(records[name], starts)
+        trend[f"{name}_max"] = np.maximum.reduceat(records[name], starts)
+
+    return trend
+
+
+class ArchiveFile(object):
+    """A segment which records are appended to, rotated at `max_size`."""
+
+    def __init__(self, path, dtype, max_size):
+        self.path = path
+        self.dtype = dtype
+        self.max_size = max_size
+        self._file = self._open()
+
+    def _open(self):
+        if os.path.exists(self.path) and os.stat(self.path).st_size:
+            offset = self._offset(self.path)
+            if offset is not None:
+                f = open(self.path, "r+b")
+                # Drop any partial record, left by a crash mid-write
+                records = (os.stat(self.path).st_size -
+                           offset) // self.dtype.itemsize
+                f.truncate(offset + records * self.dtype.itemsize)
+                f.seek(0, os.SEEK_END)
+                return f
+
+            os.replace(self.path, self.path + ".1")
+
+        f = open(self.path, "wb")
+        write_header(f, self.dtype)
+        f.flush()
+        return f
+
+    def _offset(self, path):
+        """:return: The offset of the records, if `path` holds ours."""
+        try:
+            header, offset = read_header(path)
+        except (FileNotFoundError, RecordingFormatError):
+            return None
+
+        if header["columns"] != columns(self.dtype):
+            return None
+        return offset
+
+    def last(self):
+        """:return: The last archived record, or None if there are none."""
+        for path in (self.path, self.path + ".1"):
+            offset = self._offset(path)
+            if offset is None:
+                continue
+
+            records = (os.stat(path).st_size - offset) // self.dtype.itemsize
+            if records:
+                with open(path, "rb") as f:
+                    f.seek(offset + (records - 1) * self.dtype.itemsize)
+                    return np.frombuffer(f.read(self.dtype.itemsize),
+                                         dtype=self.dtype)[0]
+
+        return None
+
+    def append(self, records):
+        self._file.write(records.tobytes())
+        self._file.flush()
+        if self._file.tell() >= self.max_size:
+            os.fsync(self._file.fileno())
+            self._file.close()
+            os.replace(self.path, self.path + ".1")
+            self._file = self._open()
+
+    def close(self):
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+
+def _segment_end(path):
+    """:return: The time of the last record of a segment, None if empty."""
+    if not path.endswith(COMPRESSED_SUFFIX):
+        header, offset = read_header(path)
+        dtype = np.dtype([(name, dtype) for name, dtype in header["columns"]])
+        records = (os.stat(path).st_size - offset) // dtype.itemsize
+        if records == 0:
+            return None
+
+        with open(path, "rb") as f:
+            f.seek(offset + (records - 1) * dtype.itemsize)
+            last = np.frombuffer(f.read(dtype.itemsize), dtype=dtype)
+        return last[0][TIME_COLUMN]
+
+    index = read_index(path)
+    start = index[TIME_COLUMN][-1] / 1000 if len(index) else None
+    end = None
+    for chunk in iter_between(path, start)[1]:
+        end = chunk[TIME_COLUMN][-1]
+    return end
+
+
+class ArchiveCompactor(Thread):
+    """Compact the rotated segments into the archive, and remove them once
+    they are older than `full_rate_hours`.
+
+    The compaction is limited to `cpu_budget` of a CPU core, like the
+    compression of the segments.
+    """
+    CHUNK_RECORDS = 16 * 1024
+
+    def __init__(self, storage, full_rate_hours=24,
+                 max_size=256 * BYTES_IN_MB, cpu_budget=0.25, interval=60):
+        """
+        :param storage: The `SamplesStorage` of the segments to archive.
+        :param max_size: The disk budget of the archive, in bytes.
+        :param interval: Seconds between the compactions.
+        """
+        super(ArchiveCompactor, self).__init__()
+        self.daemon = True
+        self.storage = storage
+        self.full_rate_hours = full_rate_hours
+        self.cpu_budget = cpu_budget
+        self.interval = interval
+        self.wake = Event()
+        self.should_run = True
+        self.log = logging.getLogger(self.__class__.__name__)
+
+        name = os.path.splitext(storage.file_name)[0]
+        self.breaths = ArchiveFile(name + ".breaths", BREATH_DTYPE,
+                                   max_size // 4)
+        self.trend = ArchiveFile(name + ".trend", TREND_DTYPE, max_size // 4)
+
+        # Samples recorded before this unix time (milliseconds) are archived
+        self.archived_until = -np.inf
+        last_second = self.trend.last()
+        if last_second is not None:
+            self.archived_until = last_second[TIME_COLUMN] + 1000
+
+        self._state = None  # Of the last archived sample
+
+    def stop(self):
+        self.should_run = False
+        self.wake.set()
+
+    def close(self):
+        self.breaths.close()
+        self.trend.close()
+
+    def _append(self, records):
+        if len(records) == 0:
+            return
+
+        breaths, self._state = breath_records(records, self._state)
+        self.breaths.append(breaths)
+        trend = trend_records(records)
+        self.trend.append(trend)
+        self.archived_until = trend[TIME_COLUMN][-1] + 1000
+
+    def archive(self, segments):
+        """Archive the samples of the segments which aren't yet.
+
+        The samples of a second are archived together, so the last second is
+        held back until the following chunk, or the end of the segments.
+
+        :param segments: The segments to archive, oldest first.
+        """
+        held = None
+        for segment in segments:
+            try:
+                _, chunks = iter_between(segment, self.archived_until / 1000,
+                                         chunk_records=self.CHUNK_RECORDS)
+                for chunk in chunks:
+                    if not self.should_run:
+                        return
+
+                    start = time.perf_counter()
+                    chunk = chunk[chunk[TIME_COLUMN] >= self.archived_until]
+                    if held is not None:
+                        chunk = np.concatenate([held, chunk])
+                    if len(chunk) == 0:
+                        continue
+
+                    seconds = np.floor(chunk[TIME_COLUMN] / 1000)
+                    complete = seconds < seconds[-1]
+                    held = chunk[~complete]
+                    self._append(chunk[complete])
+                    throttle(time.perf_counter() - start, self.cpu_budget)
+
+            except FileNotFoundError:
+                # Compressed meanwhile. Don't skip it, but continue next time
+                return
+            except RecordingFormatError:
+                continue  # Not a recording, e.g. an old CSV file
+
+        if held is not None:
+            self._append(held)
+
+    def compact(self):
+        """Archive the rotated segments, and remove the expired ones."""
+        segments = self.storage.rotated_segments()
+        self.archive(segments)
+
+        expiry = (time.time() - self.full_rate_hours * 60 * 60) * 1000
+        for segment in segments:
+            if not self.should_run:
+                return
+
+            try:
+                inode = os.stat(segment).st_ino
+                end = _segment_end(segment)
+            except FileNotFoundError:
+                continue  # Compressed or rotated out meanwhile
+            except RecordingFormatError:
+                continue  # Not a recording, e.g. an old CSV file
+
+            expired = end is None or (end < expiry and
+                                      end < self.archived_until)
+            if expired and self.storage.remove_segment(segment, inode):
+                self.log.info("Removed %s, which is archived", segment)
+
+    def run(self):
+        while self.should_run:
+            # noinspection PyBroadException
+            try:
+                self.compact()
+            except Exception:
+                self.log.exception("Failed compacting the recordings")
+
+            self.wake.wait(self.interval)
+            self.wake.clear()
@@ -1,12 +1,90 @@
+"""Recording of the sensor samples.
+
+Samples are stored as fixed size binary records, in numpy's memory layout.
+They are collected into blocks on the sampling thread, and written to disk
+by a background thread, so a slow disk never stalls the sampling.
+Each recording file (segment) starts with a header, describing its columns
+and the configuration it was recorded with:
+
+    8 bytes  - magic and format version
+    4 bytes  - header length, little endian
+    N bytes  - JSON header
+    records  - back to back, `record_size` bytes each
+
+Once rotated, segments are gzip compressed by another background thread,
+which is limited to a share of a CPU core. A compressed segment is a series
+of gzip members - the first holds the header, and each of the others holds
+a chunk of whole records - so it decompresses to the original segment, and
+the readers stream it chunk by chunk.
+
+Next to each segment is a sparse time index (`<segment>.idx`) - an entry
+every ~1000 records, of the record's unix time, its number, and the offset
+to start reading from. The offset is of the record in a plain segment, or
+of its gzip member in a compressed one. The index lets `read_between` seek
+straight to a time window, instead of reading the segment from its start.
+
+Convert recordings to the CSV layout the tools expect:
+    python -m sample_storage inhalator.rec.1.gz inhalator.rec -o inhalator.csv
+"""
 import os
-import datetime
+import csv
+import gzip
+import json
+import time
+import struct
 import logging
-from logging.handlers import RotatingFileHandler
+import argparse
+import datetime
+from enum import Enum
+from collections import deque
+from threading import Thread, Event, Lock
+
+import numpy as np
+
+from data.configurations import FsyncPolicy
 
 BYTES_IN_GB = 2 ** 30
 
+MAGIC = b"INHREC\x00\x01"
+HEADER_PREFIX = struct.Struct("<8sI")
+
+RECORD_DTYPE = np.dtype([
+    ('unix_time (milliseconds)', '<f8'),
+    ('time elapsed (seconds)', '<f8'),
+    ('flow', '<f8'),
+    ('pressure', '<f8'),
+    ('oxygen', '<f8'),
+    ('pip', '<f8'),
+    ('peep', '<f8'),
+    ('tv_insp', '<f8'),
+    ('tv_exp', '<f8'),
+    ('bpm', '<f8'),
+    ('state', '<i4'),
+    ('tv_insp_displayed', '<f8'),
+    ('tv_exp_displayed', '<f8'),
+])
+
+NO_STATE = -1
+
+COMPRESSED_SUFFIX = ".gz"
+INDEX_SUFFIX = ".idx"
+SEGMENT_SUFFIXES = ("", INDEX_SUFFIX,
+                    COMPRESSED_SUFFIX, COMPRESSED_SUFFIX + INDEX_SUFFIX)
+
+TIME_COLUMN = 'unix_time (milliseconds)'
+INDEX_DTYPE = np.dtype([
+    (TIME_COLUMN, '<f8'),
+    ('record', '<u8'),
+    ('offset', '<u8'),
+])
+
+
+class RecordingFormatError(Exception):
+    pass
+
 
 class SamplesStorage:
+    # The layout of the CSV files, which recordings are converted to
     COLUMNS = ['timestamp',
                'unix_time (milliseconds)',
                'time elapsed (seconds)',
@@ -22,40 +100,678 @@ class SamplesStorage:
                'tv_insp_displayed',
                'tv_exp_displayed']
 
-    def __init__(self, file_name_template='inhalator.csv',
-                 max_file_size=BYTES_IN_GB, max_files=3):  # 3GB can store more than 2 weeks of data.
+    # Records are written to disk in blocks. At ~30Hz a block holds about 8
+    # seconds of samples.
+    BLOCK_RECORDS = 256
+    # Records between the entries of the time index
+    INDEX_INTERVAL_RECORDS = 1024
+
+    def __init__(self, file_name_template='inhalator.rec',
+                 max_file_size=BYTES_IN_GB, max_files=3,  # 3GB can store more than 2 weeks of data.
+                 metadata=None, states=None, flush_interval=2,
+                 fsync_policy=FsyncPolicy.Periodic, fsync_interval=60,
+                 max_pending_blocks=32, compress_segments=True,
+                 compression_level=6, compression_cpu_budget=0.25):
+        """
+        :param metadata: JSON serializable information to store in the
+            header of each segment, e.g. the configuration.
+        :param states: Enum of the state column's values, so the converter
+            can name them.
+        :param flush_interval: Seconds between the background writes.
+        :param fsync_interval: Seconds between fsyncs, in periodic policy.
+        :param max_pending_blocks: Full blocks to hold while the disk is
+            slow. When all of them are full, new samples are dropped.
+        :param compress_segments: Whether to compress the rotated segments.
+        :param compression_cpu_budget: The share of a CPU core the
+            compression may use.
+        """
+        self.log = logging.getLogger(self.__class__.__name__)
         self.max_files = max_files
         self.max_file_size = max_file_size
         self.file_name = file_name_template
+        self.metadata = metadata or {}
+        self.state_names = {}
+        if states is not None:
+            self.state_names = {str(state.value): str(state)
+                                for state in states}
+        self.fsync_policy = FsyncPolicy(fsync_policy)
+        self.fsync_interval = fsync_interval
+        self.max_pending_blocks = max_pending_blocks
         self.first_ts = None
-        self.logger = self._configure_logger()
-        # Write title row
-        self._write_headers_file()
-
-    def _write_headers_file(self):
-        if not os.stat(self.file_name).st_size:
-            self._write_row(self.COLUMNS)
-
-    def _configure_logger(self):
-        logger = logging.getLogger('samples_storage')
-        logger.setLevel(logging.DEBUG)
-        file_handler = RotatingFileHandler(self.file_name,
-                                           maxBytes=self.max_file_size,
-                                           backupCount=self.max_files)
-        file_handler.setLevel(logging.DEBUG)
-        logger.addHandler(file_handler)
-        return logger
-
-    def _write_row(self, row):
-        self.logger.debug(','.join(str(item) for item in row))
+        self.dropped_rows = 0
+        self._last_fsync = time.monotonic()
+
+        # The sampling thread fills `_block`, and queues it once full. The
+        # writer takes the queued blocks and returns them to the free pool
+        # once written, so no memory is allocated while recording.
+        self._free_blocks = [np.zeros(self.BLOCK_RECORDS, dtype=RECORD_DTYPE)
+                             for _ in range(max_pending_blocks + 1)]
+        self._pending = deque()
+        self._block = None
+        self._count = 0
+        self._lock = Lock()  # Guards the blocks. Never held during I/O.
+        self._write_lock = Lock()  # Guards the file.
+        self._rotation_lock = Lock()  # Guards the names of the segments.
+        self.writer = StorageWriter(self, flush_interval)
+        self.compressor = None
+        if compress_segments:
+            self.compressor = SegmentCompressor(
+                self, compression_level, compression_cpu_budget)
+        self._offset = None  # Of the records, in the current segment
+        self._next_indexed_record = 0
+        self._index = None
+        self._file = self._open()
+
+    def _open(self):
+        """Open the current segment, starting a new one if needed."""
+        if os.path.exists(self.file_name) and os.stat(self.file_name).st_size:
+            try:
+                header, offset = read_header(self.file_name)
+            except RecordingFormatError:
+                header, offset = None, None
+
+            if header is not None and \
+                    header["columns"] == columns(RECORD_DTYPE):
+                f = open(self.file_name, "r+b")
+                # Drop any partial record, left by a crash mid-write
+                records = (os.stat(self.file_name).st_size -
+                           offset) // RECORD_DTYPE.itemsize
+                f.truncate(offset + records * RECORD_DTYPE.itemsize)
+                f.seek(0, os.SEEK_END)
+                self._open_index(offset, records)
+                return f
+
+            self.log.info("%s has a different format, starting a new "
+                          "segment", self.file_name)
+            self._rotate_files()
+
+        f = open(self.file_name, "wb")
+        write_header(f, RECORD_DTYPE, self.state_names, self.metadata)
+        f.flush()
+        self._open_index(f.tell(), 0)
+        return f
+
+    def _open_index(self, offset, records):
+        """Open the index of the current segment, for appending.
+
+        Entries of records which were lost in a crash are dropped, since
+        new records take their place.
+        """
+        path = self.file_name + INDEX_SUFFIX
+        entries = read_index(self.file_name) if records else \
+            np.empty(0, dtype=INDEX_DTYPE)
+        entries = entries[entries["record"] < records]
+        with open(path + ".tmp", "wb") as f:
+            f.write(entries.tobytes())
+        os.replace(path + ".tmp", path)
+
+        self._index = open(path, "ab")
+        self._offset = offset
+        # Index the first new block, as the last records might not be
+        self._next_indexed_record = records
+
+    def segment(self, index):
+        """:return: The name of the `index` rotated segment, uncompressed."""
+        return f"{self.file_name}.{index}"
+
+    def rotated_segments(self):
+        """:return: The existing rotated segments, oldest first."""
+        segments = []
+        for i in range(self.max_files, 0, -1):
+            for suffix in ("", COMPRESSED_SUFFIX):
+                if os.path.exists(self.segment(i) + suffix):
+                    segments.append(self.segment(i) + suffix)
+        return segments
+
+    def _rotate_files(self):
+        with self._rotation_lock:
+            for suffix in SEGMENT_SUFFIXES:
+                oldest = self.segment(self.max_files) + suffix
+                if self.max_files > 0 and os.path.exists(oldest):
+                    os.remove(oldest)
+
+            for i in range(self.max_files - 1, 0, -1):
+                for suffix in SEGMENT_SUFFIXES:
+                    source = self.segment(i) + suffix
+                    if os.path.exists(source):
+                        os.replace(source, self.segment(i + 1) + suffix)
+
+            for suffix in ("", INDEX_SUFFIX):
+                if not os.path.exists(self.file_name + suffix):
+                    continue
+                if self.max_files > 0:
+                    os.replace(self.file_name + suffix,
+                               self.segment(1) + suffix)
+                else:
+                    os.remove(self.file_name + suffix)
+
+        if self.compressor is not None:
+            self.compressor.wake.set()
+
+    def replace_segment(self, path, inode, compressed_path, index_path):
+        """Replace a segment and its index with their compressed copies.
+
+        The segment might have been rotated while it was compressed, in which
+        case the copy is dropped, and compressed again under the new name.
+
+        :param inode: The inode of the segment which was compressed.
+        :return: Whether the segment was replaced.
+        """
+        with self._rotation_lock:
+            try:
+                replace = os.stat(path).st_ino == inode
+            except FileNotFoundError:
+                replace = False
+
+            if replace:
+                os.replace(index_path,
+                           path + COMPRESSED_SUFFIX + INDEX_SUFFIX)
+                os.replace(compressed_path, path + COMPRESSED_SUFFIX)
+                os.remove(path)
+                if os.path.exists(path + INDEX_SUFFIX):
+                    os.remove(path + INDEX_SUFFIX)
+            else:
+                os.remove(index_path)
+                os.remove(compressed_path)
+
+        return replace
+
+    def remove_segment(self, path, inode):
+        """Remove a rotated segment and its index.
+
+        :param inode: The inode of the segment to remove, so a segment which
+            was rotated into its name meanwhile isn't removed instead.
+        :return: Whether the segment was removed.
+        """
+        with self._rotation_lock:
+            try:
+                remove = os.stat(path).st_ino == inode
+            except FileNotFoundError:
+                remove = False
+
+            if remove:
+                os.remove(path)
+                if os.path.exists(path + INDEX_SUFFIX):
+                    os.remove(path + INDEX_SUFFIX)
+
+        return remove
+
+    def _rotate(self):
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._index.close()
+        self._rotate_files()
+        self._file = self._open()
 
     def _time_diff(self, timestamp):
         if self.first_ts is None:
             self.first_ts = timestamp
-        return (timestamp - self.first_ts).total_seconds()
+        return timestamp - self.first_ts
 
     def write(self, flow, pressure, oxygen, pip=None, peep=None, tv_insp=None, tv_exp=None, bpm=None, state=None, tv_insp_displayed=None, tv_exp_displayed=None):
-        timestamp = datetime.datetime.now()
-        unix_time = timestamp.timestamp() * 1000
-        time_diff = self._time_diff(timestamp)
-        self._write_row([timestamp, unix_time, time_diff, flow, pressure, oxygen, pip, peep, tv_insp, tv_exp, bpm, state, tv_insp_displayed, tv_exp_displayed])
+        timestamp = time.time()
+        if isinstance(state, Enum):
+            state = state.value
+        with self._lock:
+            if self._block is None:
+                if not self._free_blocks:
+                    if self.dropped_rows == 0:
+                        self.log.warning("Recording can't keep up with the "
+                                         "samples. Dropping samples")
+                    self.dropped_rows += 1
+                    return
+
+                self._block = self._free_blocks.pop()
+                self._count = 0
+
+            self._block[self._count] = (
+                timestamp * 1000, self._time_diff(timestamp), flow, pressure,
+                oxygen, _nan(pip), _nan(peep), _nan(tv_insp), _nan(tv_exp),
+                _nan(bpm), NO_STATE if state is None else state,
+                _nan(tv_insp_displayed), _nan(tv_exp_displayed))
+            self._count += 1
+            if self._count == self.BLOCK_RECORDS:
+                self._pending.append((self._block, self._count))
+                self._block = None
+                pending = len(self._pending)
+
+            else:
+                pending = 0
+
+        if pending * 2 >= self.max_pending_blocks:
+            # Don't wait for the flush interval when running low on blocks
+            self.writer.wake.set()
+
+    def flush(self):
+        """Write all of the recorded samples to the file."""
+        with self._write_lock:
+            with self._lock:
+                blocks = list(self._pending)
+                self._pending.clear()
+                if self._block is not None and self._count:
+                    blocks.append((self._block, self._count))
+                    self._block = None
+
+            if not blocks:
+                return
+
+            try:
+                for block, count in blocks:
+                    self._add_to_index(block[0][TIME_COLUMN])
+                    self._file.write(block[:count].tobytes())
+                    if self._file.tell() >= self.max_file_size:
+                        self._rotate()
+
+                self._file.flush()
+                self._index.flush()
+                self._sync()
+
+            finally:
+                with self._lock:
+                    self._free_blocks.extend(block for block, _ in blocks)
+
+    def _add_to_index(self, timestamp):
+        """Index the next record, if it's the first after the interval."""
+        offset = self._file.tell()
+        record = (offset - self._offset) // RECORD_DTYPE.itemsize
+        if record >= self._next_indexed_record:
+            entry = np.array([(timestamp, record, offset)], dtype=INDEX_DTYPE)
+            self._index.write(entry.tobytes())
+            self._next_indexed_record = \
+                record + self.INDEX_INTERVAL_RECORDS
+
+    def _sync(self):
+        now = time.monotonic()
+        if (self.fsync_policy == FsyncPolicy.Always or
+                (self.fsync_policy == FsyncPolicy.Periodic and
+                 now - self._last_fsync >= self.fsync_interval)):
+            os.fsync(self._file.fileno())
+            self._last_fsync = now
+
+    def close(self):
+        for thread in (self.writer, self.compressor):
+            if thread is not None and thread.is_alive():
+                thread.stop()
+                thread.join()
+
+        self.flush()
+        with self._write_lock:
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._index.close()
+
+        if self.dropped_rows:
+            self.log.warning("%d samples were dropped from the recording",
+                             self.dropped_rows)
+
+
+class StorageWriter(Thread):
+    """Write the recorded samples to disk every `flush_interval` seconds."""
+
+    def __init__(self, storage, flush_interval):
+        super(StorageWriter, self).__init__()
+        self.daemon = True
+        self.storage = storage
+        self.flush_interval = flush_interval
+        self.wake = Event()
+        self.should_run = True
+        self.log = logging.getLogger(self.__class__.__name__)
+
+    def stop(self):
+        self.should_run = False
+        self.wake.set()
+
+    def run(self):
+        while self.should_run:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            # noinspection PyBroadException
+            try:
+                self.storage.flush()
+            except Exception:
+                self.log.exception("Failed writing the recorded samples")
+
+
+class SegmentCompressor(Thread):
+    """Compress the rotated segments, using a bounded share of the CPU.
+
+    The segments are compressed a chunk at a time, and after each chunk the
+    thread sleeps long enough to keep its duty cycle within `cpu_budget`.
+    """
+    CHUNK_RECORDS = 16 * 1024  # ~1.5MB of records
+    TEMP_SUFFIX = ".tmp"
+
+    def __init__(self, storage, level=6, cpu_budget=0.25):
+        super(SegmentCompressor, self).__init__()
+        self.daemon = True
+        self.storage = storage
+        self.level = level
+        self.cpu_budget = cpu_budget
+        self.wake = Event()
+        self.should_run = True
+        self.log = logging.getLogger(self.__class__.__name__)
+
+    def stop(self):
+        self.should_run = False
+        self.wake.set()
+
+    def _write_member(self, f, data):
+        start = time.perf_counter()
+        f.write(gzip.compress(data, self.level))
+        throttle(time.perf_counter() - start, self.cpu_budget)
+
+    def compress(self, path):
+        """Compress a rotated segment, and replace it with the compressed one.
+
+        Each chunk of records gets an entry in the compressed segment's index.
+
+        :return: Whether the segment was replaced. It isn't if the thread was
+            stopped, or the segment was rotated meanwhile.
+        """
+        compressed_path = path + COMPRESSED_SUFFIX + self.TEMP_SUFFIX
+        index_path = (path + COMPRESSED_SUFFIX + INDEX_SUFFIX +
+                      self.TEMP_SUFFIX)
+        entries = []
+        with open(path, "rb") as source:
+            inode = os.fstat(source.fileno()).st_ino
+            header, offset = _read_header(source, path)
+            dtype = _dtype(header)
+            source.seek(0)
+            with open(compressed_path, "wb") as f:
+                self._write_member(f, source.read(offset))
+                while self.should_run:
+                    chunk = source.read(self.CHUNK_RECORDS * dtype.itemsize)
+                    if len(chunk) < dtype.itemsize:
+                        break
+                    first = np.frombuffer(chunk, dtype=dtype, count=1)
+                    entries.append((first[0][TIME_COLUMN],
+                                    len(entries) * self.CHUNK_RECORDS,
+                                    f.tell()))
+                    self._write_member(f, chunk)
+
+                f.flush()
+                os.fsync(f.fileno())
+
+        with open(index_path, "wb") as f:
+            f.write(np.array(entries, dtype=INDEX_DTYPE).tobytes())
+
+        if not self.should_run:
+            os.remove(index_path)
+            os.remove(compressed_path)
+            return False
+
+        return self.storage.replace_segment(path, inode, compressed_path,
+                                            index_path)
+
+    def run(self):
+        # Leftovers of a compression which was interrupted by a shutdown
+        for i in range(1, self.storage.max_files + 1):
+            for suffix in (COMPRESSED_SUFFIX,
+                           COMPRESSED_SUFFIX + INDEX_SUFFIX):
+                leftover = self.storage.segment(i) + suffix + self.TEMP_SUFFIX
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+        while self.should_run:
+            self.wake.clear()
+            segments = [segment for segment
+                        in self.storage.rotated_segments()
+                        if not segment.endswith(COMPRESSED_SUFFIX)]
+            for segment in segments:
+                if not self.should_run:
+                    break
+                # noinspection PyBroadException
+                try:
+                    if self.compress(segment):
+                        self.log.info("Compressed %s", segment)
+                except RecordingFormatError:
+                    pass  # Not a recording, e.g. an old CSV file
+                except Exception:
+                    self.log.exception("Failed compressing %s", segment)
+
+            self.wake.wait()
+
+
+def throttle(busy_seconds, cpu_budget):
+    """Sleep long enough to keep a duty cycle within `cpu_budget`."""
+    if cpu_budget < 1:
+        time.sleep(busy_seconds * (1 - cpu_budget) / cpu_budget)
+
+
+def _nan(value):
+    return np.nan if value is None else value
+
+
+def columns(dtype):
+    """:return: The columns of records of `dtype`, as listed in headers."""
+    return [[name, dtype[name].str] for name in dtype.names]
+
+
+def write_header(f, dtype, states=None, metadata=None):
+    """Write the header of a new segment, of records of `dtype`."""
+    header = json.dumps({"columns": columns(dtype),
+                         "record_size": dtype.itemsize,
+                         "created": time.time(),
+                         "states": states or {},
+                         "metadata": metadata or {}}).encode()
+    f.write(HEADER_PREFIX.pack(MAGIC, len(header)))
+    f.write(header)
+
+
+def open_segment(path):
+    """Open a segment for reading, decompressing it if compressed."""
+    path = str(path)
+    if path.endswith(COMPRESSED_SUFFIX):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def is_recording(path):
+    try:
+        with open_segment(path) as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:  # Not gzip compressed after all
+        return False
+
+
+def _read_header(f, path):
+    prefix = f.read(HEADER_PREFIX.size)
+    if len(prefix) < HEADER_PREFIX.size:
+        raise RecordingFormatError(f"{path} is too short")
+
+    magic, length = HEADER_PREFIX.unpack(prefix)
+    if magic != MAGIC:
+        raise RecordingFormatError(f"{path} is not a recording")
+
+    try:
+        header = json.loads(f.read(length).decode())
+    except ValueError as e:
+        raise RecordingFormatError(f"{path} has a corrupted header") from e
+
+    return header, HEADER_PREFIX.size + length
+
+
+def _dtype(header):
+    return np.dtype([(name, dtype) for name, dtype in header["columns"]])
+
+
+def read_header(path):
+    """:return: The header of a segment, and the offset of its records."""
+    with open_segment(path) as f:
+        return _read_header(f, path)
+
+
+def iter_recording(path, chunk_records=64 * 1024):
+    """Stream the records of a segment, compressed or not.
+
+    :return: The segment's header, and an iterator of numpy structured
+        arrays of up to `chunk_records` records each.
+    """
+    header, _ = read_header(path)
+
+    def chunks():
+        with open_segment(path) as f:
+            _read_header(f, path)
+            dtype = _dtype(header)
+            while True:
+                data = f.read(chunk_records * dtype.itemsize)
+                records = len(data) // dtype.itemsize
+                if records == 0:
+                    break
+                yield np.frombuffer(data, dtype=dtype, count=records)
+
+    return header, chunks()
+
+
+def read_recording(path):
+    """Read the records of a segment.
+
+    Uncompressed segments are memory mapped, and compressed ones are
+    decompressed into memory.
+
+    :return: The segment's header, and a numpy structured array of its
+        records, with a field per column.
+    """
+    path = str(path)
+    if path.endswith(COMPRESSED_SUFFIX):
+        header, chunks = iter_recording(path)
+        chunks = list(chunks)
+        if not chunks:
+            return header, np.empty(0, dtype=_dtype(header))
+        return header, np.concatenate(chunks)
+
+    header, offset = read_header(path)
+    dtype = _dtype(header)
+    records = (os.stat(path).st_size - offset) // dtype.itemsize
+    if records == 0:
+        return header, np.empty(0, dtype=dtype)
+
+    return header, np.memmap(path, dtype=dtype, mode="r", offset=offset,
+                             shape=(records,))
+
+
+def read_index(path):
+    """:return: The time index of a segment, empty if it has none."""
+    try:
+        with open(str(path) + INDEX_SUFFIX, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return np.empty(0, dtype=INDEX_DTYPE)
+
+    return np.frombuffer(data, dtype=INDEX_DTYPE,
+                         count=len(data) // INDEX_DTYPE.itemsize)
+
+
+def iter_between(path, start=None, end=None, chunk_records=4096):
+    """Stream the records of a segment, which were recorded between two times.
+
+    The segment is read from the last indexed record before `start`, and
+    only up to `end`. Without an index, it is read from its start.
+
+    :param start: Unix time in seconds, or None to read from the start.
+    :param end: Unix time in seconds, or None to read to the end.
+    :return: The segment's header, and an iterator of numpy structured
+        arrays of the records in the window.
+    """
+    path = str(path)
+    header, _ = read_header(path)
+    dtype = _dtype(header)
+    start_ms = -np.inf if start is None else start * 1000
+    end_ms = np.inf if end is None else end * 1000
+    index = read_index(path)
+    position = np.searchsorted(index[TIME_COLUMN], start_ms, side="right") - 1
+
+    def chunks():
+        with open(path, "rb") as raw:
+            if position >= 0:
+                raw.seek(int(index["offset"][position]))
+                f = raw
+                if path.endswith(COMPRESSED_SUFFIX):
+                    f = gzip.GzipFile(fileobj=raw, mode="rb")
+            else:
+                f = open_segment(path)
+                _read_header(f, path)
+
+            with f:
+                while True:
+                    data = f.read(chunk_records * dtype.itemsize)
+                    records = np.frombuffer(data, dtype=dtype,
+                                            count=len(data) // dtype.itemsize)
+                    if len(records) == 0:
+                        break
+
+                    times = records[TIME_COLUMN]
+                    in_window = (times >= start_ms) & (times <= end_ms)
+                    if in_window.any():
+                        yield records[in_window]
+                    if times[-1] > end_ms:
+                        break
+
+    return header, chunks()
+
+
+def read_between(path, start=None, end=None):
+    """Read the records of a segment, which were recorded between two times.
+
+    See `iter_between`.
+
+    :return: The segment's header, and a numpy structured array of the
+        records in the window.
+    """
+    header, chunks = iter_between(path, start, end)
+    chunks = list(chunks)
+    if not chunks:
+        return header, np.empty(0, dtype=_dtype(header))
+    return header, np.concatenate(chunks)
+
+
+def parse_time(text):
+    """Parse a local ISO date and time, e.g. 2020-05-01T10:30, to unix time.
+
+    For the command line arguments of the time windows.
+    """
+    try:
+        return datetime.datetime.fromisoformat(text).timestamp()
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from e
+
+
+def _csv_value(value):
+    value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+def convert_to_csv(paths, output_path):
+    """Convert recording segments to a single CSV file, in their order."""
+    with open(output_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(SamplesStorage.COLUMNS)
+        for path in paths:
+            header, chunks = iter_recording(path)
+            states = header["states"]
+            for record in (record for chunk in chunks for record in chunk):
+                row = {name: _csv_value(record[name])
+                       for name in record.dtype.names}
+                row["timestamp"] = datetime.datetime.fromtimestamp(
+                    row["unix_time (milliseconds)"] / 1000)
+                state = row["state"]
+                row["state"] = (None if state == NO_STATE
+                                else states.get(str(state), state))
+                writer.writerow([str(row[column])
+                                 for column in SamplesStorage.COLUMNS])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert sensor recordings to CSV")
+    parser.add_argument("recordings", nargs="+",
+                        help="Recording segments, oldest first")
+    parser.add_argument("--output", "-o", default="inhalator.csv")
+    args = parser.parse_args()
+    convert_to_csv(args.recordings, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,19 @@
 """Copy log files from the raspberry to a local CSV file."""
+import os
+import sys
 import csv
 import ftplib
 import io
 import logging
 import argparse
 import re
+import tempfile
 from pathlib import Path
 
+# The script is run from scripts/, next to the project's modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sample_storage import convert_to_csv  # noqa: E402
+
 RPI_IP = '192.168.43.234'
 
 CSV_FILE_OUTPUT = 'inhalator.csv'
@@ -81,14 +88,17 @@ def parse_cli_args():
 
 
 def remote_sensor_data_files(ftp):
-    log_files = ftp.nlst('Inhalator/inhalator.csv*')
+    log_files = ftp.nlst('Inhalator/inhalator.rec*')
+    # Skip the time indices, and segments which are being compressed
+    log_files = [f for f in log_files if not f.endswith(('.tmp', '.idx'))]
     return sorted(log_files, reverse=True)
 
 
 def copy_sensor_data(output_file, ftp, logger):
     """Copy log file from the Raspberry pi using FTP.
 
-    Copying all log files from the remote RPi, and merging them into one file locally.
+    Copying all recording segments from the remote RPi, and converting them
+    into one CSV file locally.
 
     Args:
         output_file (str): the output log file.
@@ -96,13 +106,21 @@ def copy_sensor_data(output_file, ftp, logger):
         user (str): raspberry pi user.
         passwd (str): raspberry pi password.
     """
-    open(output_file, 'w').close()  # create empty file
-    with open(output_file, 'ab') as out_file:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        local_files = []
         log_files = remote_sensor_data_files(ftp)
         amount = len(log_files)
         for i, log_file in enumerate(log_files):
             logger.info("Copying %s / %s", i + 1, amount)
-            ftp.retrbinary(f'RETR {log_file}', out_file.write)
+            local_file = Path(temp_dir) / Path(log_file).name
+            with open(local_file, 'wb') as out_file:
+                ftp.retrbinary(f'RETR {log_file}', out_file.write)
+
+            if local_file.stat().st_size:
+                local_files.append(local_file)
+
+        logger.info("Converting to CSV")
+        convert_to_csv(local_files, output_file)
 
 
 def copy_log(ftp, output_path):
@@ -65,6 +65,14 @@ def hsc_driver():
         yield HscPressureSensor()
 
 
+@pytest.yield_fixture
+def sdp_driver():
+    with patch('drivers.i2c_driver.pigpio.pi') as pigpio_mock, \
+            patch('drivers.sdp8_pressure_sensor.sleep'):
+        from drivers.sdp8_pressure_sensor import SdpPressureSensor
+        yield SdpPressureSensor()
+
+
 @pytest.yield_fixture
 def a2d_driver():
     with patch('spidev.SpiDev') as spidev_mock:
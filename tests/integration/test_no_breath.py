@@ -27,7 +27,7 @@ def test_sinus_alerts_when_no_breath(app, events, data, sim_sampler):
 
     app.run_iterations(1)
     assert len(events.alerts_queue) == 1
-    alert = events.alerts_queue.queue.get()
+    alert = events.alerts_queue.last_alert
     assert alert == alerts.AlertCodes.NO_BREATH
 
 
@@ -9,13 +9,13 @@ import pytest
 from main import start_app
 from tests.data.files import path_to_file
 from tests.utils import SamplesCSVParser
-from drivers.driver_factory import generate_data_from_file
+from sample_storage import read_recording
 
 
 PRESSURE = 1
 FLOW = 2
 
-RECORDED_SAMPLES = "inhalator.csv"
+RECORDED_SAMPLES = "inhalator.rec"
 TIME_ITERATIONS = 500000
 SAMPLES_NAMES = ["pig_sim_extreme_in_exhale_both.csv", 
                  "pig_sim_extreme_in_inhale_below_threshold.csv",
@@ -39,10 +39,10 @@ class ErrorAfter:
         return datetime.timestamp(datetime.now())
 
 
-class InhalatorCSVParser():
+class InhalatorRecordingParser():
     def __init__(self, sensors):
-        self.data = [generate_data_from_file(sensor, RECORDED_SAMPLES)
-                     for sensor in sensors]
+        _, records = read_recording(RECORDED_SAMPLES)
+        self.data = [iter(records[sensor].tolist()) for sensor in sensors]
 
     def samples(self):
         return [next(sensor) for sensor in self.data]
@@ -67,7 +67,7 @@ def test_main_loop_values(time_mock, csv_name):
     start_app(args)
 
     sampler_parser = SamplesCSVParser(path_to_file(csv_name))
-    inhalator_parser = InhalatorCSVParser(["pressure", "flow"])
+    inhalator_parser = InhalatorRecordingParser(["pressure", "flow"])
 
     for _time, pressure, flow, _oxygen in sampler_parser.samples(start=0, end=170):
         recorded_pressure, recorded_flow = inhalator_parser.samples()
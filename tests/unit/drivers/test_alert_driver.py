@@ -0,0 +1,32 @@
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+
+@pytest.fixture
+def gpio(monkeypatch):
+    gpio = MagicMock()
+    gpio.HIGH, gpio.LOW = 1, 0
+    rpi = MagicMock(GPIO=gpio)
+    monkeypatch.setitem(sys.modules, "RPi", rpi)
+    monkeypatch.setitem(sys.modules, "RPi.GPIO", gpio)
+    monkeypatch.delitem(sys.modules, "drivers.alert_driver", raising=False)
+    return gpio
+
+
+def test_pins_are_written_on_change_only(gpio):
+    from drivers.alert_driver import AlertDriver
+    driver = AlertDriver()
+    gpio.output.reset_mock()
+
+    assert driver.set_medical_condition_alert(False, mute=False)
+    for _ in range(4):
+        assert not driver.set_medical_condition_alert(False, mute=False)
+    assert gpio.output.call_count == 2, "The LED and the buzzer, once"
+
+    driver.set_system_fault_alert(False, mute=False)
+    assert gpio.output.call_count == 3, "The buzzer is already on"
+
+    driver.set_buzzer(True)
+    assert gpio.output.call_count == 4
@@ -0,0 +1,182 @@
+import sys
+import time
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+import drivers
+from drivers.emulation.bus import Fault
+from drivers.emulation.board import EmulatedBoard
+from errors import (I2CReadError, FlowSensorCRCError, SensorDiagnosticError,
+                    UnavailableMeasurmentError, SPIIOError)
+
+
+@pytest.fixture
+def board():
+    """Emulated board, with the drivers freshly imported on top of it.
+
+    Everything is restored afterwards, so the other tests keep their own
+    (mocked) pigpio.
+    """
+    board = EmulatedBoard(seed=0)
+    with patch.dict(sys.modules), patch.dict(drivers.__dict__):
+        for name in list(sys.modules):
+            if (name.startswith("drivers.") and
+                    not name.startswith("drivers.emulation")):
+                del sys.modules[name]
+
+        board.install()
+        yield board
+
+
+def test_abp_reads_pressure_through_mux(board):
+    from drivers.abp_pressure_sensor import AbpPressureSensor
+    board.abp.signal = 20
+    assert AbpPressureSensor().read() == pytest.approx(20, abs=0.01)
+
+
+def test_mux_separates_sensors_on_same_address(board):
+    """
+    When:
+        The ABP and HSC sensors share the same I2C address on different mux
+        ports.
+    Expect:
+        Each driver reads its own sensor.
+    """
+    from drivers.abp_pressure_sensor import AbpPressureSensor
+    from drivers.hsc_pressure_sensor import HscPressureSensor
+    board.abp.signal = 30
+    board.hsc.signal = 1
+    abp = AbpPressureSensor()
+    hsc = HscPressureSensor()
+
+    assert abp.read() == pytest.approx(30, abs=0.01)
+    assert hsc.read_differential_pressure() == pytest.approx(1, abs=0.01)
+
+
+def test_honeywell_status_faults(board):
+    from drivers.abp_pressure_sensor import AbpPressureSensor
+    abp = AbpPressureSensor()
+
+    board.abp.set_fault(Fault.DIAGNOSTIC, 1)
+    with pytest.raises(SensorDiagnosticError):
+        abp.read()
+
+    board.abp.clear_faults()
+    board.abp.set_fault(Fault.NACK, 1)
+    with pytest.raises(I2CReadError):
+        abp.read()
+
+
+def test_sfm3200_reads_flow(board):
+    from drivers.sfm3200_flow_sensor import Sfm3200
+    board.sfm.signal = lambda t: -12.5
+    assert Sfm3200().read() == pytest.approx(-12.5, abs=0.01)
+
+
+def test_sfm3200_faults(board):
+    from drivers.sfm3200_flow_sensor import Sfm3200
+    sfm = Sfm3200()
+
+    board.sfm.set_fault(Fault.CRC, 1)
+    with pytest.raises(FlowSensorCRCError):
+        sfm.read()
+
+    board.sfm.clear_faults()
+    board.sfm.set_fault(Fault.READ_FAILED, 1)
+    with pytest.raises(I2CReadError):
+        sfm.read()
+
+
+def test_sfm3200_restarts_measurement_when_not_ready(board):
+    from drivers.sfm3200_flow_sensor import Sfm3200
+    sfm = Sfm3200()
+    board.sfm.measuring = False  # e.g. the sensor reset on a voltage swing
+
+    for _ in range(Sfm3200.NOT_READY_RESTART_COUNT):
+        with pytest.raises(UnavailableMeasurmentError):
+            sfm.read()
+
+    assert board.sfm.measuring
+    assert sfm.read() == pytest.approx(0, abs=0.01)
+
+
+def test_sfm3200_restarts_measurement_until_it_takes(board):
+    from drivers.sfm3200_flow_sensor import Sfm3200
+    sfm = Sfm3200()
+    board.sfm.measuring = False
+
+    for _ in range(Sfm3200.NOT_READY_RESTART_COUNT):
+        with pytest.raises(UnavailableMeasurmentError):
+            sfm.read()
+
+    # The restart didn't take
+    board.sfm.measuring = False
+    for _ in range(Sfm3200.NOT_READY_RESTART_COUNT):
+        with pytest.raises(UnavailableMeasurmentError):
+            sfm.read()
+
+    assert board.sfm.measuring
+
+
+def test_sdp_burst(board):
+    from drivers.sdp8_pressure_sensor import SdpPressureSensor
+    sdp = SdpPressureSensor()
+    board.sdp.signal = 0.5
+
+    samples = sdp.read_burst(5)
+
+    assert len(samples) == 5
+    for _, flow in samples:
+        assert flow == pytest.approx(sdp.pressure_to_flow(0.5), rel=0.01)
+
+
+def test_rtc_time_round_trip(board):
+    from drivers.rv8523_rtc import Rv8523Rtc
+    board.rtc.set_time(datetime(2020, 5, 1, 12, 30, 15))
+    rtc = Rv8523Rtc()
+    assert rtc.read() == datetime(2020, 5, 1, 12, 30, 15)
+
+    rtc.set_rtc_time(datetime(2021, 12, 31, 23, 59, 58))
+    assert rtc.read() == datetime(2021, 12, 31, 23, 59, 58)
+
+
+def test_a2d_channels(board):
+    from drivers.ads7844_a2d import Ads7844A2D
+    board.a2d.channels = {Ads7844A2D.OXYGEN_CHANNEL: 0.8,
+                          Ads7844A2D.BATTERY_EXISTENCE_CHANNEL: 1.6}
+    a2d = Ads7844A2D()
+
+    assert a2d.read_oxygen_raw() == pytest.approx(0.8, abs=0.001)
+    assert a2d.read_battery_existence()
+
+    board.a2d.set_fault(Fault.SHORT_READ, 1)
+    with pytest.raises(UnavailableMeasurmentError):
+        a2d.read_oxygen_raw()
+
+
+def test_hce_pressure(board):
+    from drivers.hce_pressure_sensor import HcePressureSensor
+    board.hce.signal = 1000
+    hce = HcePressureSensor()
+    assert hce.read() == pytest.approx(
+        1000 * HcePressureSensor.M_BAR_CMH20_RATIO -
+        HcePressureSensor.ZERO_OFFSET_CALIBRATION_CMH20, abs=0.1)
+
+    board.hce.set_fault(Fault.NACK, 1)
+    with pytest.raises(SPIIOError):
+        hce.read()
+
+
+def test_transaction_latency(board):
+    from drivers.sfm3200_flow_sensor import Sfm3200
+    sfm = Sfm3200()
+    board.transaction_latency = 0.01
+    board.reset_statistics()
+
+    start = time.perf_counter()
+    sfm.read()
+    assert time.perf_counter() - start >= 0.01
+    assert board.transactions == 1
+    assert board.transferred_bytes == 3
@@ -0,0 +1,44 @@
+from itertools import count
+
+import pigpio
+import pytest
+
+from errors import I2CReadError
+
+# Raw readings of 0x0100 and 0x0400 with their CRC, and a "not ready" read
+SDP_RAW_DATA = [(3, bytearray([0x01, 0x00, 0x00])),
+                (0, bytearray()),
+                (3, bytearray([0x04, 0x00, 0x00]))]
+
+
+def test_burst_timestamps_each_sample_at_its_transaction(sdp_driver):
+    """
+    When:
+        Reading a burst of samples from the SDP sensor.
+    Expect:
+        Each sample is timestamped at the middle of its own read, and
+        measurements which were not ready are skipped.
+    """
+    sdp_driver._pig.i2c_read_device.side_effect = SDP_RAW_DATA
+    clock = count(start=10, step=2)
+
+    samples = sdp_driver.read_burst(3, clock=lambda: next(clock))
+
+    assert [ts for ts, _ in samples] == [11, 19]
+    flows = [flow for _, flow in samples]
+    assert flows[0] == pytest.approx(
+        sdp_driver.pressure_to_flow(sdp_driver._calculate_pressure(0x100)))
+    assert flows[1] == pytest.approx(2 * flows[0])
+
+
+def test_failed_read_returns_partial_burst(sdp_driver):
+    sdp_driver._pig.i2c_read_device.side_effect = [SDP_RAW_DATA[0],
+                                                   pigpio.error("failed")]
+    clock = count(start=10, step=2)
+
+    samples = sdp_driver.read_burst(3, clock=lambda: next(clock))
+    assert [ts for ts, _ in samples] == [11]
+
+    sdp_driver._pig.i2c_read_device.side_effect = pigpio.error("failed")
+    with pytest.raises(I2CReadError):
+        sdp_driver.read_burst(3, clock=lambda: next(clock))
@@ -5,6 +5,7 @@ from algo import Sampler
 from data.alerts import AlertCodes
 from drivers.driver_factory import DriverFactory
 from errors import UnavailableMeasurmentError
+from logic.circuit_breaker import BreakerState
 
 
 @pytest.fixture
@@ -78,3 +79,27 @@ def test_sampling_error_raises_alert(
     assert len(events.alerts_queue) > 0, "Sensor error did not raise any alert"
     assert expected_alert in events.alerts_queue.active_alerts, \
         "Sensor error did not raise the correct alert"
+
+
+@pytest.mark.parametrize('fault_sensors,error',
+                         [(["flow"], OSError), (["pressure"], OSError)])
+def test_failing_sensor_is_not_read_during_backoff(
+        events, measurements, mock_drivers, fault_sensors, error):
+    """Tests that a failing sensor stops being read, while others are."""
+    flow, pressure, a2d, timer = mock_drivers
+    failing, healthy = (flow, pressure) if "flow" in fault_sensors \
+        else (pressure, flow)
+
+    sampler = Sampler(measurements=measurements, events=events,
+                      flow_sensor=flow, pressure_sensor=pressure, a2d=a2d,
+                      timer=timer)
+    for breaker in sampler.sensor_breakers.values():
+        breaker.initial_backoff = 60
+
+    for _ in range(10):
+        sampler.sampling_iteration()
+
+    assert failing.read.call_count == \
+        sampler.sensor_breakers[AlertCodes.FLOW_SENSOR_ERROR].failure_threshold
+    assert healthy.read.call_count == 10
+    assert BreakerState.Open in sampler.breaker_states().values()
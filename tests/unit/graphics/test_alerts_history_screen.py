@@ -0,0 +1,65 @@
+from tkinter import Frame
+
+import pytest
+
+from alarm_history import AlarmHistory
+from data.alerts import Alert, AlertCodes
+from data.events import Events
+from graphics.alerts_history_screen import AlertsHistoryScreen
+from graphics.themes import Theme, DarkTheme
+
+START = 1600000000
+
+
+@pytest.fixture
+def history(tmpdir):
+    history = AlarmHistory(str(tmpdir / "inhalator.alarms"))
+    for i in range(20):
+        code = AlertCodes.PRESSURE_HIGH if i % 2 else AlertCodes.VOLUME_LOW
+        history.raised(Alert(code, START + i * 60))
+    return history
+
+
+@pytest.fixture
+def screen(config, history) -> AlertsHistoryScreen:
+    Theme.ACTIVE_THEME = DarkTheme()
+    screen = AlertsHistoryScreen(Frame(), Events(), source=history)
+    screen.show()
+    return screen
+
+
+def shown(screen):
+    return [entry.alert.timestamp for entry in screen.entries_container.entries
+            if entry.alert is not None]
+
+
+def test_rows_are_reused_when_scrolling(screen: AlertsHistoryScreen):
+    rows = list(screen.entries_container.entries)
+    assert shown(screen) == [START + i * 60 for i in range(19, 13, -1)]
+
+    screen.on_scroll_down()
+    assert shown(screen) == [START + i * 60 for i in range(18, 12, -1)]
+    assert screen.entries_container.entries == rows
+
+    for _ in range(100):
+        screen.on_scroll_down()
+    assert shown(screen)[-1] == START
+
+
+def test_filter_by_code_and_time(screen: AlertsHistoryScreen):
+    screen.set_filter(code=AlertCodes.PRESSURE_HIGH, start=START + 10 * 60)
+    assert screen.total == 5
+    assert shown(screen) == [START + i * 60 for i in (19, 17, 15, 13, 11)]
+    assert screen.entries_container.entries[5].alert is None
+
+
+def test_active_alerts_without_history(config):
+    Theme.ACTIVE_THEME = DarkTheme()
+    events = Events()
+    events.alerts_queue.initial_uptime = 0
+    events.alerts_queue.enqueue_alert(AlertCodes.NO_BREATH, START)
+    events.alerts_queue.enqueue_alert(AlertCodes.NO_BATTERY, START + 1)
+
+    screen = AlertsHistoryScreen(Frame(), events)
+    screen.show()
+    assert shown(screen) == [START + 1, START]
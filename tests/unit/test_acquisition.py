@@ -0,0 +1,98 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from algo import Sampler
+from data.alerts import AlertCodes
+from logic.computations import Accumulator
+
+
+@pytest.fixture
+def data():
+    return "noiseless_sinus"
+
+
+@pytest.fixture
+def acquisition_sampler(driver_factory, config, measurements, events):
+    return Sampler(
+        measurements=measurements,
+        events=events,
+        flow_sensor=driver_factory.flow,
+        pressure_sensor=driver_factory.pressure,
+        a2d=driver_factory.a2d,
+        timer=driver_factory.timer,
+        acquisition_rate=200)
+
+
+def test_sampling_iteration_without_new_samples_does_nothing(
+        acquisition_sampler, measurements):
+    acquisition_sampler.sampling_iteration()
+    assert measurements.flow_measurements.qsize() == 0
+
+
+def test_sampling_iteration_decimates_acquired_samples(
+        acquisition_sampler, measurements):
+    """
+    When:
+        Several samples are acquired between two sampling iterations.
+    Expect:
+        The graphs get a single, averaged, sample, while the volume is
+        integrated over all of the raw samples.
+    """
+    for _ in range(6):
+        acquisition_sampler.acquisition.acquire()
+
+    raw = list(acquisition_sampler.acquisition.samples)
+    acquisition_sampler.sampling_iteration()
+
+    assert len(acquisition_sampler.acquisition.samples) == 0
+    assert measurements.flow_measurements.qsize() == 1
+    expected_flow = sum(flow for _, flow, _ in raw) / len(raw)
+    assert measurements.flow_measurements.get() == pytest.approx(expected_flow)
+
+    expected_volume = Accumulator()
+    for timestamp, flow, _ in raw:
+        expected_volume.add_sample(timestamp, max(0, flow / 60))
+    assert acquisition_sampler.vsm.inspiration_volume.integrate() == \
+        pytest.approx(expected_volume.integrate())
+
+
+def test_burst_reads_keep_flow_sample_timestamps(acquisition_sampler):
+    """Flow samples of a burst read are stored with their own timestamps."""
+    acquisition = acquisition_sampler.acquisition
+    acquisition.burst_size = 3
+    acquisition.acquire()
+
+    timestamps = [ts for ts, _, _ in acquisition.drain()]
+    assert len(timestamps) == 3
+    assert timestamps == sorted(set(timestamps))
+
+
+def test_burst_is_spread_over_the_interval(acquisition_sampler):
+    acquisition = acquisition_sampler.acquisition
+    acquisition.burst_size = 4
+    acquisition.acquire()
+
+    timestamps = [ts for ts, _, _ in acquisition.drain()]
+    steps = [b - a for a, b in zip(timestamps, timestamps[1:])]
+    assert steps == pytest.approx([acquisition.interval / 4] * 3)
+
+
+def test_burst_reads_the_timer_once(acquisition_sampler):
+    acquisition = acquisition_sampler.acquisition
+    acquisition.burst_size = 3
+    acquisition.timer.get_time = MagicMock(
+        wraps=acquisition.timer.get_time)
+    acquisition.acquire()
+
+    assert acquisition.timer.get_time.call_count == 1
+
+
+def test_empty_burst_is_a_failed_read(acquisition_sampler):
+    acquisition = acquisition_sampler.acquisition
+    acquisition.flow_sensor.read_burst = MagicMock(return_value=[])
+    acquisition.acquire()
+
+    assert acquisition.drain() == [], "No zero flow is made up"
+    breaker = acquisition_sampler.sensor_breakers[AlertCodes.FLOW_SENSOR_ERROR]
+    assert breaker.consecutive_failures == 1
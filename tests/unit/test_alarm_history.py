@@ -0,0 +1,137 @@
+import os
+
+import numpy as np
+import pytest
+
+from alarm_history import AlarmHistory, HistoryWriter, ALARM_DTYPE
+from data.alerts import Alert, AlertCodes, AlertsQueue
+from sample_storage import read_header, read_recording, TIME_COLUMN
+
+START = 1600000000
+
+
+@pytest.fixture
+def path(tmpdir):
+    return str(tmpdir / "inhalator.alarms")
+
+
+def raise_alarms(history, count, start=START):
+    alerts = []
+    for i in range(count):
+        code = AlertCodes.PRESSURE_HIGH if i % 3 else AlertCodes.NO_BREATH
+        alert = Alert(code, start + i * 60, value=i)
+        history.raised(alert)
+        alerts.append(alert)
+    return alerts
+
+
+def test_pages_are_newest_first(path):
+    history = AlarmHistory(path)
+    raise_alarms(history, 25)
+
+    assert history.count() == 25
+    first = history.page(0, 10)
+    assert first["value"].tolist() == list(range(24, 14, -1))
+    last = history.page(2, 10)
+    assert last["value"].tolist() == list(range(4, -1, -1))
+    assert len(history.page(3, 10)) == 0
+
+
+def test_read_from_offset(path):
+    history = AlarmHistory(path)
+    raise_alarms(history, 10)
+
+    assert history.read(3, 2)["value"].tolist() == [6, 5]
+    alerts = history.alerts(0, 2, code=AlertCodes.NO_BREATH)
+    assert [alert.code for alert in alerts] == [AlertCodes.NO_BREATH] * 2
+    assert [alert.value for alert in alerts] == [9, 6]
+    assert alerts[0].timestamp == START + 9 * 60
+
+
+def test_pages_by_code_and_time(path):
+    history = AlarmHistory(path)
+    raise_alarms(history, 30)
+
+    assert history.count(AlertCodes.NO_BREATH) == 10
+    page = history.page(0, 4, code=AlertCodes.NO_BREATH)
+    assert page["value"].tolist() == [27, 24, 21, 18]
+    assert set(page["code"]) == {AlertCodes.NO_BREATH}
+
+    start, end = START + 10 * 60, START + 20 * 60
+    assert history.count(start=start, end=end) == 10
+    page = history.page(0, 100, code=AlertCodes.PRESSURE_HIGH,
+                        start=start, end=end)
+    assert page["value"].tolist() == [19, 17, 16, 14, 13, 11, 10]
+    assert history.count(AlertCodes.VOLUME_LOW) == 0
+
+
+def test_records_are_completed_in_place(path):
+    history = AlarmHistory(path)
+    alert, = raise_alarms(history, 1)
+    alert.count = 7
+    alert.last_seen = alert.timestamp + 30
+    history.update(alert, acknowledged=START + 40)
+    history.close()
+
+    _, records = read_recording(path)
+    assert len(records) == 1
+    assert records["count"][0] == 7
+    assert records["duration"][0] == 30
+    assert records["acknowledged"][0] == (START + 40) * 1000
+
+
+def test_history_survives_restart(path):
+    history = AlarmHistory(path)
+    raise_alarms(history, 5)
+    history.close()
+    # A crash mid-write, after journaling a record but before indexing it
+    with open(path, "ab") as f:
+        record = np.zeros(1, dtype=ALARM_DTYPE)
+        record[TIME_COLUMN] = (START + 600) * 1000
+        record["code"] = AlertCodes.NO_BREATH
+        f.write(record.tobytes())
+        f.write(b"\x00" * 5)
+
+    history = AlarmHistory(path)
+    assert history.count() == 6
+    assert history.count(AlertCodes.NO_BREATH) == 3
+    assert history.page(0, 1, code=AlertCodes.NO_BREATH)[TIME_COLUMN][0] == \
+        (START + 600) * 1000
+    _, offset = read_header(path)
+    assert (os.stat(path).st_size - offset) % ALARM_DTYPE.itemsize == 0, \
+        "The partial record should be dropped"
+
+
+def test_alerts_queue_journals_alarms(path, default_config):
+    queue = AlertsQueue()
+    queue.initial_uptime = 0
+    queue.journal = HistoryWriter(AlarmHistory(path))
+    queue.journal.start()
+    for i in range(10):
+        queue.enqueue_alert(AlertCodes.PRESSURE_HIGH, START + i, value=60 + i)
+    queue.clear_alerts()
+    queue.enqueue_alert(AlertCodes.PRESSURE_HIGH, START + 20, value=70)
+    queue.close()
+
+    _, records = read_recording(path)
+    assert records["value"].tolist() == [60, 70]
+    assert records["count"].tolist() == [10, 1]
+    assert records["duration"].tolist() == [9, 0]
+    assert not np.isnan(records["acknowledged"][0])
+    assert np.isnan(records["acknowledged"][1])
+
+
+def test_alarms_are_raised_while_the_history_is_read(path, default_config):
+    queue = AlertsQueue()
+    queue.initial_uptime = 0
+    queue.journal = HistoryWriter(AlarmHistory(path))
+    queue.journal.start()
+
+    # Hold the history, like the GUI reading a page of it
+    with queue.history._lock:
+        queue.enqueue_alert(AlertCodes.PRESSURE_HIGH, START, value=60)
+        assert queue.is_active(AlertCodes.PRESSURE_HIGH)
+
+    queue.close()
+    _, records = read_recording(path)
+    assert records["value"].tolist() == [60]
@@ -0,0 +1,80 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from alert_peripheral_handler import AlertPeripheralHandler, LatencyStats
+from data.alerts import AlertCodes
+from data.events import Events
+from data.observable import EventBus
+
+
+@pytest.fixture
+def events(default_config):
+    events = Events()
+    events.alerts_queue.initial_uptime = 0
+    return events
+
+
+@pytest.fixture
+def handler(events):
+    drivers = MagicMock()
+    handler = AlertPeripheralHandler(events, drivers)
+    handler.subscribe()
+    return handler
+
+
+def test_driver_shows_the_active_alerts(events, handler):
+    driver = handler.alert_driver
+    events.alerts_queue.enqueue_alert(AlertCodes.PRESSURE_HIGH, 1000)
+    driver.set_medical_condition_alert.assert_called_with(False, False)
+    driver.set_system_fault_alert.assert_not_called()
+
+    events.alerts_queue.enqueue_alert(AlertCodes.NO_BATTERY, 1000)
+    driver.set_system_fault_alert.assert_called_with(False, False)
+
+    events.alerts_queue.clear_alerts()
+    driver.set_medical_condition_alert.assert_called_with(True, False)
+    driver.set_system_fault_alert.assert_called_with(True, False)
+
+
+def test_alarm_latency(events, handler):
+    handler.timer.get_current_time.return_value = 1000.5
+    events.alerts_queue.enqueue_alert(AlertCodes.PRESSURE_HIGH, 1000)
+    events.alerts_queue.enqueue_alert(AlertCodes.NO_BREATH, 1000.25)
+
+    assert len(handler.latency) == 2
+    percentiles = handler.latency.percentiles()
+    assert percentiles[100] == 0.5
+    assert percentiles[50] == pytest.approx(0.375)
+
+
+def test_latency_is_from_the_raising_sample(events, handler):
+    bus = events.alerts_queue.observer.bus = EventBus()
+    handler.timer.get_current_time.return_value = 1000.5
+    events.alerts_queue.enqueue_alert(AlertCodes.PRESSURE_HIGH, 1000)
+    events.alerts_queue.enqueue_alert(AlertCodes.NO_BATTERY, 1000.1)
+    # Repeated while the bus is backed up
+    for i in range(1, 4):
+        events.alerts_queue.enqueue_alert(AlertCodes.PRESSURE_HIGH,
+                                          1000 + i * 0.1)
+    while bus.dispatch(timeout=0):
+        pass
+
+    assert handler.latency.percentiles((0, 100)) == \
+        {0: pytest.approx(0.4), 100: 0.5}
+
+
+def test_latency_is_kept_only_when_a_pin_is_written(events, handler):
+    handler.timer.get_current_time.return_value = 1000.5
+    handler.alert_driver.set_medical_condition_alert.return_value = False
+    events.alerts_queue.enqueue_alert(AlertCodes.PRESSURE_HIGH, 1000)
+    assert len(handler.latency) == 0
+
+
+def test_latency_percentiles():
+    stats = LatencyStats(size=100)
+    assert stats.percentiles() == {}
+    for latency in range(200):
+        stats.add(latency)
+
+    assert stats.percentiles((0, 50, 100)) == {0: 100, 50: 149.5, 100: 199}
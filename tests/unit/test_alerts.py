@@ -1,10 +1,12 @@
 from itertools import product
+from threading import Thread
 
 import pytest
 
 from algo import Sampler
 from data import alerts
-from data.alerts import Alert, AlertCodes
+from data.alerts import Alert, AlertCodes, AlertsQueue
+from data.configurations import AlarmPolicy
 from drivers.null_driver import NullDriver
 
 ALERTS = Alert.ALERT_CODE_TO_MESSAGE.keys()
@@ -59,3 +61,151 @@ def test_battery_does_not_exist(events, sampler, null_driver):
     sampler._a2d.battery_existence = False
     sampler.sampling_iteration()
     assert alerts.AlertCodes.NO_BATTERY in events.alerts_queue.active_alerts
+
+
+@pytest.mark.parametrize("null_driver", ["a2d"])
+def test_sensor_alerts_are_stamped_by_the_timer(events, sampler, null_driver):
+    timestamp = sampler._timer.get_current_time()
+    sampler.sampling_iteration()
+    assert {alert.timestamp for alert in events.alerts_queue.active_alerts} \
+        == {timestamp}
+
+
+@pytest.fixture
+def alerts_queue(default_config):
+    queue = AlertsQueue()
+    queue.initial_uptime = 0
+    published = []
+    queue.observer.subscribe(object(), published.append)
+    return queue, published
+
+
+def test_repeated_alerts_are_collapsed(alerts_queue):
+    queue, published = alerts_queue
+    for i in range(100):
+        queue.enqueue_alert(AlertCodes.PRESSURE_HIGH, 1000 + i * 0.01)
+
+    assert published == [AlertCodes.PRESSURE_HIGH]
+    assert len(queue) == 1
+    alert = queue.active_alerts[0]
+    assert alert.count == 100
+    assert alert.timestamp == 1000
+    assert alert.last_seen == pytest.approx(1000.99)
+
+
+def test_lasting_alert_is_retriggered(alerts_queue, default_config):
+    queue, published = alerts_queue
+    default_config.alarms.default.retrigger_interval = 60
+    for second in range(90):
+        queue.enqueue_alert(AlertCodes.PRESSURE_HIGH, 1000 + second)
+
+    assert len(published) == 2
+    assert len(queue) == 1
+
+
+def test_cleared_alert_is_announced_again(alerts_queue, default_config):
+    queue, published = alerts_queue
+    default_config.alarms.default.clear_time = 5
+    queue.enqueue_alert(AlertCodes.PRESSURE_LOW, 1000)
+    queue.enqueue_alert(AlertCodes.PRESSURE_LOW, 1004)
+    assert len(published) == 1, "Not cleared within the clear time"
+
+    queue.enqueue_alert(AlertCodes.PRESSURE_LOW, 1010)
+    assert len(published) == 2
+    assert queue.active_alerts[0].count == 3
+
+
+def test_alert_min_duration(alerts_queue, default_config):
+    queue, published = alerts_queue
+    default_config.alarms.per_alert["NO_BREATH"] = AlarmPolicy(
+        min_duration=3)
+    queue.enqueue_alert(AlertCodes.PRESSURE_LOW, 1000)
+    for second in range(4):
+        queue.enqueue_alert(AlertCodes.NO_BREATH, 1000 + second)
+        expected = {AlertCodes.PRESSURE_LOW}
+        if second == 3:
+            expected.add(AlertCodes.NO_BREATH)
+        assert queue.active_alert_set == expected
+
+
+def test_alerts_are_stamped_by_the_queue_clock(alerts_queue):
+    queue, _ = alerts_queue
+    queue.clock = lambda: 1000
+    queue.enqueue_alert(AlertCodes.FLOW_SENSOR_ERROR)
+
+    assert queue.active_alerts[0].timestamp == 1000
+
+
+def test_cleared_alerts_are_announced_again(alerts_queue):
+    queue, published = alerts_queue
+    queue.enqueue_alert(AlertCodes.PRESSURE_HIGH, 1000)
+    queue.clear_alerts()
+    queue.enqueue_alert(AlertCodes.PRESSURE_HIGH, 1001)
+
+    assert published == [AlertCodes.PRESSURE_HIGH, AlertCodes.OK,
+                         AlertCodes.PRESSURE_HIGH]
+    assert queue.active_alerts[0].count == 1
+
+
+def test_active_codes(alerts_queue):
+    queue, _ = alerts_queue
+    queue.enqueue_alert(AlertCodes.VOLUME_LOW, 1000)
+    queue.enqueue_alert(AlertCodes.NO_BATTERY, 1000)
+
+    assert queue.active_codes == AlertCodes.VOLUME_LOW | AlertCodes.NO_BATTERY
+    assert queue.is_active(AlertCodes.NO_BATTERY)
+    assert not queue.is_active(AlertCodes.VOLUME_HIGH)
+    assert queue.active_alerts == [AlertCodes.VOLUME_LOW,
+                                   AlertCodes.NO_BATTERY]
+
+    queue.clear_alerts()
+    assert queue.active_codes == 0
+    assert queue.active_alerts == []
+
+
+def test_concurrent_enqueue_and_clear(alerts_queue):
+    queue, _ = alerts_queue
+    codes = [AlertCodes.PRESSURE_HIGH, AlertCodes.FLOW_SENSOR_ERROR]
+
+    def enqueue(code):
+        for i in range(2000):
+            queue.enqueue_alert(code, 1000 + i)
+
+    threads = [Thread(target=enqueue, args=(code,)) for code in codes]
+    for thread in threads:
+        thread.start()
+    for _ in range(200):
+        queue.clear_alerts()
+        snapshot = queue.active_alerts
+        assert len(snapshot) == len(set(snapshot))
+    for thread in threads:
+        thread.join()
+
+    queue.enqueue_alert(AlertCodes.PRESSURE_HIGH, 5000)
+    assert queue.is_active(AlertCodes.PRESSURE_HIGH)
+    assert bin(queue.active_codes).count("1") == len(queue)
+
+
+def test_repeated_alerts_are_not_allocated(alerts_queue, monkeypatch):
+    queue, _ = alerts_queue
+    created = []
+
+    class CountedAlert(Alert):
+        __slots__ = ()
+
+        def __init__(self, *args, **kwargs):
+            super(CountedAlert, self).__init__(*args, **kwargs)
+            created.append(self)
+
+    monkeypatch.setattr(alerts, "Alert", CountedAlert)
+    for i in range(1000):
+        queue.enqueue_alert(AlertCodes.PRESSURE_HIGH, 1000 + i * 0.01)
+
+    assert len(created) == 1
+
+
+def test_alert_messages_are_cached():
+    combined = AlertCodes.NO_BREATH | AlertCodes.NO_BATTERY
+    assert str(Alert(combined)) == "No Breathing | No Battery"
+    assert str(Alert(combined)) is str(Alert(combined))
+    assert not hasattr(Alert(AlertCodes.NO_BREATH), "__dict__")
@@ -75,3 +75,15 @@ def test_o2_alerts(measurements, config, events, o2_range, o2_read, alert_code):
     assert len(events.alerts_queue) == 0 if alert_code is None else 1
     if alert_code is not None:
         assert events.alerts_queue.active_alerts[0] == alert_code
+
+
+def test_threshold_change_applies_to_running_machine(measurements, config,
+                                                     events):
+    config.thresholds.o2 = O2Range(min=20, max=99)
+    vsm = VentilationStateMachine(measurements=measurements, events=events)
+    vsm.update(20, 10, 60, 0)
+    assert len(events.alerts_queue) == 0
+
+    config.thresholds.o2.max = 50
+    vsm.update(20, 10, 60, 0)
+    assert events.alerts_queue.active_alerts[0] == AlertCodes.OXYGEN_HIGH
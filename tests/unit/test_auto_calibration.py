@@ -1,5 +1,6 @@
 import os
 
+import numpy as np
 import pytest
 
 from drivers.driver_factory import DriverFactory
@@ -55,3 +56,94 @@ def test_single_cycle_tail_ts(data, driver_factory):
 
     tail = detector.start_tails_ts[0], detector.end_tails_ts[0]
     assert tail == (27.562, 27.863)
+
+
+@pytest.mark.parametrize("data", [path_to_file("several_cycles_good.csv")])
+def test_tails_are_averaged_as_samples_arrive(data, driver_factory):
+    dp_driver: DifferentialPressureMockSensor = driver_factory.flow
+    timer: MockTimer = driver_factory.timer
+    detector = TailDetector(dp_driver,
+                            sample_threshold=5,
+                            slope_threshold=10,
+                            min_tail_length=6,
+                            grace_length=5)
+
+    results = []
+    for _ in dp_driver.seq:
+        detector.add_sample(dp_driver.read(), timer.get_time())
+        results.append(detector.process())
+
+    assert results[-1] is not None
+    assert results[-1] == detector.process(), "Processing keeps the tails"
+    assert len(detector.candidates) < 100, "Samples aren't accumulated"
+
+    detector.reset()
+    assert detector.process() is None
+
+
+def batch_tail_average(dp_driver, samples, timestamps, sample_threshold,
+                       slope_threshold, min_tail_length, grace_length):
+    """The tails' average, as detected on all of the samples at once."""
+    tail_indices = []
+    candidates = []
+    grace_count = 0
+
+    def close_up(in_grace=False):
+        nonlocal candidates, grace_count
+        tail = candidates[:len(candidates) - grace_count]
+        if tail and not in_grace:
+            if len(tail) >= min_tail_length:
+                tail_indices.extend(tail[int(len(tail) * 3 / 4):])
+            grace_count = 0
+            candidates = []
+        elif in_grace:
+            grace_count += 1
+
+    for i in range(1, len(samples)):
+        slope = ((samples[i] - samples[i - 1]) /
+                 (timestamps[i] - timestamps[i - 1]))
+        if abs(samples[i]) >= sample_threshold:
+            close_up()
+        elif abs(slope) < slope_threshold:
+            candidates.append(i - 1)
+            grace_count = 0
+        else:
+            candidates.append(i - 1)
+            close_up(in_grace=grace_count < grace_length)
+
+    if len(tail_indices) < min_tail_length:
+        return None
+
+    dp_values = np.array([dp_driver.flow_to_pressure(f) +
+                          dp_driver.get_calibration_offset()
+                          for f in samples])
+    return np.average(dp_values[tail_indices])
+
+
+@pytest.mark.parametrize("data", [path_to_file("several_cycles_good.csv")])
+def test_open_tail_is_averaged(data, driver_factory):
+    dp_driver: DifferentialPressureMockSensor = driver_factory.flow
+    timer: MockTimer = driver_factory.timer
+    parameters = dict(sample_threshold=5, slope_threshold=10,
+                      min_tail_length=6, grace_length=5)
+    samples = [dp_driver.read() for _ in dp_driver.seq]
+    timestamps = [timer.get_time() for _ in samples]
+
+    detector = TailDetector(dp_driver, **parameters)
+    for sample, timestamp in zip(samples, timestamps):
+        detector.add_sample(sample, timestamp)
+    assert detector.process() == pytest.approx(batch_tail_average(
+        dp_driver, samples, timestamps, **parameters))
+    # End the samples within the last tail
+    end = timestamps.index(detector.end_tails_ts[-1]) + 1
+    samples, timestamps = samples[:end], timestamps[:end]
+
+    detector = TailDetector(dp_driver, **parameters)
+    for sample, timestamp in zip(samples, timestamps):
+        detector.add_sample(sample, timestamp)
+    assert len(detector.candidates) >= parameters["min_tail_length"]
+
+    # The same as if the next sample closed the tail
+    closed = batch_tail_average(dp_driver, samples + [parameters[
+        "sample_threshold"]], timestamps + [timestamps[-1] + 1], **parameters)
+    assert detector.process() == pytest.approx(closed)
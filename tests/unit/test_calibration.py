@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from algo import Sampler
+from logic.calibration import CalibrationJob
+
+
+@pytest.fixture
+def data():
+    return "noiseless_sinus"
+
+
+def test_job_averages_until_max_samples():
+    values = iter(range(1, 101))
+    job = CalibrationJob(lambda: next(values), max_samples=10)
+
+    for _ in range(20):
+        job.sample()
+
+    assert job.done
+    assert job.count == 10
+    assert job.mean == pytest.approx(5.5)
+
+
+def test_job_is_done_early_when_stable():
+    job = CalibrationJob(lambda: 1.5, max_samples=100, min_samples=20,
+                         max_variance=1e-6)
+
+    for _ in range(19):
+        job.sample()
+    assert not job.done, "At least min_samples are taken"
+
+    job.sample()
+    assert job.done
+    assert job.mean == 1.5
+
+
+def test_failed_reading_ends_job():
+    def read():
+        raise OSError("bus error")
+
+    job = CalibrationJob(read)
+    job.sample()
+    assert job.done
+    assert isinstance(job.error, OSError)
+    assert job.mean is None
+
+
+def test_sampler_feeds_jobs_between_samples(sim_sampler):
+    values = []
+    job = CalibrationJob(lambda: values.append(len(values)) or 1,
+                         max_samples=5)
+    sim_sampler.add_calibration_job(job)
+
+    for _ in range(10):
+        sim_sampler.sampling_iteration()
+
+    assert job.done
+    assert len(values) == 5, "A sample per iteration, until done"
+    assert sim_sampler.calibration_jobs == []
+
+
+def test_differential_pressure_is_taken_from_the_samples(sim_sampler):
+    flow_sensor = sim_sampler._flow_sensor
+    flow_sensor.set_calibration_offset(0.5)
+    flow_sensor.read_differential_pressure = None  # Not read by the job
+    job = CalibrationJob(sim_sampler.read_differential_pressure,
+                         max_samples=5)
+    sim_sampler.add_calibration_job(job)
+
+    dps = []
+    for _ in range(5):
+        sim_sampler.sampling_iteration()
+        dps.append(flow_sensor.last_differential_pressure)
+
+    assert job.done
+    assert job.error is None
+    assert job.mean == pytest.approx(sum(dps) / len(dps))
+
+
+def test_differential_pressure_is_not_smoothed(hsc_driver, driver_factory,
+                                               config, measurements, events):
+    """The HSC driver smooths the flow, calibrating it is by the raw DP."""
+    noisy = 0.5 + np.random.RandomState(0).normal(0, 0.2, 50)
+    dps = iter(noisy)
+    hsc_driver.read_differential_pressure = lambda: next(dps)
+    sampler = Sampler(measurements=measurements, events=events,
+                      flow_sensor=hsc_driver,
+                      pressure_sensor=driver_factory.pressure,
+                      a2d=driver_factory.a2d, timer=driver_factory.timer)
+    job = CalibrationJob(sampler.read_differential_pressure,
+                         max_samples=len(noisy))
+    sampler.add_calibration_job(job)
+
+    for _ in range(len(noisy)):
+        sampler.sampling_iteration()
+
+    assert job.done
+    assert job.error is None
+    assert job.mean == pytest.approx(np.mean(noisy))
+    assert job.variance == pytest.approx(np.var(noisy, ddof=1) / len(noisy))
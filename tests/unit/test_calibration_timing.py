@@ -1,7 +1,8 @@
 import pytest
 from unittest.mock import patch
 
-from logic.auto_calibration import TailDetector, AutoFlowCalibrator
+from logic.auto_calibration import (TailDetector, AutoFlowCalibrator,
+                                    OffsetHandoff, CalibrationWorker)
 from drivers.driver_factory import DriverFactory
 
 
@@ -34,3 +35,46 @@ def test_calibration_process_timing(mock_pressure, mock_tail, calibrator):
         calibrator.get_offset(None, i)
 
     assert mock_tail.call_count == 40
+
+
+@patch("logic.auto_calibration.TailDetector.process", return_value=1.5)
+def test_worker_hands_offsets_off(mock_tail):
+    dp_driver = DriverFactory(True).differential_pressure
+    dp_driver.set_calibration_offset(0)
+    handoff = OffsetHandoff(dp_driver)
+    calibrator = AutoFlowCalibrator(
+        dp_driver=handoff,
+        interval_length=100,
+        iterations=4,
+        iteration_length=4,
+        sample_threshold=8.0,
+        slope_threshold=10.0,
+        min_tail_length=12,
+        grace_length=5,
+    )
+    offsets = []
+    worker = CalibrationWorker(calibrator, handoff, offsets.append)
+    for i in range(30):
+        worker.post(0, i, 0)
+    worker.process()
+
+    assert offsets == [1.5], "The interval's offset is reported"
+    assert dp_driver.get_calibration_offset() == 0, \
+        "Offsets are set on the driver only by the sampling"
+    assert handoff.apply() == 1.5
+    assert dp_driver.get_calibration_offset() == 1.5
+    assert handoff.apply() is None
+
+
+def test_tails_are_summed_by_the_offsets_they_were_read_with():
+    dp_driver = DriverFactory(True).differential_pressure
+    detector = TailDetector(dp_driver, sample_threshold=8.0,
+                            slope_threshold=10.0, min_tail_length=12,
+                            grace_length=5)
+    # Zero flow, read by an offset of 1.5, which the driver no longer has
+    dp_driver.set_calibration_offset(3)
+    for i in range(60):
+        detector.add_sample(0, i, offset=1.5)
+    detector.add_sample(20, 60, offset=1.5)  # Closes the tail
+
+    assert detector.process() == pytest.approx(1.5)
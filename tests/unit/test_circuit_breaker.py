@@ -0,0 +1,84 @@
+from threading import Thread
+
+import pytest
+
+from logic.circuit_breaker import CircuitBreaker, BreakerState
+
+
+@pytest.fixture
+def breaker():
+    return CircuitBreaker("Test", failure_threshold=3,
+                          initial_backoff=1, max_backoff=4)
+
+
+def fail(breaker, times, timestamp=0):
+    for _ in range(times):
+        assert breaker.allow(timestamp)
+        breaker.on_failure(timestamp)
+
+
+def test_breaker_stays_closed_below_threshold(breaker):
+    fail(breaker, 2)
+    assert breaker.state == BreakerState.Closed
+    assert breaker.allow(0)
+
+
+def test_breaker_opens_after_consecutive_failures(breaker):
+    fail(breaker, 3)
+    assert breaker.state == BreakerState.Open
+    assert not breaker.allow(0.5), "Sensor should not be read during backoff"
+
+
+def test_success_resets_failure_count(breaker):
+    fail(breaker, 2)
+    breaker.on_success()
+    fail(breaker, 2)
+    assert breaker.state == BreakerState.Closed
+
+
+def test_breaker_probes_after_backoff(breaker):
+    fail(breaker, 3)
+    assert breaker.allow(1)
+    assert breaker.state == BreakerState.HalfOpen
+
+    breaker.on_success()
+    assert breaker.state == BreakerState.Closed
+    assert breaker.consecutive_failures == 0
+
+
+def test_failed_probe_doubles_backoff(breaker):
+    """
+    When:
+        The breaker keeps failing its probes.
+    Expect:
+        The backoff grows exponentially, up to `max_backoff`.
+    """
+    timestamp = 0
+    fail(breaker, 3, timestamp)
+    backoffs = [breaker.backoff]
+    for _ in range(4):
+        timestamp = breaker.retry_time
+        assert breaker.allow(timestamp)
+        breaker.on_failure(timestamp)
+        assert breaker.state == BreakerState.Open
+        backoffs.append(breaker.backoff)
+
+    assert backoffs == [1, 2, 4, 4, 4]
+
+
+def test_breaker_is_thread_safe():
+    breaker = CircuitBreaker("Test", failure_threshold=10 ** 6)
+
+    def fail_many():
+        for timestamp in range(1000):
+            breaker.allow(timestamp)
+            breaker.on_failure(timestamp)
+
+    threads = [Thread(target=fail_many) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert breaker.consecutive_failures == 8000
+    assert breaker.state == BreakerState.Closed
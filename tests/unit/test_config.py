@@ -1,10 +1,14 @@
+import os
+import time
 from json import JSONDecodeError
 
 import pytest
 
 from data.alerts import AlertCodes
-from data.configurations import ConfigurationManager, Config
+from data.configurations import ConfigurationManager, Config, ConfigWatcher
 from data.events import Events
+from data import thresholds
+from data.thresholds import O2Range
 
 
 @pytest.fixture
@@ -124,6 +128,138 @@ def test_modify_and_save(config_path, configuration_manager):
     assert other.config == configuration_manager.config
 
 
+def test_saves_are_written_in_background(config_path, configuration_manager,
+                                         monkeypatch):
+    writes = []
+    write = configuration_manager.write
+    monkeypatch.setattr(configuration_manager, "write",
+                        lambda: writes.append(write()))
+    configuration_manager.writer.delay = 0.2
+    configuration_manager.writer.start()
+
+    for value in range(5):
+        configuration_manager.config.graph_seconds = value
+        configuration_manager.save()
+    assert writes == [], "Saves are written by the writer"
+
+    configuration_manager.writer.stop()
+    configuration_manager.writer.join(5)
+    assert len(writes) == 1, "Successive saves are written once"
+
+    other = ConfigurationManager(config_path)
+    other.load()
+    assert other.config.graph_seconds == 4
+    assert not os.path.exists(f"{config_path}.tmp")
+
+
+@pytest.mark.usefixtures("configuration_manager")
+def test_failed_save_raises_alert(tmpdir):
+    events = Events()
+    manager = ConfigurationManager(str(tmpdir / "missing" / "config.json"),
+                                   events)
+    manager.save()
+    assert events.alerts_queue.active_alerts == \
+        [AlertCodes.CONFIGURATION_SAVE_ERROR]
+
+
+def test_changed_sections_are_notified_on_poll(configuration_manager):
+    notified = []
+    configuration_manager.subscribe("thresholds", object(), notified.append)
+    configuration_manager.subscribe("graph_seconds", object(),
+                                    notified.append)
+
+    configuration_manager.config.graph_y_scale.pressure.max = 50
+    configuration_manager.save()
+    configuration_manager.poll()
+    assert notified == [], "Only the changed sections are notified"
+
+    configuration_manager.config.thresholds.pressure.max = 45
+    configuration_manager.save()
+    assert notified == [], "Notified by the polling thread"
+    configuration_manager.poll()
+    assert notified == [configuration_manager.config.thresholds]
+
+    with pytest.raises(KeyError):
+        configuration_manager.subscribe("no_such_section", object(), print)
+
+
+def test_reload_changes_config_in_place(config_path, configuration_manager):
+    config = configuration_manager.config
+    notified = []
+    configuration_manager.subscribe("graph_seconds", object(),
+                                    notified.append)
+    assert not configuration_manager.reload(), "Its own file isn't reloaded"
+
+    other = ConfigurationManager(config_path)
+    other.config.graph_seconds = 30
+    other.save()
+    assert configuration_manager.reload()
+    assert configuration_manager.config is config
+    assert config.graph_seconds == 30
+    configuration_manager.poll()
+    assert notified == [30]
+
+
+def test_reload_keeps_the_sections(config_path, configuration_manager):
+    thresholds_config = configuration_manager.config.thresholds
+    pressure = thresholds_config.pressure
+    auto_calibration = configuration_manager.config.calibration.\
+        auto_calibration
+
+    other = ConfigurationManager(config_path)
+    other.config.thresholds.pressure.max = 42
+    other.config.calibration.auto_calibration.interval = 60
+    other.save()
+    assert configuration_manager.reload()
+
+    assert configuration_manager.config.thresholds is thresholds_config
+    assert thresholds_config.pressure is pressure
+    assert pressure.max == 42
+    assert configuration_manager.config.calibration.auto_calibration is \
+        auto_calibration
+    assert auto_calibration.interval == 60
+
+
+def test_invalid_reload_keeps_config(config_path, configuration_manager,
+                                     events):
+    configuration_manager.config.graph_seconds = 30
+    with open(config_path, "w") as f:
+        f.write("{not json")
+
+    assert not configuration_manager.reload()
+    assert configuration_manager.config.graph_seconds == 30
+    assert events.alerts_queue.active_alerts == \
+        [AlertCodes.INVALID_CONFIGURATION_FILE]
+
+
+@pytest.mark.parametrize("inotify", [True, False])
+def test_watcher_requests_reload(config_path, configuration_manager,
+                                 monkeypatch, inotify):
+    if not inotify:
+        monkeypatch.setattr(ConfigWatcher, "_inotify", lambda self: None)
+    watcher = ConfigWatcher(configuration_manager, interval=0.05)
+    watcher.start()
+    try:
+        time.sleep(0.2)
+        configuration_manager.poll()
+        other = ConfigurationManager(config_path)
+        other.config.graph_seconds = 30
+        # A different modification time, for the polling
+        time.sleep(0.05)
+        other.save()
+
+        deadline = time.time() + 5
+        while (configuration_manager.config.graph_seconds != 30 and
+               time.time() < deadline):
+            time.sleep(0.05)
+            configuration_manager.poll()
+    finally:
+        watcher.stop()
+        watcher.join()
+
+    assert configuration_manager.config.graph_seconds == 30
+
+
 def test_default_config_used_when_file_does_not_exist(config_path):
     """
     When:
@@ -153,3 +289,28 @@ def test_default_config_used_when_file_is_invalid_json(config_path):
     verify_default_config(cm, config_path)
     assert len(events.alerts_queue) == 1
     assert events.alerts_queue.active_alerts[0].code == AlertCodes.INVALID_CONFIGURATION_FILE
+
+
+def test_thresholds_snapshot_follows_changes():
+    config = Config()
+    snapshot = config.thresholds.snapshot()
+    assert (snapshot.pressure_min, snapshot.pressure_max) == \
+        (config.thresholds.pressure.min, config.thresholds.pressure.max)
+    assert snapshot.version == thresholds.version()
+
+    config.thresholds.pressure.max = 40
+    assert snapshot.version != thresholds.version()
+    assert config.thresholds.snapshot().pressure_max == 40
+
+    version = thresholds.version()
+    config.thresholds.o2 = O2Range(min=None, max=None)
+    assert thresholds.version() == version + 1
+    snapshot = config.thresholds.snapshot()
+    assert snapshot.o2_min == float("-inf")
+    assert snapshot.o2_max == float("inf")
+
+
+@pytest.mark.parametrize("budget", [0, -0.5, 1.5])
+def test_invalid_compression_cpu_budget(budget):
+    with pytest.raises(ValueError):
+        Config.parse_obj({"recording": {"compression_cpu_budget": budget}})
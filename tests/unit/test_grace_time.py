@@ -34,7 +34,7 @@ def test_grace_time_alerts(mocked_uptime, events, config, sim_sampler, data):
     sim_sampler.sampling_iteration()
     assert len(events.alerts_queue) == 1
 
-    all_alerts = list(events.alerts_queue.queue.queue)
+    all_alerts = events.alerts_queue.active_alerts
     assert all(alert == alerts.AlertCodes.PRESSURE_LOW for alert in all_alerts)
 
 
@@ -61,5 +61,5 @@ def test_grace_time_alerts_move_time_forward(
     sim_sampler.sampling_iteration()
     assert len(events.alerts_queue) == 1
 
-    all_alerts = list(events.alerts_queue.queue.queue)
+    all_alerts = events.alerts_queue.active_alerts
     assert all(alert == alerts.AlertCodes.PRESSURE_LOW for alert in all_alerts)
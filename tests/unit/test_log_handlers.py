@@ -0,0 +1,184 @@
+import time
+import queue
+import logging
+
+import pytest
+
+from log_handlers import (RateLimitFilter, NonBlockingQueueHandler,
+                          queue_logging, RATE_LIMIT_KEY)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super(ListHandler, self).__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def log():
+    logger = logging.getLogger("test_log_handlers")
+    logger.propagate = False
+    handler = ListHandler()
+    logger.addHandler(handler)
+    yield logger, handler
+    logger.handlers.clear()
+
+
+def test_repeating_messages_are_rate_limited(log, clock):
+    logger, handler = log
+    handler.addFilter(RateLimitFilter(period=10, burst=2))
+
+    for value in range(5):
+        logger.warning("pressure too high %s", value)
+    logger.warning("pressure too low %s", 0)
+    clock[0] = 10
+    logger.warning("pressure too high %s", 5)
+
+    assert handler.messages == [
+        "pressure too high 0",
+        "pressure too high 1",
+        "pressure too low 0",
+        "pressure too high 5 (3 similar messages suppressed)"]
+
+
+def test_rate_limit_by_explicit_key(log, clock):
+    logger, handler = log
+    handler.addFilter(RateLimitFilter(period=10, burst=1))
+
+    for _ in range(3):
+        logger.error("%s: %s", "flow", "failed", extra={RATE_LIMIT_KEY: 1})
+        logger.error("%s: %s", "pressure", "failed",
+                     extra={RATE_LIMIT_KEY: 2})
+
+    assert handler.messages == ["flow: failed", "pressure: failed"]
+
+
+def test_records_below_level_are_not_formatted():
+    log_queue = queue.Queue()
+    handler = NonBlockingQueueHandler(log_queue, logging.ERROR)
+    logger = logging.getLogger("test_records_below_level")
+    logger.propagate = False
+    logger.addHandler(handler)
+    formatted = []
+
+    class Value(object):
+        def __str__(self):
+            formatted.append(self)
+            return "value"
+
+    logger.warning("filtered %s", Value())
+    assert formatted == []
+    assert log_queue.empty()
+
+    logger.error("written %s", Value())
+    assert len(formatted) == 1
+    assert log_queue.get_nowait().getMessage() == "written value"
+    logger.handlers.clear()
+
+
+def test_queue_handler_level_is_the_lowest_handlers():
+    warnings, errors = ListHandler(), ListHandler()
+    warnings.setLevel(logging.WARNING)
+    errors.setLevel(logging.ERROR)
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    listener = queue_logging([errors, warnings])
+    try:
+        queue_handler = root.handlers[-1]
+    finally:
+        listener.stop()
+        root.handlers = handlers
+
+    assert queue_handler.level == logging.WARNING
+
+
+def test_full_queue_drops_records():
+    handler = NonBlockingQueueHandler(queue.Queue(2))
+    logger = logging.getLogger("test_full_queue")
+    logger.propagate = False
+    logger.addHandler(handler)
+
+    for i in range(5):
+        logger.warning("record %s", i)
+
+    assert handler.dropped == 3
+    logger.handlers.clear()
+
+
+def test_records_are_written_by_listener():
+    handler = ListHandler()
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    listener = queue_logging([handler])
+    try:
+        logging.getLogger("test_listener").warning("written %s", "later")
+    finally:
+        listener.stop()
+        root.handlers = handlers
+
+    assert handler.messages == ["written later"]
+
+
+def test_suppressed_count_is_emitted_when_window_ends(log, clock):
+    logger, handler = log
+    summaries = []
+    handler.addFilter(RateLimitFilter(period=10, burst=1,
+                                      emit=summaries.append))
+
+    for value in range(3):
+        logger.warning("pressure too high %s", value)
+    clock[0] = 10
+    logger.warning("volume too low %s", 0)
+
+    assert [summary.getMessage() for summary in summaries] == [
+        "pressure too high 1 (2 similar messages suppressed)"]
+
+
+def test_windows_are_bounded(log, clock):
+    logger, handler = log
+    rate_limit = RateLimitFilter(period=10, burst=1, max_keys=3)
+    handler.addFilter(rate_limit)
+
+    for value in range(100):
+        logger.warning(f"unique message {value}")
+
+    assert len(rate_limit._windows) == 3
+
+
+def test_flush_emits_suppressed_counts(log, clock):
+    logger, handler = log
+    summaries = []
+    rate_limit = RateLimitFilter(period=10, burst=1, emit=summaries.append)
+    handler.addFilter(rate_limit)
+
+    logger.warning("pressure too high %s", 0)
+    logger.warning("pressure too high %s", 1)
+    rate_limit.flush()
+
+    assert [summary.getMessage() for summary in summaries] == [
+        "pressure too high 1 (1 similar messages suppressed)"]
+
+
+def test_arguments_are_formatted_when_queued():
+    log_queue = queue.Queue()
+    handler = NonBlockingQueueHandler(log_queue)
+    logger = logging.getLogger("test_queued_arguments")
+    logger.propagate = False
+    logger.addHandler(handler)
+
+    values = [1]
+    logger.warning("values %s", values)
+    values.append(2)
+
+    assert log_queue.get_nowait().getMessage() == "values [1]"
+    logger.handlers.clear()
@@ -0,0 +1,107 @@
+from threading import Event, Thread
+
+from data.observable import Observable, EventBus, SAFETY_PRIORITY
+
+
+def test_inline_publish():
+    observable = Observable()
+    values = []
+    observable.subscribe("subscriber", values.append)
+    observable.publish(1)
+    assert values == [1]
+
+
+def test_bus_coalesces_pending_values():
+    bus = EventBus()
+    observable = Observable(bus)
+    values = []
+    observable.subscribe("subscriber", values.append)
+
+    for value in range(5):
+        observable.publish(value)
+    assert values == [], "Subscribers are notified by the dispatcher"
+    assert bus.depth == 1
+
+    while bus.dispatch(timeout=0):
+        pass
+    assert values == [4]
+    assert bus.metrics()["coalesced"] == 4
+
+
+def test_bus_without_coalescing():
+    bus = EventBus()
+    observable = Observable(bus, coalesce=False)
+    values = []
+    observable.subscribe("subscriber", values.append)
+
+    for value in range(3):
+        observable.publish(value)
+    while bus.dispatch(timeout=0):
+        pass
+    assert values == [0, 1, 2]
+
+
+def test_safety_subscribers_are_notified_first():
+    bus = EventBus()
+    display, alarms = Observable(bus), Observable(bus)
+    calls = []
+    display.subscribe("screen", lambda value: calls.append(("screen", value)))
+    alarms.subscribe("log", lambda value: calls.append(("log", value)))
+    alarms.subscribe("buzzer", lambda value: calls.append(("buzzer", value)),
+                     priority=SAFETY_PRIORITY)
+
+    display.publish("graph")
+    alarms.publish("alarm")
+    while bus.dispatch(timeout=0):
+        pass
+
+    assert calls == [("buzzer", "alarm"), ("screen", "graph"),
+                     ("log", "alarm")]
+
+
+def test_failing_subscriber_doesnt_stop_the_bus():
+    bus = EventBus()
+    observable = Observable(bus)
+    values = []
+
+    def fail(value):
+        raise RuntimeError(value)
+
+    observable.subscribe("failing", fail, priority=1)
+    observable.subscribe("subscriber", values.append)
+    observable.publish(1)
+    while bus.dispatch(timeout=0):
+        pass
+
+    assert values == [1]
+    assert bus.metrics()["dispatched"] == 2
+
+
+def test_dispatcher_thread():
+    bus = EventBus()
+    observable = Observable(bus)
+    notified = Event()
+    observable.subscribe("subscriber", lambda value: notified.set())
+    bus.start()
+    try:
+        observable.publish(1)
+        assert notified.wait(5)
+    finally:
+        bus.stop()
+        bus.join(5)
+
+    assert not bus.is_alive()
+    metrics = bus.metrics()
+    assert metrics["depth"] == 0
+    assert 0 <= metrics["average_latency"] <= metrics["max_latency"]
+
+
+def test_dispatch_returns_once_stopped():
+    bus = EventBus()
+    bus.stop()
+    # As if the stop came between the dispatcher's check and its wait
+    dispatcher = Thread(target=bus.dispatch, daemon=True)
+    dispatcher.start()
+    dispatcher.join(5)
+
+    assert not dispatcher.is_alive()
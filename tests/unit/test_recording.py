@@ -0,0 +1,111 @@
+import csv
+
+import numpy as np
+import pytest
+
+from drivers.mocks.recording import Recording
+from sample_storage import RecordingFormatError
+from tests.data.files import path_to_file
+
+# Has a quoted, comma separated, timestamp column
+RECORDING = path_to_file("pig_sim_extreme_in_exhale_both.csv")
+TIME = "time elapsed (seconds)"
+
+
+def generate_data_from_file(sensor, file_path):
+    with open(file_path, 'r') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield float(row[sensor])
+
+
+def test_csv_is_parsed_into_numeric_columns():
+    recording = Recording.load(RECORDING)
+
+    assert "timestamp" not in recording.columns
+    for name in (TIME, "flow", "pressure", "oxygen"):
+        expected = list(generate_data_from_file(name, RECORDING))
+        assert recording.column(name).tolist() == expected
+
+
+def test_csv_parsed_in_blocks(monkeypatch):
+    monkeypatch.setattr(Recording, "PARSE_BLOCK_ROWS", 7)
+    recording = Recording.load(RECORDING)
+    assert recording.column("flow").tolist() == \
+        list(generate_data_from_file("flow", RECORDING))
+
+
+def test_blank_lines_are_skipped(tmpdir):
+    path = tmpdir / "recording.csv"
+    path.write("time elapsed (seconds),flow\n0,1\n\n0.1,2\n\n")
+    recording = Recording.load(path)
+    assert recording.column("flow").tolist() == [1, 2]
+
+
+def test_numpy_recording_is_memory_mapped(tmpdir):
+    path = str(tmpdir / "recording.npy")
+    Recording.load(RECORDING).save(path)
+
+    recording = Recording.load(path)
+
+    assert isinstance(recording.column("flow"), np.memmap)
+    assert recording.column("flow").tolist() == \
+        list(generate_data_from_file("flow", RECORDING))
+
+
+@pytest.mark.parametrize("data", [RECORDING])
+def test_mock_drivers_share_a_single_recording(driver_factory):
+    flow = driver_factory.flow
+    pressure = driver_factory.pressure
+    timer = driver_factory.timer
+
+    assert flow.seq is driver_factory.recording.column("flow")
+    assert pressure.seq is driver_factory.recording.column("pressure")
+
+    expected_times = list(generate_data_from_file(TIME, RECORDING))
+    expected_flows = list(generate_data_from_file("flow", RECORDING))
+    expected_pressures = list(generate_data_from_file("pressure", RECORDING))
+    for i in range(len(expected_times)):
+        assert timer.get_time() == pytest.approx(expected_times[i])
+        assert pressure.read() == expected_pressures[i]
+        assert flow.read() == pytest.approx(expected_flows[i])
+
+    # The recording is replayed from its start
+    assert pressure.read() == expected_pressures[0]
+
+
+def test_csv_loaded_between_times(tmpdir):
+    path = tmpdir / "recording.csv"
+    path.write("unix_time (milliseconds),flow\n1000,1\n2000,2\n3000,3\n")
+    recording = Recording.load(path, start=1.5, end=3)
+    assert recording.column("flow").tolist() == [2, 3]
+
+
+def test_ragged_rows_are_rejected(tmpdir):
+    path = tmpdir / "recording.csv"
+    path.write("time elapsed (seconds),flow\n0,1\n0.1\n0.2,3\n")
+    with pytest.raises(RecordingFormatError):
+        Recording.load(path)
+
+
+def test_missing_values_are_nan(tmpdir):
+    path = tmpdir / "recording.csv"
+    path.write("time elapsed (seconds),pip,state\n0,None,None\n0.1,20,Inhale\n")
+    recording = Recording.load(path)
+    assert np.isnan(recording.column("pip")[0])
+    assert recording.column("pip")[1] == 20
+    assert "state" not in recording.columns
+
+
+@pytest.mark.parametrize("start,end", [(5, 6), (2, 2)])
+def test_too_short_window_is_rejected(tmpdir, start, end):
+    path = tmpdir / "recording.csv"
+    path.write("unix_time (milliseconds),flow\n1000,1\n2000,2\n3000,3\n")
+    with pytest.raises(RecordingFormatError):
+        Recording.load(path, start=start, end=end)
+
+
+def test_single_timestamp_is_rejected():
+    from drivers.mocks.timer import MockTimer
+    with pytest.raises(ValueError):
+        MockTimer([0])
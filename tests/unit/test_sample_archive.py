@@ -0,0 +1,162 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from algo import VentilationState
+from sample_archive import (ArchiveCompactor, ArchiveFile, breath_records,
+                            trend_records, TREND_DTYPE, INHALE_STATE)
+from sample_storage import (SamplesStorage, read_recording, RECORD_DTYPE,
+                            TIME_COLUMN)
+
+SAMPLE_RATE = 10
+BREATH_SECONDS = 4
+START = 1600000000
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [START]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def storage(tmpdir, monkeypatch, clock):
+    monkeypatch.setattr(SamplesStorage, "BLOCK_RECORDS", 10)
+    return SamplesStorage(str(tmpdir / "inhalator.rec"),
+                          max_file_size=20000, max_files=5,
+                          compress_segments=False)
+
+
+def record(storage, clock, seconds):
+    """Record samples, with a new breath every `BREATH_SECONDS`."""
+    for i in range(seconds * SAMPLE_RATE):
+        sample = round((clock[0] - START) * SAMPLE_RATE)
+        breath, offset = divmod(sample, BREATH_SECONDS * SAMPLE_RATE)
+        state = (VentilationState.Inhale if offset < SAMPLE_RATE
+                 else VentilationState.Exhale)
+        storage.write(flow=i % SAMPLE_RATE, pressure=breath, oxygen=21,
+                      pip=20 + breath % 2, peep=5, bpm=15, state=state)
+        clock[0] += 1 / SAMPLE_RATE
+    storage.flush()
+
+
+def samples(storage):
+    segments = storage.rotated_segments() + [storage.file_name]
+    return np.concatenate([read_recording(segment)[1]
+                           for segment in segments])
+
+
+def test_breath_records():
+    inhale, exhale = (VentilationState.Inhale.value,
+                      VentilationState.Exhale.value)
+    records = np.zeros(8, dtype=RECORD_DTYPE)
+    records[TIME_COLUMN] = range(8)
+    for name in ("tv_insp", "tv_exp", "bpm"):
+        records[name] = np.nan
+    records["state"] = [exhale, inhale, inhale, exhale, exhale, inhale,
+                        exhale, inhale]
+    # PIP is updated as the inhale ends, and PEEP as the exhale ends
+    records["pip"] = [np.nan, np.nan, np.nan, 20, 20, 20, 20, 20]
+    records["peep"] = [np.nan, np.nan, np.nan, np.nan, np.nan, 5, 5, 5]
+
+    breaths, _ = breath_records(records)
+    assert breaths[TIME_COLUMN].tolist() == [1, 5, 7], \
+        "A record per breath, even where nothing changed"
+    assert breaths["pip"].tolist()[1:] == [20, 20]
+    assert breaths["peep"].tolist()[1:] == [5, 5]
+
+    first, last = breath_records(records[:5])
+    second, _ = breath_records(records[5:], previous=last)
+    assert np.concatenate([first, second]).tobytes() == breaths.tobytes(), \
+        "Breaths should continue across chunks"
+
+
+def test_inhale_state_is_the_state_machines():
+    assert INHALE_STATE == VentilationState.Inhale.value
+
+
+def test_trend_records():
+    records = np.zeros(5, dtype=RECORD_DTYPE)
+    records[TIME_COLUMN] = [1000, 1500, 1999, 2000, 2500]
+    records["flow"] = [3, -1, 2, 7, 8]
+
+    trend = trend_records(records)
+    assert trend[TIME_COLUMN].tolist() == [1000, 2000]
+    assert trend["flow_min"].tolist() == [-1, 7]
+    assert trend["flow_max"].tolist() == [3, 8]
+
+
+def test_rotated_segments_are_archived(storage, clock):
+    record(storage, clock, 60)
+    compactor = ArchiveCompactor(storage, cpu_budget=1)
+    rotated = storage.rotated_segments()
+    assert rotated
+
+    compactor.compact()
+
+    assert storage.rotated_segments() == rotated, \
+        "Segments are kept at full rate for `full_rate_hours`"
+    archived = np.concatenate([read_recording(segment)[1]
+                               for segment in rotated])
+    seconds = np.unique(np.floor(archived[TIME_COLUMN] / 1000))
+    _, trend = read_recording(compactor.trend.path)
+    assert trend[TIME_COLUMN].tolist() == (seconds * 1000).tolist()
+    assert trend["flow_min"].min() == 0
+    assert trend["flow_max"].max() == SAMPLE_RATE - 1
+
+    _, breaths = read_recording(compactor.breaths.path)
+    assert breaths["pip"].tolist()[:3] == [20, 21, 20]
+    assert np.diff(breaths[TIME_COLUMN]).tolist()[:2] == \
+        pytest.approx([BREATH_SECONDS * 1000] * 2)
+
+
+def test_expired_segments_are_removed(storage, clock):
+    record(storage, clock, 60)
+    before = samples(storage)
+    compactor = ArchiveCompactor(storage, full_rate_hours=1, cpu_budget=1)
+    compactor.compact()
+
+    clock[0] += 60 * 60
+    compactor.compact()
+
+    assert storage.rotated_segments() == []
+    after = read_recording(storage.file_name)[1]
+    _, trend = read_recording(compactor.trend.path)
+    assert trend[TIME_COLUMN][-1] < after[TIME_COLUMN][0]
+    assert trend[TIME_COLUMN][0] == \
+        np.floor(before[TIME_COLUMN][0] / 1000) * 1000
+
+
+def test_archive_resumes_after_restart(storage, clock):
+    record(storage, clock, 30)
+    ArchiveCompactor(storage, cpu_budget=1).compact()
+    record(storage, clock, 30)
+
+    compactor = ArchiveCompactor(storage, cpu_budget=1)
+    compactor.compact()
+    compactor.close()
+
+    _, trend = read_recording(compactor.trend.path)
+    assert (np.diff(trend[TIME_COLUMN]) > 0).all(), \
+        "Nothing should be archived twice"
+    _, breaths = read_recording(compactor.breaths.path)
+    assert (np.diff(breaths[TIME_COLUMN]) > 0).all()
+
+
+def test_archive_file_stays_within_budget(tmpdir):
+    path = str(tmpdir / "inhalator.trend")
+    archive = ArchiveFile(path, TREND_DTYPE, max_size=2000)
+    for i in range(100):
+        records = np.zeros(1, dtype=TREND_DTYPE)
+        records[TIME_COLUMN] = i
+        archive.append(records)
+    archive.close()
+
+    assert os.stat(path).st_size < 2000
+    assert os.stat(path + ".1").st_size < 2000 + TREND_DTYPE.itemsize
+    assert archive.last()[TIME_COLUMN] == 99
+    assert ArchiveFile(path, TREND_DTYPE, max_size=2000).last()[
+        TIME_COLUMN] == 99
@@ -0,0 +1,374 @@
+import csv
+import os
+import time
+from enum import Enum
+
+import numpy as np
+import pytest
+
+from data.configurations import FsyncPolicy
+from drivers.mocks.recording import Recording
+from sample_storage import (SamplesStorage, SegmentCompressor,
+                            read_recording, read_header, iter_recording,
+                            read_index, read_between, convert_to_csv,
+                            throttle, RECORD_DTYPE, INDEX_SUFFIX,
+                            TIME_COLUMN)
+
+
+class State(Enum):
+    Inhale = 1
+    Exhale = 4
+
+
+@pytest.fixture
+def path(tmpdir):
+    return str(tmpdir / "inhalator.rec")
+
+
+def segment_files(path):
+    return sorted(name for name in os.listdir(os.path.dirname(path))
+                  if not name.endswith(INDEX_SUFFIX))
+
+
+def write_samples(storage, count, start=0):
+    for i in range(start, start + count):
+        storage.write(flow=i, pressure=i * 2, oxygen=21, pip=30, peep=None,
+                      state=State.Inhale if i % 2 else State.Exhale)
+
+
+def test_write_and_read(path):
+    storage = SamplesStorage(path, metadata={"config": {"bpm": 15}},
+                             states=State)
+    write_samples(storage, 10)
+    storage.close()
+
+    header, records = read_recording(path)
+    assert header["metadata"] == {"config": {"bpm": 15}}
+    assert records["flow"].tolist() == list(range(10))
+    assert records["pressure"].tolist() == list(range(0, 20, 2))
+    assert records["state"].tolist() == [4, 1] * 5
+    assert np.isnan(records["peep"]).all()
+    assert records["time elapsed (seconds)"][0] == 0
+    assert (np.diff(records["time elapsed (seconds)"]) >= 0).all()
+
+
+def test_samples_are_written_only_on_flush(path):
+    storage = SamplesStorage(path)
+    _, offset = read_header(path)
+
+    write_samples(storage, SamplesStorage.BLOCK_RECORDS + 1)
+    assert os.stat(path).st_size == offset
+
+    storage.flush()
+    assert os.stat(path).st_size == \
+        offset + (SamplesStorage.BLOCK_RECORDS + 1) * RECORD_DTYPE.itemsize
+
+
+def test_writer_flushes_in_background(path):
+    storage = SamplesStorage(path, flush_interval=0.01)
+    storage.writer.start()
+    write_samples(storage, 3)
+    time.sleep(0.2)
+
+    assert len(read_recording(path)[1]) == 3
+    storage.close()
+    assert not storage.writer.is_alive()
+
+
+def test_samples_dropped_when_disk_is_stuck(path, monkeypatch):
+    """
+    When:
+        The writer doesn't get to write, e.g. the SD card stalls.
+    Expect:
+        Samples are buffered up to the pending blocks limit, and the rest
+        are dropped and counted - without blocking the caller.
+    """
+    monkeypatch.setattr(SamplesStorage, "BLOCK_RECORDS", 10)
+    storage = SamplesStorage(path, max_pending_blocks=2)
+
+    write_samples(storage, 50)
+
+    assert storage.dropped_rows == 20
+    storage.close()
+    assert read_recording(path)[1]["flow"].tolist() == list(range(30))
+
+
+@pytest.mark.parametrize("policy,fsyncs", [(FsyncPolicy.Never, 0),
+                                           (FsyncPolicy.Always, 3),
+                                           (FsyncPolicy.Periodic, 1)])
+def test_fsync_policy(path, monkeypatch, policy, fsyncs):
+    storage = SamplesStorage(path, fsync_policy=policy, fsync_interval=60)
+    storage._last_fsync -= 60
+    calls = []
+    monkeypatch.setattr(os, "fsync", calls.append)
+
+    for _ in range(3):
+        write_samples(storage, 1)
+        storage.flush()
+
+    assert len(calls) == fsyncs
+
+
+def test_rotation(path, monkeypatch):
+    monkeypatch.setattr(SamplesStorage, "BLOCK_RECORDS", 10)
+    storage = SamplesStorage(path, max_file_size=5000, max_files=2,
+                             compress_segments=False)
+    write_samples(storage, 200)
+    storage.close()
+
+    assert segment_files(path) == \
+        ["inhalator.rec", "inhalator.rec.1", "inhalator.rec.2"]
+    flows = [read_recording(segment)[1]["flow"].tolist()
+             for segment in (path + ".2", path + ".1", path)]
+    flows = sum(flows, [])
+    assert flows == list(range(200 - len(flows), 200)), \
+        "The newest samples should be kept, in order"
+
+
+def test_restart_appends_to_segment(path):
+    storage = SamplesStorage(path)
+    write_samples(storage, 3)
+    storage.close()
+
+    # Leave a partial record, as if crashed in the middle of a write
+    with open(path, "ab") as f:
+        f.write(b"\x00" * 5)
+
+    storage = SamplesStorage(path)
+    write_samples(storage, 3, start=3)
+    storage.close()
+
+    _, records = read_recording(path)
+    assert records["flow"].tolist() == list(range(6))
+
+
+def test_foreign_file_is_rotated_out(path):
+    with open(path, "w") as f:
+        f.write("timestamp,flow\n")
+
+    storage = SamplesStorage(path, compress_segments=False)
+    write_samples(storage, 1)
+    storage.close()
+
+    assert open(path + ".1").read() == "timestamp,flow\n"
+    assert len(read_recording(path)[1]) == 1
+
+
+def test_convert_to_csv(path, tmpdir):
+    storage = SamplesStorage(path, states=State)
+    write_samples(storage, 4)
+    storage.close()
+    output = str(tmpdir / "inhalator.csv")
+
+    convert_to_csv([path, path], output)
+
+    with open(output) as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0].keys()) == SamplesStorage.COLUMNS
+    assert len(rows) == 8
+    assert [float(row["flow"]) for row in rows[:4]] == [0, 1, 2, 3]
+    assert [row["state"] for row in rows[:2]] == \
+        ["State.Exhale", "State.Inhale"]
+    assert rows[0]["peep"] == "None"
+    assert rows[0]["tv_insp"] == "None"
+
+
+def test_recording_replayed_by_simulation(path):
+    storage = SamplesStorage(path)
+    write_samples(storage, 5)
+    storage.close()
+
+    recording = Recording.load(path)
+    assert recording.column("flow").tolist() == [0, 1, 2, 3, 4]
+
+
+def rotated_storage(path, monkeypatch, **kwargs):
+    monkeypatch.setattr(SamplesStorage, "BLOCK_RECORDS", 10)
+    monkeypatch.setattr(SegmentCompressor, "CHUNK_RECORDS", 7)
+    return SamplesStorage(path, max_file_size=5000, max_files=2, **kwargs)
+
+
+def test_rotated_segments_are_compressed(path, monkeypatch):
+    storage = rotated_storage(path, monkeypatch)
+    write_samples(storage, 60)
+    storage.flush()
+    expected = read_recording(path + ".1")[1].copy()
+
+    assert storage.compressor.compress(path + ".1")
+
+    assert segment_files(path) == \
+        ["inhalator.rec", "inhalator.rec.1.gz"]
+    header, records = read_recording(path + ".1.gz")
+    assert header["columns"] == read_header(path)[0]["columns"]
+    assert records.tobytes() == expected.tobytes()
+
+    _, chunks = iter_recording(path + ".1.gz", chunk_records=5)
+    chunks = list(chunks)
+    assert max(len(chunk) for chunk in chunks) == 5
+    assert np.concatenate(chunks).tobytes() == expected.tobytes()
+
+
+def test_compressed_segments_are_rotated(path, monkeypatch):
+    storage = rotated_storage(path, monkeypatch)
+    write_samples(storage, 60)
+    storage.flush()
+    storage.compressor.compress(path + ".1")
+    write_samples(storage, 60, start=60)
+    storage.close()
+
+    assert segment_files(path) == \
+        ["inhalator.rec", "inhalator.rec.1", "inhalator.rec.2.gz"]
+    flows = [read_recording(segment)[1]["flow"].tolist()
+             for segment in storage.rotated_segments() + [path]]
+    flows = sum(flows, [])
+    assert flows == list(range(120 - len(flows), 120))
+
+
+def test_segment_rotated_while_compressed(path, monkeypatch):
+    """
+    When:
+        The segment is rotated while it is being compressed.
+    Expect:
+        The compressed copy is dropped, and the rotated segment is kept.
+    """
+    storage = rotated_storage(path, monkeypatch)
+    write_samples(storage, 60)
+    storage.flush()
+    write_member = storage.compressor._write_member
+
+    def rotate_meanwhile(f, data):
+        write_member(f, data)
+        if not os.path.exists(path + ".2"):
+            write_samples(storage, 60, start=60)
+            storage.flush()
+
+    monkeypatch.setattr(storage.compressor, "_write_member", rotate_meanwhile)
+    assert not storage.compressor.compress(path + ".1")
+    assert segment_files(path) == \
+        ["inhalator.rec", "inhalator.rec.1", "inhalator.rec.2"]
+
+
+def test_compressor_runs_in_background(path, monkeypatch):
+    storage = rotated_storage(path, monkeypatch, compression_cpu_budget=0.5)
+    storage.compressor.start()
+    write_samples(storage, 60)
+    storage.flush()
+    for _ in range(100):
+        if os.path.exists(path + ".1.gz"):
+            break
+        time.sleep(0.01)
+
+    storage.close()
+    assert segment_files(path) == \
+        ["inhalator.rec", "inhalator.rec.1.gz"]
+    assert not storage.compressor.is_alive()
+
+
+def test_compressed_recording_replayed_by_simulation(path, monkeypatch):
+    storage = rotated_storage(path, monkeypatch)
+    write_samples(storage, 60)
+    storage.close()
+    storage.compressor.compress(path + ".1")
+
+    recording = Recording.load(path + ".1.gz")
+    assert recording.column("flow").tolist() == \
+        list(range(len(recording)))
+
+
+def test_cpu_budget_throttle(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+    throttle(1, cpu_budget=0.25)
+    throttle(1, cpu_budget=1)
+    assert sleeps == [3]
+
+
+def indexed_storage(path, monkeypatch, **kwargs):
+    monkeypatch.setattr(SamplesStorage, "BLOCK_RECORDS", 10)
+    monkeypatch.setattr(SamplesStorage, "INDEX_INTERVAL_RECORDS", 25)
+    monkeypatch.setattr(SegmentCompressor, "CHUNK_RECORDS", 20)
+    return SamplesStorage(path, **kwargs)
+
+
+def test_segment_is_indexed(path, monkeypatch):
+    storage = indexed_storage(path, monkeypatch)
+    write_samples(storage, 100)
+    storage.close()
+
+    _, records = read_recording(path)
+    index = read_index(path)
+    assert index["record"].tolist() == [0, 30, 60, 90]
+    assert index[TIME_COLUMN].tolist() == \
+        records[TIME_COLUMN][index["record"].astype(int)].tolist()
+    _, offset = read_header(path)
+    assert index["offset"].tolist() == \
+        [offset + record * RECORD_DTYPE.itemsize for record in index["record"]]
+
+
+def test_index_entries_of_lost_records_are_dropped(path, monkeypatch):
+    storage = indexed_storage(path, monkeypatch)
+    write_samples(storage, 100)
+    storage.close()
+
+    # Lose the last records, as if crashed before they reached the disk
+    with open(path, "r+b") as f:
+        f.truncate(os.stat(path).st_size - 20 * RECORD_DTYPE.itemsize)
+
+    storage = indexed_storage(path, monkeypatch)
+    write_samples(storage, 20, start=80)
+    storage.close()
+    assert read_index(path)["record"].tolist() == [0, 30, 60, 80]
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_read_between(path, monkeypatch, compress):
+    storage = indexed_storage(path, monkeypatch, max_files=1)
+    write_samples(storage, 100)
+    storage.flush()
+    storage._rotate()
+    segment = path + ".1"
+    if compress:
+        assert storage.compressor.compress(segment)
+        segment += ".gz"
+        assert len(read_index(segment)) == 5
+    storage.close()
+
+    _, records = read_recording(segment)
+    times = records[TIME_COLUMN] / 1000
+    _, window = read_between(segment, times[42], times[57])
+    assert window["flow"].tolist() == list(range(42, 58))
+
+    assert read_between(segment, end=times[3])[1]["flow"].tolist() == \
+        list(range(4))
+    assert read_between(segment, start=times[97])[1]["flow"].tolist() == \
+        list(range(97, 100))
+    assert len(read_between(segment, times[-1] + 1)[1]) == 0
+
+
+def test_read_between_seeks_using_index(path, monkeypatch):
+    """
+    Expect:
+        Reading a window at the end of a segment doesn't read its start.
+    """
+    storage = indexed_storage(path, monkeypatch)
+    write_samples(storage, 100)
+    storage.close()
+    _, records = read_recording(path)
+    start = records[TIME_COLUMN][95] / 1000
+
+    with open(path, "r+b") as f:
+        f.seek(read_header(path)[1])
+        f.write(b"\xff" * 10 * RECORD_DTYPE.itemsize)  # Corrupt the start
+
+    _, window = read_between(path, start)
+    assert window["flow"].tolist() == list(range(95, 100))
+
+
+def test_recording_window_replayed_by_simulation(path, monkeypatch):
+    storage = indexed_storage(path, monkeypatch)
+    write_samples(storage, 100)
+    storage.close()
+    times = read_recording(path)[1][TIME_COLUMN] / 1000
+
+    recording = Recording.load(path, times[10], times[19])
+    assert recording.column("flow").tolist() == list(range(10, 20))
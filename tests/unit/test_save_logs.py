@@ -0,0 +1,14 @@
+import os
+import sys
+import subprocess
+
+SCRIPT = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir,
+                      "scripts", "save_logs.py")
+
+
+def test_script_runs_from_anywhere(tmpdir):
+    result = subprocess.run([sys.executable, os.path.abspath(SCRIPT), "--help"],
+                            cwd=str(tmpdir), stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE)
+    assert result.returncode == 0, result.stderr.decode()
+    assert b"usage" in result.stdout
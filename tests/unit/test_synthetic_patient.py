@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from algo import Sampler
+from drivers.mocks.patient import SyntheticPatient
+
+SAMPLE_RATE = 100
+
+
+@pytest.fixture
+def patient():
+    return SyntheticPatient(bpm=15, ie_ratio=0.5, pip=20, peep=5,
+                            resistance=10, compliance=40, noise_sigma=0,
+                            bpm_variability=0, compliance_variability=0,
+                            seed=1)
+
+
+def inhale_starts(flow):
+    inhale = flow > 0
+    return np.flatnonzero(inhale[1:] & ~inhale[:-1]) + 1
+
+
+def test_breath_rate(patient):
+    signals = patient.generate(600, SAMPLE_RATE)
+    assert len(signals.timestamps) == 600 * SAMPLE_RATE
+    # The first breath starts at the very first sample
+    assert len(inhale_starts(signals.flow)) + 1 == 150
+
+
+def test_pressure_between_peep_and_pip(patient):
+    signals = patient.generate(60, SAMPLE_RATE)
+    assert signals.pressure.min() >= patient.peep
+    assert signals.pressure.max() == pytest.approx(patient.pip, abs=0.01)
+
+
+def test_tidal_volume_matches_lung_model(patient):
+    """
+    Expect:
+        The inhaled volume is C * (PIP - PEEP), minus the part the lung
+        didn't have the time to fill.
+    """
+    signals = patient.generate(4, SAMPLE_RATE)
+    inhaled_liters = signals.flow[signals.flow > 0].sum() / SAMPLE_RATE / 60
+    inhale_time = 4 / 3
+    tau = 10 * 40 / 1000
+    expected = 40 * 15 * (1 - np.exp(-inhale_time / tau)) / 1000
+    assert inhaled_liters == pytest.approx(expected, rel=0.02)
+
+
+def test_leak_reduces_exhaled_volume(patient):
+    patient.leak = 0.2
+    signals = patient.generate(60, SAMPLE_RATE)
+    inhaled = signals.flow[signals.flow > 0].sum()
+    exhaled = -signals.flow[signals.flow < 0].sum()
+    assert exhaled / inhaled == pytest.approx(0.8, rel=0.02)
+
+
+def test_chunks_are_continuous():
+    """
+    When:
+        Generating the same noiseless patient at once, and in chunks.
+    Expect:
+        The signals are identical - including the breaths which cross the
+        chunks' boundaries.
+    """
+    patient = SyntheticPatient(noise_sigma=0, seed=3)
+    whole = patient.generate(180, SAMPLE_RATE)
+    chunks = patient.chunks(SAMPLE_RATE, chunk_seconds=7)
+    flow = np.concatenate([next(chunks).flow for _ in range(26)])
+
+    np.testing.assert_allclose(flow[:len(whole.flow)], whole.flow)
+
+
+def test_streams_of_same_patient_are_aligned():
+    patient = SyntheticPatient(seed=4, artifact_rate=10)
+    signals = patient.generate(5, SAMPLE_RATE)
+    stream = patient.stream("pressure", SAMPLE_RATE, chunk_seconds=5)
+    assert [next(stream) for _ in range(10)] == signals.pressure[:10].tolist()
+
+
+def test_artifacts():
+    patient = SyntheticPatient(noise_sigma=0, artifact_rate=60, seed=5)
+    clean = SyntheticPatient(noise_sigma=0, seed=5)
+    difference = (patient.generate(60, SAMPLE_RATE).flow -
+                  clean.generate(60, SAMPLE_RATE).flow)
+    assert 0 < np.count_nonzero(difference) < len(difference) / 2
+
+
+@pytest.mark.parametrize("data", ["patient"])
+def test_sampler_measures_synthetic_patient(
+        driver_factory, measurements, events):
+    sampler = Sampler(measurements=measurements, events=events,
+                      flow_sensor=driver_factory.flow,
+                      pressure_sensor=driver_factory.pressure,
+                      a2d=driver_factory.a2d,
+                      timer=driver_factory.timer)
+
+    for _ in range(60 * driver_factory.MOCK_SAMPLE_RATE_HZ):
+        sampler.sampling_iteration()
+
+    assert measurements.bpm == pytest.approx(driver_factory.MOCK_BPM, abs=3)
+    assert measurements.o2_saturation_percentage == pytest.approx(21, abs=2)